@@ -1,6 +1,8 @@
 
 
 import streamlit as st
+from utils.telemetry import start_exporters
+from utils.resources import RESOURCES
 
 # Configure the default settings for the entire application
 st.set_page_config(
@@ -9,6 +11,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Metrics endpoint / JSON export (enabled with METRICS_PORT / METRICS_JSON)
+start_exporters()
+
 # --- Home Page Content ---
 
 st.title("🧠 Project AI Assistant, Detector, Market Price and Weather Tracker")
@@ -24,6 +29,7 @@ st.markdown(
     * **2. 🔍 Detector:** The image analysis page that uses your trained PyTorch model (via `model_inference.py`).
     * **3. 🌤️ Weather:** The data analysis page that displays external API data (via `api_handlers.py`).
     * **4. 📈 Market Price:** The data analysis page that displays local data (via `api_handlers.py`).
+    * **5. 🌦️ Market × Weather:** Mandi prices joined with lagged district weather (via `features.py`).
         
     """
 )
@@ -47,4 +53,9 @@ project_root/
 
 st.info(
     "💡 **To Run:** Make sure you are in the project_root directory and run: `streamlit run Home.py`"
-)
\ No newline at end of file
+)
+
+# Models, stores and clients shared by all sessions (see utils/resources.py)
+with st.expander("Shared resources"):
+    st.caption(f"Loaded: {RESOURCES.total_bytes() / 2 ** 20:.0f} MB, shared by every session.")
+    st.dataframe(RESOURCES.stats(), hide_index=True)
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Calibrate and benchmark the fast/accurate detector cascade.
+
+Scores a labelled folder (<root>/<class_name>/<image>) with both models,
+picks the lowest confidence threshold at which the cascade loses at most
+--max-drop accuracy against the accurate model alone, and reports the
+share of images the fast model resolves and the mean CPU cost per diagnosis.
+
+Usage (from project_root):
+    python -m benchmarks.cascade_calibration --root path/to/labelled_images
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from benchmarks.common import labelled_images
+from utils.model_inference import (CASCADE_FAST_VARIANT, CLASS_NAMES, DEFAULT_VARIANT,
+                                   load_model, preprocess_image)
+
+
+def score(model, tensor):
+    start = time.perf_counter()
+    with torch.no_grad():
+        probabilities = torch.nn.functional.softmax(model(tensor), dim=1)
+    confidence, class_idx = torch.max(probabilities, 1)
+    return confidence.item(), class_idx.item(), (time.perf_counter() - start) * 1000
+
+
+def calibrate_threshold(fast_conf, fast_correct, accurate_correct, max_drop=0.0):
+    """
+    Lowest threshold t such that answering with the fast model when
+    confidence >= t (and the accurate model otherwise) keeps accuracy within
+    max_drop of the accurate model alone. Evaluated for all candidate
+    thresholds at once with cumulative sums.
+    """
+    order = np.argsort(-fast_conf)
+    conf = fast_conf[order]
+    # Correct answers if the top-k most confident images go to the fast model
+    fast_hits = np.concatenate([[0], np.cumsum(fast_correct[order])])
+    accurate_rest = np.concatenate([np.cumsum(accurate_correct[order][::-1])[::-1], [0]])
+    cascade_acc = (fast_hits + accurate_rest) / len(conf)
+
+    # A split is only realisable if it doesn't fall between tied confidences
+    realisable = np.ones(len(conf) + 1, dtype=bool)
+    realisable[1:-1] = conf[:-1] != conf[1:]
+
+    target = accurate_correct.mean() - max_drop
+    ok = np.nonzero((cascade_acc >= target - 1e-12) & realisable)[0]
+    k = ok.max()  # most images to the fast model while staying on target
+    threshold = conf[k - 1] if k > 0 else 1.0 + 1e-6
+    return float(threshold), float(cascade_acc[k]), k / len(conf)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", required=True, help="Labelled image folder")
+    parser.add_argument("--fast", default=CASCADE_FAST_VARIANT)
+    parser.add_argument("--accurate", default=DEFAULT_VARIANT)
+    parser.add_argument("--max-drop", type=float, default=0.0, help="Allowed accuracy drop (0.005 = 0.5 pts)")
+    args = parser.parse_args()
+
+    fast_model, accurate_model = load_model(args.fast), load_model(args.accurate)
+
+    fast_conf, fast_correct, accurate_correct, fast_ms, accurate_ms = [], [], [], [], []
+    for path, class_name in labelled_images(args.root):
+        _, tensor = preprocess_image(path)
+        target = CLASS_NAMES.index(class_name)
+
+        conf, idx, ms = score(fast_model, tensor)
+        fast_conf.append(conf)
+        fast_correct.append(idx == target)
+        fast_ms.append(ms)
+
+        _, idx, ms = score(accurate_model, tensor)
+        accurate_correct.append(idx == target)
+        accurate_ms.append(ms)
+
+    if not fast_conf:
+        print(f"No labelled images found under {args.root}")
+        return
+
+    fast_conf = np.array(fast_conf)
+    fast_correct, accurate_correct = np.array(fast_correct, dtype=float), np.array(accurate_correct, dtype=float)
+    fast_ms, accurate_ms = np.array(fast_ms), np.array(accurate_ms)
+
+    threshold, cascade_acc, fast_share = calibrate_threshold(fast_conf, fast_correct, accurate_correct, args.max_drop)
+    escalated = fast_conf < threshold
+    cascade_ms = fast_ms.mean() + accurate_ms[escalated].sum() / len(fast_ms)
+
+    print(f"Images: {len(fast_conf)} | fast: {args.fast} | accurate: {args.accurate}")
+    print(f"Accuracy fast only: {fast_correct.mean():.4f} | accurate only: {accurate_correct.mean():.4f} "
+          f"| cascade: {cascade_acc:.4f}")
+    print(f"Calibrated threshold: {threshold:.4f} (set CASCADE_THRESHOLD to use it)")
+    print(f"Resolved by fast stage: {fast_share:.1%} | escalated: {escalated.mean():.1%}")
+    if escalated.any():
+        print(f"Accuracy on escalated (hard) images: {accurate_correct[escalated].mean():.4f}")
+    print(f"Mean CPU ms per diagnosis: accurate only {accurate_ms.mean():.1f} | cascade {cascade_ms:.1f} "
+          f"({(1 - cascade_ms / accurate_ms.mean()):.1%} saved)")
+
+
+if __name__ == "__main__":
+    main()
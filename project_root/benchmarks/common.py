@@ -0,0 +1,16 @@
+"""Shared helpers for the benchmark scripts."""
+import os
+from glob import glob
+
+from utils.model_inference import CLASS_NAMES
+
+
+def labelled_images(root):
+    """
+    Yields (path, class_name) pairs from a labelled folder laid out like the
+    training dataset (<root>/<class_name>/<image>), skipping unknown classes.
+    """
+    for path in sorted(glob(os.path.join(root, "*", "*"))):
+        class_name = os.path.basename(os.path.dirname(path))
+        if class_name in CLASS_NAMES:
+            yield path, class_name
@@ -0,0 +1,102 @@
+"""
+Local load test for the market query service.
+
+Starts market_api in-process on a free port (or targets --url), fires
+--requests GETs with --concurrency workers over a mix of latest/range/
+aggregate queries for the stored commodities, and reports throughput and
+latency percentiles. --revalidate sends If-None-Match with the last ETag
+seen for each query, like a polling SMS gateway would.
+
+Usage (from project_root):
+    python -m benchmarks.market_api_load --requests 50000 --concurrency 200
+"""
+import argparse
+import asyncio
+import random
+import time
+from urllib.parse import quote
+
+import numpy as np
+from aiohttp import ClientSession, TCPConnector, web
+
+from market_api import create_app
+from utils.market_store import read_market_store
+
+
+def query_mix(commodities, n, seed=2024):
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(n):
+        commodity = quote(rng.choice(commodities))
+        kind = rng.random()
+        if kind < 0.6:
+            paths.append(f"/v1/latest?commodity={commodity}")
+        elif kind < 0.9:
+            paths.append(f"/v1/range?commodity={commodity}&limit=200")
+        else:
+            paths.append(f"/v1/aggregate?commodity={commodity}&by=District&freq=W")
+    return paths
+
+
+async def run_load(base_url, paths, concurrency, revalidate):
+    latencies = np.zeros(len(paths))
+    statuses = {}
+    etags = {}
+    queue = iter(enumerate(paths))
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+        async def worker():
+            for i, path in queue:
+                headers = {"If-None-Match": etags[path]} if revalidate and path in etags else {}
+                start = time.perf_counter()
+                async with session.get(base_url + path, headers=headers) as res:
+                    await res.read()
+                    latencies[i] = (time.perf_counter() - start) * 1000
+                    statuses[res.status] = statuses.get(res.status, 0) + 1
+                    if "ETag" in res.headers:
+                        etags[path] = res.headers["ETag"]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+
+async def main_async(args):
+    runner = None
+    base_url = args.url
+    if base_url is None:
+        runner = web.AppRunner(create_app(read_market_store(), alerts=False), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        base_url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    async with ClientSession() as session:
+        async with session.get(base_url + "/v1/commodities") as res:
+            commodities = await res.json()
+
+    paths = query_mix(commodities, args.requests)
+    latencies, statuses, elapsed = await run_load(base_url, paths, args.concurrency, args.revalidate)
+
+    print(f"Requests      : {len(paths):,} with concurrency {args.concurrency}")
+    print(f"Throughput    : {len(paths) / elapsed:,.0f} req/s")
+    print(f"Latency (ms)  : p50 {np.percentile(latencies, 50):.2f}  "
+          f"p95 {np.percentile(latencies, 95):.2f}  p99 {np.percentile(latencies, 99):.2f}")
+    print(f"Status codes  : {dict(sorted(statuses.items()))}")
+
+    if runner is not None:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Target a running service instead of starting one")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--revalidate", action="store_true", help="Send If-None-Match with known ETags")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Throughput of the price-alert engine on synthetic subscriptions.
+
+Creates --subscriptions random rules over the (commodity, market) pairs of
+the market CSV, then replays --batches ingest batches of random-walk prices
+and reports index build time, matching throughput (rows/s) and alerts.
+A full vectorized scan over every rule is timed as a baseline. Finishes
+with a check that batches with blank modal prices raise no alerts.
+
+Usage (from project_root):
+    python -m benchmarks.price_alerts_benchmark --subscriptions 1000000 --batches 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.market_store import read_market_store
+from utils.price_alerts import RULE_KINDS, PriceAlertEngine
+
+
+def synthetic_rules(keys, reference, n, rng):
+    key_idx = rng.integers(0, len(keys), n)
+    kinds = rng.choice(RULE_KINDS, n, p=[0.45, 0.45, 0.10])
+    base = reference[key_idx]
+    values = np.where(kinds == "pct_change", rng.uniform(2, 30, n), base * rng.uniform(0.7, 1.3, n)).round(0)
+    return [(f"+91{9000000000 + i}", keys[k][0], keys[k][1], kind, float(v))
+            for i, (k, kind, v) in enumerate(zip(key_idx, kinds, values))]
+
+
+def synthetic_batch(keys, prices, rows, day, rng):
+    pick = rng.integers(0, len(keys), rows)
+    prices[pick] *= rng.normal(1.0, 0.05, rows)
+    return pd.DataFrame({
+        "Commodity": [keys[k][0] for k in pick],
+        "Market": [keys[k][1] for k in pick],
+        "Arrival_Date": pd.Timestamp("2026-01-01") + pd.Timedelta(days=day),
+        "Modal_Price": prices[pick].astype(np.float32),
+    })
+
+
+def full_scan(rules_frame, batch, previous):
+    """Baseline: every rule compared with every changed price, no index."""
+    merged = rules_frame.merge(batch.groupby(["Commodity", "Market"], observed=True)["Modal_Price"].mean()
+                               .rename("price").reset_index(), on=["Commodity", "Market"])
+    merged["previous"] = [previous.get(k) for k in zip(merged["Commodity"], merged["Market"])]
+    up = (merged["kind"] == "above") & (merged["previous"] < merged["value"]) & (merged["value"] <= merged["price"])
+    down = (merged["kind"] == "below") & (merged["price"] <= merged["value"]) & (merged["value"] < merged["previous"])
+    pct = (merged["kind"] == "pct_change") & \
+        ((merged["price"] - merged["previous"]).abs() / merged["previous"] * 100 >= merged["value"])
+    return int((up | down | pct).sum())
+
+
+def check_missing_prices(engine, key):
+    """Regression check: a blank modal price fires no rule and keeps the previous reference price."""
+    previous = engine.last_price[key]
+    engine.subscribe("+910000000000", key[0], key[1], "pct_change", 1.0)
+    batch = pd.DataFrame({"Commodity": [key[0]], "Market": [key[1]],
+                          "Arrival_Date": [pd.Timestamp("2030-01-01")], "Modal_Price": np.float32([np.nan])})
+    assert engine.process_batch(batch) == 0, "NaN modal price triggered alerts"
+    assert engine.last_price[key] == previous, "NaN modal price replaced the reference price"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=200000)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-rows", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=2024)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    store = read_market_store()
+    reference = store.frame.groupby(["Commodity", "Market"], observed=True)["Modal_Price"].last()
+    keys = [(str(c), str(m)) for c, m in reference.index]
+    prices = reference.to_numpy(np.float64).copy()
+    rules = synthetic_rules(keys, prices, args.subscriptions, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = PriceAlertEngine(os.path.join(tmp, "alerts.db"))
+        start = time.perf_counter()
+        engine.subscribe_many(rules)
+        insert_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        engine = PriceAlertEngine(os.path.join(tmp, "alerts.db"))  # cold load + index build
+        load_s = time.perf_counter() - start
+        engine.last_price.update({k: float(p) for k, p in zip(keys, prices)})
+
+        rules_frame = pd.DataFrame(rules, columns=["subscriber", "Commodity", "Market", "kind", "value"])
+        alerts = baseline_alerts = 0
+        engine_s = scan_s = 0.0
+        for day in range(args.batches):
+            batch = synthetic_batch(keys, prices, args.batch_rows, day, rng)
+            previous = dict(engine.last_price)
+
+            start = time.perf_counter()
+            baseline_alerts += full_scan(rules_frame, batch, previous)
+            scan_s += time.perf_counter() - start
+
+            start = time.perf_counter()
+            alerts += engine.process_batch(batch)
+            engine_s += time.perf_counter() - start
+
+        check_missing_prices(engine, keys[0])
+
+    rows = args.batches * args.batch_rows
+    print(f"Subscriptions : {args.subscriptions:,} over {len(keys):,} (commodity, market) keys")
+    print(f"Insert        : {insert_s:.2f} s   cold load + index: {load_s:.2f} s")
+    print(f"Indexed match : {rows / engine_s:,.0f} rows/s  ({engine_s:.2f} s, {alerts:,} alerts incl. outbox writes)")
+    print(f"Full scan     : {rows / scan_s:,.0f} rows/s  ({scan_s:.2f} s, {baseline_alerts:,} alerts, no writes)")
+
+
+if __name__ == "__main__":
+    main()
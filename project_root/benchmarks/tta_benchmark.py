@@ -0,0 +1,61 @@
+"""
+Benchmark the detector's test-time augmentation mode.
+
+Runs every image of a labelled folder (<root>/<class_name>/<image>, the same
+layout as the training dataset) with and without TTA and reports the added
+latency against the accuracy gained.
+
+Usage (from project_root):
+    python -m benchmarks.tta_benchmark --root path/to/labelled_images
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import labelled_images
+from utils.model_inference import DEFAULT_VARIANT, TTA_THRESHOLD, load_model, predict_image
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", required=True, help="Labelled image folder")
+    parser.add_argument("--variant", default=DEFAULT_VARIANT)
+    parser.add_argument("--threshold", type=float, default=TTA_THRESHOLD)
+    args = parser.parse_args()
+
+    model = load_model(args.variant)
+
+    base_ms, tta_ms, base_ok, tta_ok, triggered = [], [], [], [], []
+    for path, class_name in labelled_images(args.root):
+        start = time.perf_counter()
+        label, confidence = predict_image(path, model)
+        base_ms.append((time.perf_counter() - start) * 1000)
+        base_ok.append(label == class_name)
+        triggered.append(confidence < args.threshold)
+
+        start = time.perf_counter()
+        label, _ = predict_image(path, model, tta=True, tta_threshold=args.threshold)
+        tta_ms.append((time.perf_counter() - start) * 1000)
+        tta_ok.append(label == class_name)
+
+    if not base_ms:
+        print(f"No labelled images found under {args.root}")
+        return
+
+    base_ms, tta_ms, triggered = np.array(base_ms), np.array(tta_ms), np.array(triggered)
+
+    print(f"Images: {len(base_ms)} | variant: {args.variant} | threshold: {args.threshold:.2f}")
+    print(f"Accuracy single-view: {np.mean(base_ok):.4f} | with TTA: {np.mean(tta_ok):.4f} "
+          f"({(np.mean(tta_ok) - np.mean(base_ok)) * 100:+.2f} pts)")
+    print(f"Latency mean single-view: {base_ms.mean():.1f} ms | with TTA: {tta_ms.mean():.1f} ms "
+          f"(+{tta_ms.mean() - base_ms.mean():.1f} ms)")
+    print(f"Latency p95 single-view: {np.percentile(base_ms, 95):.1f} ms | with TTA: {np.percentile(tta_ms, 95):.1f} ms")
+    print(f"TTA triggered on {triggered.mean():.1%} of images")
+    if triggered.any():
+        print(f"Added latency on triggered images: +{(tta_ms - base_ms)[triggered].mean():.1f} ms | "
+              f"accuracy on them: {np.mean(np.array(base_ok)[triggered]):.4f} -> {np.mean(np.array(tta_ok)[triggered]):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Real-time factor (RTF) of voice mode on this machine's CPU.
+
+Transcribes the given WAV recordings with the shared Whisper model at each
+--concurrency level (that many sessions transcribing at once) and
+synthesizes --text with the Piper voice. RTF = processing time / audio
+duration; with N concurrent sessions the aggregate RTF is wall time /
+(N x audio duration). A node keeps up with about N sessions while the
+per-session RTF at that level stays below 1.
+
+Usage (from project_root):
+    python -m benchmarks.voice_rtf --audio samples/*.wav --concurrency 1 2 4 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.voice import VOICE_CPU_THREADS, WHISPER_MODEL, SpeechModels, decode_wav
+
+DEFAULT_TEXT = (
+    "Spray propiconazole at first appearance of yellow rust. Repeat after fifteen days if the weather stays "
+    "cool and moist. Avoid spraying before rain, and irrigate in the early morning."
+)
+
+
+def transcribe_all(models, clips, language):
+    start = time.perf_counter()
+    for samples, _ in clips:
+        list(models.transcribe_chunks(samples, language=language))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", nargs="+", required=True, help="WAV recordings of spoken questions")
+    parser.add_argument("--language", default=None, help="Whisper language code (default: detect)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--text", default=DEFAULT_TEXT, help="Answer text for the TTS measurement")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    models = SpeechModels(workers=max(args.concurrency))
+    print(f"Model load: {time.perf_counter() - start:.1f} s | whisper: {WHISPER_MODEL} | "
+          f"threads per worker: {VOICE_CPU_THREADS}")
+    if models.stt is None:
+        print("faster-whisper is not installed; nothing to measure.")
+        return
+
+    clips = []
+    for path in args.audio:
+        with open(path, "rb") as f:
+            clips.append(decode_wav(f.read()))
+    audio_s = sum(duration for _, duration in clips)
+    transcribe_all(models, clips[:1], args.language)  # warm-up
+
+    print(f"Speech-to-text over {len(clips)} clips ({audio_s:.1f} s of audio):")
+    for n in args.concurrency:
+        with ThreadPoolExecutor(n) as pool:
+            start = time.perf_counter()
+            per_session = list(pool.map(lambda _: transcribe_all(models, clips, args.language), range(n)))
+            wall = time.perf_counter() - start
+        session_rtf = np.mean(per_session) / audio_s
+        print(f"  {n:>3} concurrent: per-session RTF {session_rtf:.3f} | aggregate RTF {wall / (n * audio_s):.3f} "
+              f"| {'keeps up' if session_rtf < 1 else 'falls behind'}")
+
+    if models.tts is None:
+        print("No Piper voice (PIPER_VOICE); skipping text-to-speech.")
+        return
+    models.synthesize("Warm-up.")
+    sentences = [s for s in args.text.split(". ") if s]
+    start = time.perf_counter()
+    first_ms, spoken_s = None, 0.0
+    for sentence in sentences:
+        wav = models.synthesize(sentence)
+        first_ms = first_ms or (time.perf_counter() - start) * 1000
+        spoken_s += decode_wav(wav)[1]
+    tts_s = time.perf_counter() - start
+    print(f"Text-to-speech: RTF {tts_s / spoken_s:.3f} ({spoken_s:.1f} s of speech in {tts_s:.2f} s) | "
+          f"first sentence ready after {first_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Async HTTP query service over the market store, for the SMS/IVR price-alert
+system and partner apps.
+
+Usage (from project_root):
+    python market_api.py --port 8080
+
+Endpoints (all GET unless noted, JSON unless noted):
+    /health
+    /v1/commodities
+    /v1/latest?commodity=Onion[&market=..][&district=..][&state=..][&variety=..]
+    /v1/range?commodity=Onion&start=2025-10-01&end=2025-11-06[&market=..][&limit=10000]
+    /v1/aggregate?commodity=Onion&by=District&freq=W[&start=..][&end=..]
+    /v1/bulk?commodity=Onion[&start=..][&end=..]&format=ndjson|arrow   (streamed)
+    POST /v1/ingest   CSV body with the market_prices.csv columns, header X-API-Token
+
+Responses carry an ETag; send If-None-Match to get 304 Not Modified.
+Results are cached per (query, store version), so an ingest invalidates them.
+Ingested rows are also matched against price-alert subscriptions (utils/price_alerts.py).
+"""
+import io
+import os
+import asyncio
+import hashlib
+import argparse
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+from aiohttp import web
+
+from utils.market_store import MarketStore, read_market_store
+from utils.price_alerts import PriceAlertEngine
+
+ROW_COLUMNS = ["State", "District", "Market", "Commodity", "Variety", "Grade",
+               "Arrival_Date", "Min_Price", "Max_Price", "Modal_Price"]
+FILTER_PARAMS = {"market": "Market", "district": "District", "state": "State", "variety": "Variety"}
+AGGREGATE_BY = {"State", "District", "Market", "Variety"}
+AGGREGATE_FREQ = {"D": "D", "W": "W-MON", "M": "MS"}
+BULK_CHUNK_ROWS = 5000
+
+class ResultCache:
+    """LRU of encoded responses keyed by (path, query, store version)."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, Tuple[bytes, str, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class QueryError(ValueError):
+    """Bad request parameters; rendered as {"error": ...} with status 400."""
+
+def _records(frame: pd.DataFrame) -> bytes:
+    return frame.to_json(orient="records", date_format="iso").encode()
+
+class MarketAPI:
+    def __init__(self, store: MarketStore, cache_entries: int = 4096, ingest_token: Optional[str] = None):
+        self.store = store
+        self.cache = ResultCache(cache_entries)
+        self.ingest_token = ingest_token
+        store.on_ingest(lambda _store, _rows: self.cache.clear())
+
+    # ---- helpers ----
+
+    def _selection(self, query) -> pd.DataFrame:
+        commodity = query.get("commodity")
+        if not commodity:
+            raise QueryError("Missing required parameter: commodity")
+        try:
+            rows = self.store.select(commodity, query.get("start"), query.get("end"), columns=ROW_COLUMNS)
+        except (ValueError, TypeError) as e:
+            raise QueryError(f"Invalid date: {e}")
+        for param, column in FILTER_PARAMS.items():
+            if param in query:
+                rows = rows[rows[column] == query[param]]
+        return rows
+
+    def _etag(self, key) -> str:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=10).hexdigest()
+        return f'"{self.store.version}-{digest}"'
+
+    def _respond(self, request: web.Request, compute: Callable[[], bytes],
+                 content_type: str = "application/json") -> web.Response:
+        """Serves from the result cache, honouring If-None-Match."""
+        key = (request.path, tuple(sorted(request.query.items())), self.store.version)
+        entry = self.cache.get(key)
+        if entry is None:
+            try:
+                body = compute()
+            except QueryError as e:
+                return web.json_response({"error": str(e)}, status=400)
+            entry = (body, content_type, self._etag(key))
+            self.cache.put(key, entry)
+
+        body, content_type, etag = entry
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type=content_type, headers=headers)
+
+    # ---- handlers ----
+
+    async def health(self, request):
+        return web.json_response({
+            "status": "ok", "rows": len(self.store), "version": self.store.version,
+            "cache": {"entries": len(self.cache.entries), "hits": self.cache.hits, "misses": self.cache.misses},
+        })
+
+    async def commodities(self, request):
+        return self._respond(request, lambda: pd.Series(self.store.commodities()).to_json(orient="values").encode())
+
+    async def latest(self, request):
+        def compute():
+            rows = self._selection(request.query)
+            # Rows are date-sorted within a commodity, so the last row per series is the latest
+            latest = rows.groupby(["Market", "Variety", "Grade"], observed=True, sort=False).tail(1)
+            return _records(latest)
+        return self._respond(request, compute)
+
+    async def range_query(self, request):
+        def compute():
+            try:
+                limit = int(request.query.get("limit", 10000))
+            except ValueError:
+                raise QueryError("limit must be an integer")
+            return _records(self._selection(request.query).iloc[:limit])
+        return self._respond(request, compute)
+
+    async def aggregate(self, request):
+        def compute():
+            by = request.query.get("by", "Market")
+            freq = request.query.get("freq", "D")
+            if by not in AGGREGATE_BY:
+                raise QueryError(f"by must be one of {sorted(AGGREGATE_BY)}")
+            if freq not in AGGREGATE_FREQ:
+                raise QueryError(f"freq must be one of {sorted(AGGREGATE_FREQ)}")
+            rows = self._selection(request.query)
+            grouped = rows.groupby([by, pd.Grouper(key="Arrival_Date", freq=AGGREGATE_FREQ[freq])],
+                                   observed=True)["Modal_Price"]
+            result = grouped.agg(["mean", "min", "max", "count"]).reset_index()
+            result["mean"] = result["mean"].round(1)
+            return _records(result)
+        return self._respond(request, compute)
+
+    async def bulk(self, request):
+        fmt = request.query.get("format", "ndjson")
+        if fmt not in ("ndjson", "arrow"):
+            return web.json_response({"error": "format must be ndjson or arrow"}, status=400)
+        # Selection and encoding run in the default executor so a large export
+        # does not stall other requests on the event loop
+        loop = asyncio.get_running_loop()
+        try:
+            rows = await loop.run_in_executor(None, self._selection, request.query)
+        except QueryError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        # Bulk bodies are streamed, not cached; the ETag still changes only on ingest
+        etag = self._etag((request.path, tuple(sorted(request.query.items())), self.store.version))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+
+        content_type = "application/x-ndjson" if fmt == "ndjson" else "application/vnd.apache.arrow.stream"
+        response = web.StreamResponse(headers={"ETag": etag, "Content-Type": content_type})
+        await response.prepare(request)
+        if fmt == "ndjson":
+            def encode(chunk: pd.DataFrame) -> bytes:
+                # pandas >= 2 already ends line-delimited JSON with a newline; older versions do not
+                text = chunk.to_json(orient="records", lines=True, date_format="iso")
+                return (text if text.endswith("\n") else text + "\n").encode()
+
+            for start in range(0, len(rows), BULK_CHUNK_ROWS):
+                await response.write(await loop.run_in_executor(None, encode, rows.iloc[start:start + BULK_CHUNK_ROWS]))
+        else:
+            # One IPC stream, sent a record batch at a time: the sink is drained after
+            # every write, so only one encoded batch is held in memory
+            table = await loop.run_in_executor(None, lambda: pa.Table.from_pandas(rows, preserve_index=False))
+            sink = io.BytesIO()
+            writer = pa.ipc.new_stream(sink, table.schema)
+
+            def encode(batch: Optional[pa.RecordBatch]) -> bytes:
+                if batch is None:
+                    writer.close()
+                else:
+                    writer.write_batch(batch)
+                data = sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+                return data
+
+            for batch in table.to_batches(max_chunksize=BULK_CHUNK_ROWS):
+                await response.write(await loop.run_in_executor(None, encode, batch))
+            await response.write(await loop.run_in_executor(None, encode, None))
+        await response.write_eof()
+        return response
+
+    async def ingest(self, request):
+        if not self.ingest_token or request.headers.get("X-API-Token") != self.ingest_token:
+            return web.json_response({"error": "Ingestion is disabled or the token is invalid."}, status=403)
+        body = await request.read()
+        try:
+            # Runs on the event loop on purpose: ingests are rare, and the ingest
+            # listeners (result cache, alerts) then never race with queries
+            added = self.store.ingest(pd.read_csv(io.BytesIO(body)))
+        except (ValueError, KeyError, pd.errors.ParserError) as e:
+            return web.json_response({"error": f"Could not ingest batch: {e}"}, status=400)
+        return web.json_response({"added": added, "version": self.store.version})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get("/health", self.health),
+            web.get("/v1/commodities", self.commodities),
+            web.get("/v1/latest", self.latest),
+            web.get("/v1/range", self.range_query),
+            web.get("/v1/aggregate", self.aggregate),
+            web.get("/v1/bulk", self.bulk),
+            web.post("/v1/ingest", self.ingest),
+        ])
+        return app
+
+def create_app(store: Optional[MarketStore] = None, alerts: bool = True, **kwargs) -> web.Application:
+    store = store or read_market_store()
+    if alerts:
+        # Ingested batches are matched against price-alert subscriptions
+        PriceAlertEngine().attach(store)
+    kwargs.setdefault("ingest_token", os.environ.get("MARKET_API_TOKEN"))
+    return MarketAPI(store, **kwargs).app()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MARKET_API_PORT", "8080")))
+    parser.add_argument("--cache-entries", type=int, default=4096)
+    args = parser.parse_args()
+    web.run_app(create_app(cache_entries=args.cache_entries), host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
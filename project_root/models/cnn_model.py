@@ -22,7 +22,7 @@ print("Path to dataset files:", path)
 
 !pip install torchmetrics
 
-import os, torch, shutil, numpy as np, json, timm, torchmetrics
+import os, io, time, copy, hashlib, torch, shutil, numpy as np, json, timm, torchmetrics
 from glob import glob
 from PIL import Image
 from torch.utils.data import random_split, Dataset, DataLoader
@@ -114,7 +114,7 @@ def get_dls(root, transformations, bs, split = [0.9, 0.05, 0.05], ns = 4):
 
     tr_dl = DataLoader(tr_ds, batch_size = bs, shuffle = True, num_workers = ns)
     val_dl = DataLoader(vl_ds, batch_size = bs, shuffle = False, num_workers = ns)
-    ts_dl = DataLoader(ts_ds, batch_size = 1, shuffle = False, num_workers = ns)
+    ts_dl = DataLoader(ts_ds, batch_size = bs, shuffle = False, num_workers = ns)
 
     return tr_dl, val_dl, ts_dl, ds.cls_names
 
@@ -411,72 +411,118 @@ class ModelTrainer:
 
 class ModelEvaluator:
 
-    def __init__(self, model, model_name, device, class_names):
+    def __init__(self, model, model_name, device, class_names, batch_size=256, topk=5):
         self.model = model
         self.model_name = model_name
         self.device = device
         self.class_names = class_names
         self.num_classes = len(class_names)
+        self.batch_size = batch_size
+        self.topk = min(topk, self.num_classes)
 
     def to_device(self, batch):
-        return batch[0].to(self.device), batch[1].to(self.device)
+        return batch[0].to(self.device, non_blocking=True), batch[1].to(self.device, non_blocking=True)
+
+    def get_eval_loader(self, test_loader):
+        """Re-batch small test loaders (e.g. batch_size=1) into large evaluation batches"""
+        if test_loader.batch_size is not None and test_loader.batch_size >= self.batch_size:
+            return test_loader
+        return DataLoader(
+            test_loader.dataset,
+            batch_size=self.batch_size,
+            shuffle=False,
+            num_workers=test_loader.num_workers,
+            pin_memory=str(self.device).startswith('cuda')
+        )
 
-    def evaluate(self, test_loader):
-        """Comprehensive evaluation on test set"""
+    def evaluate(self, test_loader, topk_path=None):
+        """
+        Streaming evaluation on the test set. The confusion matrix is accumulated
+        on the device with bincount, so memory stays constant regardless of the
+        test set size. If topk_path is given, top-k probabilities and class indices
+        are streamed to "<topk_path>_probs.npy" / "<topk_path>_indices.npy" memmaps.
+        """
         self.model.eval()
+        loader = self.get_eval_loader(test_loader)
+        n = self.num_classes
 
-        all_preds = []
-        all_labels = []
-        all_probs = []
-        correct = 0
-        total = 0
+        conf_matrix = torch.zeros(n * n, dtype=torch.long, device=self.device)
 
-        with torch.no_grad():
-            for batch in tqdm(test_loader, desc=f"Testing {self.model_name}"):
+        topk_probs, topk_indices = None, None
+        if topk_path is not None:
+            shape = (len(loader.dataset), self.topk)
+            topk_probs = np.lib.format.open_memmap(f"{topk_path}_probs.npy", mode='w+', dtype=np.float16, shape=shape)
+            topk_indices = np.lib.format.open_memmap(f"{topk_path}_indices.npy", mode='w+', dtype=np.int16, shape=shape)
+
+        offset = 0
+        with torch.inference_mode():
+            for batch in tqdm(loader, desc=f"Testing {self.model_name}"):
                 ims, gts = self.to_device(batch)
 
                 outputs = self.model(ims)
-                probs = torch.softmax(outputs, dim=1)
                 preds = torch.argmax(outputs, dim=1)
+                conf_matrix += torch.bincount(gts * n + preds, minlength=n * n)
 
-                all_preds.extend(preds.cpu().numpy())
-                all_labels.extend(gts.cpu().numpy())
-                all_probs.extend(probs.cpu().numpy())
+                if topk_probs is not None:
+                    probs, indices = torch.softmax(outputs, dim=1).topk(self.topk, dim=1)
+                    topk_probs[offset:offset + ims.size(0)] = probs.cpu().numpy()
+                    topk_indices[offset:offset + ims.size(0)] = indices.cpu().numpy()
 
-                correct += (preds == gts).sum().item()
-                total += gts.size(0)
+                offset += ims.size(0)
 
-        accuracy = correct / total
+        if topk_probs is not None:
+            topk_probs.flush()
+            topk_indices.flush()
 
-        # Calculate per-class metrics
-        all_preds = np.array(all_preds)
-        all_labels = np.array(all_labels)
+        conf_matrix = conf_matrix.view(n, n).cpu().numpy()
 
         return {
-            'accuracy': accuracy,
-            'predictions': all_preds,
-            'labels': all_labels,
-            'probabilities': np.array(all_probs)
+            'accuracy': np.trace(conf_matrix) / max(offset, 1),
+            'total': offset,
+            'conf_matrix': conf_matrix,
+            'topk_path': topk_path
         }
 
     def calculate_detailed_metrics(self, results):
-        """Calculate precision, recall, F1 for each class"""
-        from sklearn.metrics import classification_report, confusion_matrix
-
-        predictions = results['predictions']
-        labels = results['labels']
-
-        # Classification report
-        report = classification_report(
-            labels,
-            predictions,
-            target_names=self.class_names,
-            output_dict=True,
-            zero_division=0
-        )
-
-        # Confusion matrix
-        conf_matrix = confusion_matrix(labels, predictions)
+        """Calculate precision, recall, F1 for each class from the confusion matrix"""
+
+        conf_matrix = results['conf_matrix']
+        cm = conf_matrix.astype(np.float64)
+
+        tp = np.diag(cm)
+        support = cm.sum(axis=1)
+        predicted = cm.sum(axis=0)
+        total = cm.sum()
+
+        precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+        recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+        f1 = np.divide(2 * precision * recall, precision + recall,
+                       out=np.zeros_like(tp), where=(precision + recall) > 0)
+
+        # Same layout as sklearn's classification_report(output_dict=True)
+        report = {
+            name: {
+                'precision': precision[i],
+                'recall': recall[i],
+                'f1-score': f1[i],
+                'support': support[i]
+            }
+            for i, name in enumerate(self.class_names)
+        }
+        weights = support / total if total > 0 else np.zeros_like(support)
+        report['accuracy'] = tp.sum() / total if total > 0 else 0.0
+        report['macro avg'] = {
+            'precision': precision.mean(),
+            'recall': recall.mean(),
+            'f1-score': f1.mean(),
+            'support': total
+        }
+        report['weighted avg'] = {
+            'precision': (precision * weights).sum(),
+            'recall': (recall * weights).sum(),
+            'f1-score': (f1 * weights).sum(),
+            'support': total
+        }
 
         return report, conf_matrix
 
@@ -607,34 +653,64 @@ class SaveFeatures():
         self.hook = m.register_forward_hook(self.hook_fn)
 
     def hook_fn(self, module, input, output):
-        self.features = ((output.cpu()).data).numpy()
+        # Keep the activations on the device; CAMs are computed there in one batch
+        self.features = output.detach()
 
     def remove(self):
         self.hook.remove()
 
 
 def getCAM(conv_fs, linear_weights, class_idx):
-    """Generate Class Activation Map"""
+    """
+    Generate Class Activation Maps for a whole batch in one matmul.
+    conv_fs: (B, C, H, W) features, linear_weights: (num_classes, C),
+    class_idx: (B,) target class per sample. Returns (B, H, W) maps in [0, 1].
+    """
     bs, chs, h, w = conv_fs.shape
-    cam = linear_weights[class_idx].dot(conv_fs[0, :, :, ].reshape((chs, h * w)))
-    cam = cam.reshape(h, w)
+    weights = linear_weights[class_idx].unsqueeze(1)               # (B, 1, C)
+    cams = torch.bmm(weights, conv_fs.reshape(bs, chs, h * w))     # (B, 1, H*W)
+    cams = cams.reshape(bs, h * w)
+
+    cams = cams - cams.min(dim=1, keepdim=True).values
+    cam_max = cams.max(dim=1, keepdim=True).values
+    cams = torch.where(cam_max > 0, cams / cam_max.clamp_min(1e-12), cams)
+
+    return cams.reshape(bs, h, w)
+
 
-    cam = cam - np.min(cam)
-    cam_max = np.max(cam)
-    if cam_max != 0:
-        cam = cam / cam_max
+class CAMCache:
+    """On-disk heatmap cache keyed by the hash of the input image tensor"""
 
-    return cam
+    def __init__(self, cache_dir, model_name):
+        self.cache_dir = os.path.join(cache_dir, model_name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def image_key(im):
+        return hashlib.sha1(im.detach().cpu().numpy().tobytes()).hexdigest()
+
+    def path(self, key, class_idx):
+        return os.path.join(self.cache_dir, f"{key}_{class_idx}.npy")
+
+    def get(self, key, class_idx):
+        path = self.path(key, class_idx)
+        if os.path.exists(path):
+            return np.load(path).astype(np.float32)
+        return None
+
+    def put(self, key, class_idx, cam):
+        np.save(self.path(key, class_idx), cam.astype(np.float16))
 
 
 class GradCAMVisualizer:
 
-    def __init__(self, model, model_name, device, class_names, im_size=224):
+    def __init__(self, model, model_name, device, class_names, im_size=224, cache_dir="saved_models/cam_cache"):
         self.model = model
         self.model_name = model_name
         self.device = device
         self.class_names = class_names
         self.im_size = im_size
+        self.cache = CAMCache(cache_dir, model_name) if cache_dir else None
 
     def get_target_layer(self):
         """Get the last convolutional layer for different architectures"""
@@ -698,96 +774,96 @@ class GradCAMVisualizer:
             return
 
         activated_features = SaveFeatures(target_layer)
-        weight = fc_weights.cpu().data.numpy()
+        weight = fc_weights.detach()
 
-        preds, images, lbls = [], [], []
-        correct = 0
+        # Pick the samples to plot up front so only those are kept in memory
+        requested = set(random.sample(range(len(test_dl.dataset)), min(num_ims, len(test_dl.dataset))))
+        samples = []
+        correct, offset = 0, 0
 
         with torch.no_grad():
-            for idx, batch in tqdm(enumerate(test_dl), desc="Generating visualizations"):
-                im, gt = self.to_device(batch)
-                pred_class = torch.argmax(self.model(im), dim=1)
-                correct += (pred_class == gt).sum().item()
+            for batch in tqdm(test_dl, desc="Generating visualizations"):
+                ims, gts = self.to_device(batch)
+                pred_class = torch.argmax(self.model(ims), dim=1)
+                correct += (pred_class == gts).sum().item()
+
+                keep = [i for i in range(ims.size(0)) if offset + i in requested]
+                offset += ims.size(0)
+                if not keep:
+                    continue
+
+                features = activated_features.features
+                has_maps = features is not None and features.ndim == 4 and features.size(1) == weight.size(1)
+
+                # Serve cached heatmaps, compute the misses in one batched matmul
+                heatmaps, keys = {}, {}
+                if has_maps and self.cache is not None:
+                    for i in keep:
+                        keys[i] = CAMCache.image_key(ims[i])
+                        cached = self.cache.get(keys[i], pred_class[i].item())
+                        if cached is not None:
+                            heatmaps[i] = cached
+
+                misses = [i for i in keep if i not in heatmaps]
+                if has_maps and misses:
+                    miss_idx = torch.tensor(misses, device=ims.device)
+                    cams = getCAM(features[miss_idx], weight, pred_class[miss_idx]).cpu().numpy()
+                    for j, i in enumerate(misses):
+                        heatmaps[i] = cams[j]
+                        if self.cache is not None:
+                            self.cache.put(keys[i], pred_class[i].item(), cams[j])
+
+                for i in keep:
+                    samples.append((ims[i].cpu(), pred_class[i].item(), gts[i].item(), heatmaps.get(i)))
 
-                images.append(im)
-                preds.append(pred_class.item())
-                lbls.append(gt.item())
+        activated_features.remove()
 
         print(f"\nAccuracy on test set: {(correct / len(test_dl.dataset)):.4f}")
 
-        # Plot
-        plt.figure(figsize=(20, 10))
-        indices = [random.randint(0, len(images) - 1) for _ in range(num_ims)]
-
-        for idx, indeks in enumerate(indices):
-
-            im = images[indeks].squeeze()
-            pred_idx = preds[indeks]
-            true_idx = lbls[indeks]
-
-            # Generate heatmap if features are available
-            if activated_features.features is not None and activated_features.features.ndim == 4:
-                heatmap = getCAM(activated_features.features, weight, pred_idx)
-            else:
-                heatmap = None
-
-            # Plot
-            plt.subplot(row, num_ims // row, idx + 1)
-            plt.imshow(tensor_2_im(im))
-            plt.axis("off")
-
-            if heatmap is not None:
-                plt.imshow(
-                    cv2.resize(heatmap, (self.im_size, self.im_size),
-                              interpolation=cv2.INTER_LINEAR),
-                    alpha=0.4,
-                    cmap='jet'
-                )
-
-            title_color = "green" if pred_idx == true_idx else "red"
-            plt.title(
-                f"GT: {self.class_names[true_idx]}\nPred: {self.class_names[pred_idx]}",
-                color=title_color,
-                fontsize=10
-            )
-
-        plt.suptitle(f'{self.model_name} - Predictions with GradCAM', fontsize=16)
-        plt.tight_layout()
-        plt.show()
-
-        activated_features.remove()
+        self._plot_samples(samples, row, f'{self.model_name} - Predictions with GradCAM')
 
     def _visualize_without_gradcam(self, test_dl, num_ims, row):
         """Fallback visualization without GradCAM"""
 
-        preds, images, lbls = [], [], []
-        correct = 0
+        requested = set(random.sample(range(len(test_dl.dataset)), min(num_ims, len(test_dl.dataset))))
+        samples = []
+        correct, offset = 0, 0
 
         with torch.no_grad():
             for batch in tqdm(test_dl, desc="Generating predictions"):
-                im, gt = self.to_device(batch)
-                pred_class = torch.argmax(self.model(im), dim=1)
-                correct += (pred_class == gt).sum().item()
+                ims, gts = self.to_device(batch)
+                pred_class = torch.argmax(self.model(ims), dim=1)
+                correct += (pred_class == gts).sum().item()
 
-                images.append(im)
-                preds.append(pred_class.item())
-                lbls.append(gt.item())
+                for i in range(ims.size(0)):
+                    if offset + i in requested:
+                        samples.append((ims[i].cpu(), pred_class[i].item(), gts[i].item(), None))
+                offset += ims.size(0)
 
         print(f"\nAccuracy on test set: {(correct / len(test_dl.dataset)):.4f}")
 
-        plt.figure(figsize=(20, 10))
-        indices = [random.randint(0, len(images) - 1) for _ in range(num_ims)]
+        self._plot_samples(samples, row, f'{self.model_name} - Predictions')
+
+    def _plot_samples(self, samples, row, title):
+        """Plot the kept samples with their optional heatmaps"""
 
-        for idx, indeks in enumerate(indices):
+        plt.figure(figsize=(20, 10))
+        cols = max(1, len(samples) // row)
 
-            im = images[indeks].squeeze()
-            pred_idx = preds[indeks]
-            true_idx = lbls[indeks]
+        for idx, (im, pred_idx, true_idx, heatmap) in enumerate(samples[:row * cols]):
 
-            plt.subplot(row, num_ims // row, idx + 1)
+            plt.subplot(row, cols, idx + 1)
             plt.imshow(tensor_2_im(im))
             plt.axis("off")
 
+            if heatmap is not None:
+                plt.imshow(
+                    cv2.resize(heatmap, (self.im_size, self.im_size),
+                              interpolation=cv2.INTER_LINEAR),
+                    alpha=0.4,
+                    cmap='jet'
+                )
+
             title_color = "green" if pred_idx == true_idx else "red"
             plt.title(
                 f"GT: {self.class_names[true_idx]}\nPred: {self.class_names[pred_idx]}",
@@ -795,7 +871,7 @@ class GradCAMVisualizer:
                 fontsize=10
             )
 
-        plt.suptitle(f'{self.model_name} - Predictions', fontsize=16)
+        plt.suptitle(title, fontsize=16)
         plt.tight_layout()
         plt.show()
 
@@ -1256,4 +1332,464 @@ comparison, results_df = run_complete_experiment(
     epochs=4,  # Adjust as needed
     patience=5,
     device='cuda' if torch.cuda.is_available() else 'cpu'
-)
\ No newline at end of file
+)
+
+"""##KNOWLEDGE DISTILLATION FOR EDGE DEVICES"""
+
+# Student configurations (small enough for low-end phones and Raspberry Pi kiosks)
+STUDENT_CONFIGS = {
+    'MobileNetV3-Large': {
+        'model_name': 'mobilenetv3_large_100',
+        'pretrained': True,
+        'description': 'MobileNet V3 Large (student)'
+    },
+    'EfficientNet-Lite0': {
+        'model_name': 'tf_efficientnet_lite0',
+        'pretrained': True,
+        'description': 'EfficientNet Lite0 (student)'
+    }
+}
+
+
+class DistillationTrainer(ModelTrainer):
+    """Trains a student model from the soft labels of a frozen teacher"""
+
+    def __init__(self, model_name, model, teacher, device, num_classes,
+                 save_dir="saved_models", temperature=4.0, alpha=0.7):
+        super().__init__(model_name, model, device, num_classes, save_dir)
+        self.teacher = teacher.to(device)
+        self.teacher.eval()
+        self.temperature = temperature
+        self.alpha = alpha
+        self.kd_loss_fn = torch.nn.KLDivLoss(reduction="batchmean")
+
+    def calculate_metrics(self, ims, gts):
+        preds = self.model(ims)
+        hard_loss = self.loss_fn(preds, gts)
+
+        # Validation keeps the plain cross-entropy so early stopping is comparable
+        if self.model.training:
+            with torch.no_grad():
+                teacher_preds = self.teacher(ims)
+            T = self.temperature
+            soft_loss = self.kd_loss_fn(
+                torch.log_softmax(preds / T, dim=1),
+                torch.softmax(teacher_preds / T, dim=1)
+            ) * (T * T)
+            loss = self.alpha * soft_loss + (1 - self.alpha) * hard_loss
+        else:
+            loss = hard_loss
+
+        acc = (torch.argmax(preds, dim=1) == gts).sum().item()
+        f1 = self.f1_score(preds, gts)
+        return loss, acc, f1
+
+
+def benchmark_model(model, device, im_size=224, runs=50, warmup=10):
+    """Measure single-image latency, parameter count and on-disk size"""
+
+    model = model.to(device)
+    model.eval()
+    dummy = torch.randn(1, 3, im_size, im_size, device=device)
+
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(dummy)
+        if str(device).startswith('cuda'):
+            torch.cuda.synchronize()
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(dummy)
+        if str(device).startswith('cuda'):
+            torch.cuda.synchronize()
+        latency_ms = (time.perf_counter() - start) / runs * 1000
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+
+    return {
+        'latency_ms': latency_ms,
+        'params_m': sum(p.numel() for p in model.parameters()) / 1e6,
+        'size_mb': buffer.getbuffer().nbytes / (1024 ** 2)
+    }
+
+
+class DistillationComparison(ModelComparison):
+    """Distills every student config from a trained teacher and compares them"""
+
+    def __init__(self, teacher, teacher_name, model_configs, num_classes, class_names,
+                 device='cuda', temperature=4.0, alpha=0.7):
+        super().__init__(model_configs, num_classes, class_names, device)
+        self.teacher = teacher
+        self.teacher_name = teacher_name
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def train_single_model(self, model_key, train_loader, val_loader, epochs=10, patience=5):
+        """Distill a single student from the teacher"""
+
+        print(f"\n{'#'*80}")
+        print(f"# Distilling {model_key} from {self.teacher_name}")
+        print(f"{'#'*80}\n")
+
+        model = self.create_model(self.model_configs[model_key])
+
+        trainer = DistillationTrainer(
+            model_name=model_key,
+            model=model,
+            teacher=self.teacher,
+            device=self.device,
+            num_classes=self.num_classes,
+            save_dir="saved_models",
+            temperature=self.temperature,
+            alpha=self.alpha
+        )
+
+        history = trainer.train(
+            train_loader=train_loader,
+            val_loader=val_loader,
+            epochs=epochs,
+            patience=patience
+        )
+
+        self.results[model_key] = {
+            'trainer': trainer,
+            'history': history,
+            'model': trainer.model
+        }
+
+        return history
+
+    def export_student(self, model_key, export_dir="saved_models"):
+        """Export the best student weights under the name the app's load_model expects"""
+
+        trainer = self.results[model_key]['trainer']
+        trainer.load_best_model()
+
+        model_path = f"{export_dir}/{model_key}_best_model.pth"
+        torch.save(trainer.model.cpu().state_dict(), model_path)
+        trainer.model.to(self.device)
+        print(f"Student {model_key} exported to {model_path}")
+        return model_path
+
+    def generate_efficiency_table(self, test_loader, teacher_accuracy=None):
+        """Accuracy vs latency vs size for the teacher and all students"""
+
+        if not hasattr(self, 'evaluation_results'):
+            print("Please run evaluate_all_models() first!")
+            return None
+
+        if teacher_accuracy is None:
+            teacher_evaluator = ModelEvaluator(
+                model=self.teacher,
+                model_name=self.teacher_name,
+                device=self.device,
+                class_names=self.class_names
+            )
+            teacher_accuracy = teacher_evaluator.evaluate(test_loader)['accuracy']
+
+        rows = []
+        candidates = [(self.teacher_name, self.teacher, teacher_accuracy)]
+        for model_key, data in self.evaluation_results.items():
+            candidates.append((model_key, data['evaluator'].model, data['results']['accuracy']))
+
+        for model_key, model, accuracy in candidates:
+            # Edge devices have no GPU, so latency is measured on CPU
+            stats = benchmark_model(model, 'cpu')
+            rows.append({
+                'Model': model_key,
+                'Accuracy': round(accuracy, 4),
+                'CPU Latency (ms)': round(stats['latency_ms'], 2),
+                'Params (M)': round(stats['params_m'], 2),
+                'Size (MB)': round(stats['size_mb'], 2)
+            })
+            model.to(self.device)
+
+        df = pd.DataFrame(rows)
+
+        print("\n" + "="*80)
+        print("DISTILLATION EFFICIENCY TABLE")
+        print("="*80 + "\n")
+        print(df.to_string(index=False))
+        print("\n" + "="*80 + "\n")
+
+        df.to_csv('saved_models/distillation_comparison.csv', index=False)
+        print("Efficiency table saved to 'saved_models/distillation_comparison.csv'")
+
+        return df
+
+
+def run_distillation_experiment(
+    teacher,
+    teacher_name='EfficientNetV2-Small',
+    student_configs=STUDENT_CONFIGS,
+    train_dl=tr_dl,
+    val_dl=val_dl,
+    test_dl=ts_dl,
+    classes=classes,
+    epochs=10,
+    patience=5,
+    device='cuda'
+):
+    """
+    Distill compact students from the best teacher, export them and
+    compare accuracy, latency and size
+    """
+
+    distillation = DistillationComparison(
+        teacher=teacher,
+        teacher_name=teacher_name,
+        model_configs=student_configs,
+        num_classes=len(classes),
+        class_names=list(classes.keys()),
+        device=device
+    )
+
+    distillation.train_all_models(
+        train_loader=train_dl,
+        val_loader=val_dl,
+        epochs=epochs,
+        patience=patience
+    )
+    distillation.evaluate_all_models(test_loader=test_dl)
+
+    for model_key in distillation.results.keys():
+        distillation.export_student(model_key)
+
+    efficiency_df = distillation.generate_efficiency_table(test_loader=test_dl)
+
+    return distillation, efficiency_df
+
+
+# Distill students from the best EfficientNetV2 model trained above
+teacher_trainer = comparison.results['EfficientNetV2-Small']['trainer']
+teacher_trainer.load_best_model()
+
+distillation, efficiency_df = run_distillation_experiment(
+    teacher=teacher_trainer.model,
+    teacher_name='EfficientNetV2-Small',
+    student_configs=STUDENT_CONFIGS,
+    epochs=4,  # Adjust as needed
+    patience=5,
+    device='cuda' if torch.cuda.is_available() else 'cpu'
+)
+
+
+"""##STRUCTURED PRUNING AND COMPRESSION"""
+
+def _prune_conv_out(conv, keep):
+    conv.weight = torch.nn.Parameter(conv.weight.data[keep].clone())
+    if conv.bias is not None:
+        conv.bias = torch.nn.Parameter(conv.bias.data[keep].clone())
+    conv.out_channels = len(keep)
+
+
+def _prune_conv_in(conv, keep):
+    conv.weight = torch.nn.Parameter(conv.weight.data[:, keep].clone())
+    conv.in_channels = len(keep)
+
+
+def _prune_depthwise(conv, keep):
+    conv.weight = torch.nn.Parameter(conv.weight.data[keep].clone())
+    if conv.bias is not None:
+        conv.bias = torch.nn.Parameter(conv.bias.data[keep].clone())
+    conv.in_channels = conv.out_channels = conv.groups = len(keep)
+
+
+def _prune_bn(bn, keep):
+    bn.weight = torch.nn.Parameter(bn.weight.data[keep].clone())
+    bn.bias = torch.nn.Parameter(bn.bias.data[keep].clone())
+    bn.running_mean = bn.running_mean[keep].clone()
+    bn.running_var = bn.running_var[keep].clone()
+    bn.num_features = len(keep)
+
+
+def _prune_se(se, keep):
+    if se is None or not hasattr(se, 'conv_reduce'):
+        return
+    _prune_conv_in(se.conv_reduce, keep)
+    _prune_conv_out(se.conv_expand, keep)
+
+
+class StructuredPruner:
+    """
+    Channel pruning for timm EfficientNet blocks. Only the expanded (hidden)
+    channels inside each block and the head channels are removed, so residual
+    connections keep their width and the result is a smaller dense model.
+    """
+
+    def __init__(self, sparsity, round_to=8, min_channels=8):
+        self.sparsity = sparsity
+        self.round_to = round_to
+        self.min_channels = min_channels
+
+    def _keep_indices(self, scores):
+        n = scores.numel()
+        n_keep = int(round(n * (1 - self.sparsity) / self.round_to)) * self.round_to
+        n_keep = min(n, max(self.min_channels, n_keep))
+        keep = torch.argsort(scores, descending=True)[:n_keep]
+        return torch.sort(keep).values
+
+    def prune_block(self, block):
+        """Prune one InvertedResidual / EdgeResidual block in place"""
+
+        # InvertedResidual: conv_pw -> bn1 -> conv_dw -> bn2 -> se -> conv_pwl
+        if hasattr(block, 'conv_pw') and hasattr(block, 'conv_dw'):
+            scores = block.bn1.weight.data.abs() * block.bn2.weight.data.abs()
+            keep = self._keep_indices(scores).to(scores.device)
+            _prune_conv_out(block.conv_pw, keep)
+            _prune_bn(block.bn1, keep)
+            _prune_depthwise(block.conv_dw, keep)
+            _prune_bn(block.bn2, keep)
+            _prune_se(block.se, keep)
+            _prune_conv_in(block.conv_pwl, keep)
+            return True
+
+        # EdgeResidual: conv_exp -> bn1 -> se -> conv_pwl
+        if hasattr(block, 'conv_exp'):
+            scores = block.bn1.weight.data.abs()
+            keep = self._keep_indices(scores).to(scores.device)
+            _prune_conv_out(block.conv_exp, keep)
+            _prune_bn(block.bn1, keep)
+            _prune_se(block.se, keep)
+            _prune_conv_in(block.conv_pwl, keep)
+            return True
+
+        return False
+
+    def prune_head(self, model):
+        """Prune conv_head -> bn2 -> classifier"""
+        scores = model.bn2.weight.data.abs() * model.classifier.weight.data.abs().sum(dim=0)
+        keep = self._keep_indices(scores).to(scores.device)
+        _prune_conv_out(model.conv_head, keep)
+        _prune_bn(model.bn2, keep)
+        model.classifier.weight = torch.nn.Parameter(model.classifier.weight.data[:, keep].clone())
+        model.classifier.in_features = len(keep)
+        model.num_features = len(keep)
+
+    def prune(self, model):
+        """Return a pruned copy of the model"""
+        pruned = copy.deepcopy(model).cpu()
+        n_blocks = 0
+        for stage in pruned.blocks:
+            for block in stage:
+                n_blocks += int(self.prune_block(block))
+        self.prune_head(pruned)
+        print(f"Pruned {n_blocks} blocks + head at sparsity {self.sparsity:.0%}")
+        return pruned
+
+
+def peak_inference_memory(model, device, im_size=224, batch_size=1):
+    """Peak GPU memory (MB) of one forward pass; None when running on CPU"""
+
+    if not str(device).startswith('cuda'):
+        return None
+
+    model = model.to(device)
+    model.eval()
+    torch.cuda.empty_cache()
+    torch.cuda.reset_peak_memory_stats(device)
+    with torch.no_grad():
+        model(torch.randn(batch_size, 3, im_size, im_size, device=device))
+    torch.cuda.synchronize()
+    return torch.cuda.max_memory_allocated(device) / (1024 ** 2)
+
+
+def run_pruning_experiment(
+    base_model_path='saved_models/EfficientNetV2-Small_best_model.pth',
+    base_config=MODEL_CONFIGS['EfficientNetV2-Small'],
+    sparsity_levels=(0.3, 0.5, 0.7),
+    train_dl=tr_dl,
+    val_dl=val_dl,
+    test_dl=ts_dl,
+    classes=classes,
+    finetune_epochs=2,
+    finetune_lr=1e-4,
+    device='cuda'
+):
+    """
+    Prune the EfficientNetV2 weights at each sparsity level, fine-tune briefly,
+    export a TorchScript model and report latency, memory and per-class F1
+    """
+
+    class_names = list(classes.keys())
+    base_model = timm.create_model(
+        base_config['model_name'],
+        pretrained=False,
+        num_classes=len(classes)
+    )
+    base_model.load_state_dict(torch.load(base_model_path, map_location='cpu'))
+    base_model.eval()
+
+    candidates = [(0.0, 'EfficientNetV2-Small', base_model)]
+    for sparsity in sparsity_levels:
+        model_key = f"EfficientNetV2-Small-pruned{int(sparsity * 100)}"
+        pruned = StructuredPruner(sparsity).prune(base_model)
+
+        # Short fine-tuning pass to recover accuracy after pruning
+        trainer = ModelTrainer(
+            model_name=model_key,
+            model=pruned,
+            device=device,
+            num_classes=len(classes),
+            save_dir="saved_models"
+        )
+        trainer.optimizer = torch.optim.Adam(params=trainer.model.parameters(), lr=finetune_lr)
+        trainer.train(train_loader=train_dl, val_loader=val_dl, epochs=finetune_epochs, patience=finetune_epochs)
+        trainer.load_best_model()
+
+        candidates.append((sparsity, model_key, trainer.model))
+
+    rows, per_class_f1 = [], {}
+    for sparsity, model_key, model in candidates:
+        evaluator = ModelEvaluator(model=model.to(device), model_name=model_key, device=device, class_names=class_names)
+        results = evaluator.evaluate(test_dl)
+        report, _ = evaluator.calculate_detailed_metrics(results)
+
+        peak_mem = peak_inference_memory(model, device)
+        stats = benchmark_model(model, 'cpu')
+
+        row = {
+            'Model': model_key,
+            'Sparsity': sparsity,
+            'Accuracy': round(results['accuracy'], 4),
+            'F1-Score (Macro)': round(report['macro avg']['f1-score'], 4),
+            'CPU Latency (ms)': round(stats['latency_ms'], 2),
+            'Params (M)': round(stats['params_m'], 2),
+            'Size (MB)': round(stats['size_mb'], 2),
+            'Peak GPU Memory (MB)': round(peak_mem, 1) if peak_mem is not None else None
+        }
+        per_class_f1[model_key] = {name: report[name]['f1-score'] for name in class_names if name in report}
+        for name, f1 in per_class_f1[model_key].items():
+            row[f"F1 {name}"] = round(f1, 4)
+        rows.append(row)
+
+        # TorchScript keeps the pruned shapes, so the app can load it without this code
+        if sparsity > 0:
+            scripted = torch.jit.trace(model.cpu().eval(), torch.randn(1, 3, im_size, im_size))
+            export_path = f"saved_models/{model_key}.pt"
+            scripted.save(export_path)
+            print(f"Exported {model_key} to {export_path}")
+
+    df = pd.DataFrame(rows)
+
+    print("\n" + "="*80)
+    print("PRUNING OPERATING POINTS")
+    print("="*80 + "\n")
+    print(df[[c for c in df.columns if not c.startswith('F1 ')]].to_string(index=False))
+    print("\n" + "="*80 + "\n")
+
+    df.to_csv('saved_models/pruning_report.csv', index=False)
+    with open('saved_models/pruning_per_class_f1.json', 'w') as f:
+        json.dump(per_class_f1, f, indent=4)
+    print("Pruning report saved to 'saved_models/pruning_report.csv'")
+
+    return df
+
+
+pruning_df = run_pruning_experiment(
+    sparsity_levels=(0.3, 0.5, 0.7),
+    finetune_epochs=2,  # Adjust as needed
+    device='cuda' if torch.cuda.is_available() else 'cpu'
+)
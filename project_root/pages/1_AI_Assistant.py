@@ -1,57 +1,162 @@
 # pages/1_AI_Assistant_openai.py
 import streamlit as st
+import streamlit.components.v1 as components
 import os
+import hashlib
 import traceback
-import openai
+import uuid
+from utils.telemetry import start_exporters, stage_timer
+from utils.profiling import profile_page
+from utils.llm import chat_completion, chat_completion_stream, OPENAI_API_KEY, OPENAI_MODEL
+from utils.chat_memory import load_chat_memory, summary_messages, message_tokens, SUMMARY_MAX_TOKENS
+from utils.market_store import load_market_store
+from utils.weather_store import get_weather_snapshot
+from utils.rag import load_knowledge_index, weather_snippets, diagnosis_snippets, build_messages
+from utils.translation import language_selector
+from utils.voice import load_speech_models, decode_wav, split_sentences, audio_queue_html
 
-# ---------------- CONFIG ----------------
-# Put your OpenAI API key here for local testing:
-OPENAI_API_KEY = "your-API"
-# Choose OpenAI model (use a smaller/cheaper model for demos)
-# Examples: "gpt-4o-mini", "gpt-4o", "gpt-4o-mini-unstable", "gpt-3.5-turbo"
-OPENAI_MODEL = "gpt-4o-mini"
-# ----------------------------------------
+# OpenAI key and model come from the OPENAI_API_KEY / OPENAI_MODEL environment
+# variables (see utils/llm.py), shared with advice generation and translation
 
 st.set_page_config(page_title="AI Assistant (OpenAI)", page_icon="🤖", layout="centered")
+start_exporters()
+
+# Opt-in profiling of this rerun (PROFILE_PAGES=1 or ?profile=1)
+profile_page("assistant")
 st.title("AI Assistant — (OpenAI fallback for demo)")
-st.write("Using OpenAI for inference (uses local OpenAI credits). Replace API key locally before running.")
+st.write("Using OpenAI for inference (uses local OpenAI credits). Set OPENAI_API_KEY before running.")
 
-prompt = st.text_area("Enter your prompt (single-turn):", value="Explain what crop rotation is in simple terms.", height=160)
-max_tokens = st.slider("Max tokens (approx response length)", 32, 1024, 256, 32)
-temperature = st.slider("Temperature", 0.0, 1.2, 0.7, 0.1)
-run = st.button("Generate")
+# Local context injected into the prompt (knowledge base, mandi prices, forecast, diagnosis)
+with st.sidebar:
+    lang = language_selector()
+    st.subheader("💬 Conversations")
+    # Chats belong to this browser session's random id. There is no login, so a
+    # typed name or phone number is only a display label and never selects chats.
+    if "guest_id" not in st.session_state:
+        st.session_state["guest_id"] = f"guest-{uuid.uuid4().hex[:8]}"
+    user_id = st.session_state["guest_id"]
+    display_name = st.text_input("Your name (optional):", key="chat_display_name").strip()
+    st.caption(f"Chatting as {display_name or 'guest'}; chats are kept for this browser session.")
 
-if run:
-    if not prompt.strip():
-        st.warning("Please enter a prompt.")
-        st.stop()
+    memory = load_chat_memory(OPENAI_MODEL)
+    sessions = memory.sessions(user_id)
+    if st.button("➕ New chat") or not sessions:
+        st.session_state["chat_session"] = memory.create_session(user_id)
+        sessions = memory.sessions(user_id)
+    session_ids = [s["id"] for s in sessions]
+    current = st.session_state.get("chat_session")
+    session_id = st.selectbox(
+        "Chat:", session_ids, index=session_ids.index(current) if current in session_ids else 0,
+        format_func=lambda i: next(s["title"] for s in sessions if s["id"] == i)
+    )
+    st.session_state["chat_session"] = session_id
+
+    st.subheader("📚 Local context")
+    use_context = st.checkbox("Use local project data", value=True)
+    context_city = st.text_input("Forecast location:", value="Delhi")
+    last_diagnosis = st.session_state.get("last_diagnosis")
+    use_diagnosis = st.checkbox(
+        f"Include my last diagnosis ({last_diagnosis['label']})" if last_diagnosis else "Include my last diagnosis",
+        value=bool(last_diagnosis), disabled=not last_diagnosis
+    )
+
+    st.subheader("🎙️ Voice")
+    voice_mode = st.checkbox("Voice mode (speak questions, hear answers)")
+
+    with st.expander("Response settings"):
+        max_tokens = st.slider("Max tokens (approx response length)", 32, 1024, 256, 32)
+        temperature = st.slider("Temperature", 0.0, 1.2, 0.7, 0.1)
+
+for message in memory.messages(session_id):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
+prompt = st.chat_input("Ask about crops, diseases, weather or mandi prices…")
 
-    if OPENAI_API_KEY == "sk_your_openai_key_here" or not OPENAI_API_KEY.strip():
-        st.error("OpenAI API key not set. Edit this file and put your key in OPENAI_API_KEY.")
+# Voice questions: the shared Whisper model transcribes the recording chunk by chunk
+speech = load_speech_models() if voice_mode else None
+if speech is not None:
+    if speech.tts is None:
+        st.caption("Spoken answers need a Piper voice (PIPER_VOICE); answers will be shown as text.")
+    if speech.stt is None:
+        if "stt" in speech.errors and not speech.errors["stt"].startswith("ImportError"):
+            st.info("Speech recognition could not be loaded on this server; please type instead.")
+        else:
+            st.info("Speech recognition is not installed on this server (faster-whisper); please type instead.")
+    else:
+        recording = st.audio_input("Speak your question")
+        # The recording stays in the widget across reruns; transcribe each one once
+        digest = hashlib.sha1(recording.getvalue()).hexdigest() if recording else None
+        if recording and digest != st.session_state.get("voice_recording") and not prompt:
+            st.session_state["voice_recording"] = digest
+            samples, _ = decode_wav(recording.getvalue())
+            transcript, pieces = st.empty(), []
+            for piece in speech.transcribe_chunks(samples, language=lang):
+                pieces.append(piece)
+                transcript.caption("🎙️ " + " ".join(pieces))
+            prompt = " ".join(pieces) or None
+
+if prompt:
+    if not OPENAI_API_KEY.strip():
+        st.error("OpenAI API key not set. Set the OPENAI_API_KEY environment variable and restart the app.")
         st.stop()
 
-    openai.api_key = OPENAI_API_KEY
+    with st.chat_message("user"):
+        st.markdown(prompt)
+
+    snippets = []
+    if use_context:
+        index = load_knowledge_index()
+        index.sync_knowledge()
+        index.refresh_market(load_market_store())
+        pinned = diagnosis_snippets(last_diagnosis if use_diagnosis else None)
+        if context_city.strip():
+            # Offline-first snapshot: no API call when a recent forecast is stored
+            pinned += weather_snippets(get_weather_snapshot(context_city.strip()))
+        retrieve_timer = stage_timer("assistant.retrieve")
+        snippets = index.retrieve(prompt, pinned=pinned)
+        retrieve_ms = retrieve_timer.stop()
+
+    # Summary of older turns + recent turns verbatim, bounded by CHAT_HISTORY_TOKENS
+    messages = build_messages(prompt, snippets, memory.history(session_id), language=lang)
+
     try:
-        with st.spinner("Calling OpenAI..."):
-            # Use Chat Completions
-            resp = openai.ChatCompletion.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers in clear, simple English."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-            # Extract text
-            text = resp["choices"][0]["message"]["content"]
-            st.success("✅ Response (OpenAI)")
-            st.markdown(text)
+        with st.chat_message("assistant"):
+            if speech is not None and speech.tts is not None:
+                # Stream the answer and speak each sentence as soon as it is complete
+                placeholder, text, usage = st.empty(), "", {}
+                deltas = chat_completion_stream(OPENAI_API_KEY, OPENAI_MODEL, messages,
+                                                max_tokens=max_tokens, temperature=temperature)
+                for text, sentence in split_sentences(deltas):
+                    placeholder.markdown(text)
+                    audio = speech.synthesize(sentence) if sentence else None
+                    if audio:
+                        components.html(audio_queue_html(audio), height=0)
+            else:
+                with st.spinner("Calling OpenAI..."):
+                    text, usage = chat_completion(
+                        OPENAI_API_KEY, OPENAI_MODEL, messages,
+                        max_tokens=max_tokens, temperature=temperature
+                    )
+                with stage_timer("assistant.render"):
+                    st.markdown(text)
+
+            if snippets:
+                with st.expander(f"Context used ({len(snippets)} snippets, retrieved in {retrieve_ms:.1f} ms)"):
+                    for snippet in snippets:
+                        st.markdown(f"**{snippet['title']}**  \n{snippet['text']}")
 
             # optional: show usage/cost info
-            if "usage" in resp:
-                usage = resp["usage"]
-                st.caption(f"Tokens — prompt: {usage.get('prompt_tokens')}, completion: {usage.get('completion_tokens')}, total: {usage.get('total_tokens')}")
+            if usage:
+                st.caption(f"Tokens — prompt: {usage.get('prompt_tokens')} (history ≈ {message_tokens(messages[1:-1], OPENAI_MODEL)}), completion: {usage.get('completion_tokens')}, total: {usage.get('total_tokens')}")
+
+        memory.append(session_id, "user", prompt)
+        memory.append(session_id, "assistant", text)
+        # Fold the oldest turns into the running summary once history outgrows its budget
+        memory.compact(session_id, summarize=lambda previous, turns: chat_completion(
+            OPENAI_API_KEY, OPENAI_MODEL, summary_messages(previous, turns),
+            max_tokens=SUMMARY_MAX_TOKENS, temperature=0.2
+        )[0])
     except Exception as e:
         st.error("OpenAI API error. See details below.")
         st.write(type(e).__name__, str(e))
@@ -1,13 +1,66 @@
 import streamlit as st
-from utils.model_inference import load_model, predict_image
+from utils.model_inference import (load_model, load_cascade, predict_image, available_variants,
+                                   DEFAULT_VARIANT, CASCADE_FAST_VARIANT)
+from utils.cam import predict_with_heatmap, overlay_heatmap
+from utils.ood_filter import load_ood_filter, OOD_FILTER_DEFAULT, REJECTION_MESSAGES
+from utils.embedding_index import load_embedding_index, predict_and_index
+from utils.advice import load_advice, followup_messages, CROP_STAGES
+from utils.translation import language_selector, label_text, load_translator, t
+from utils.llm import chat_completion, OPENAI_API_KEY, OPENAI_MODEL
+from utils.telemetry import start_exporters, stage_timer
+from utils.profiling import profile_page
 from PIL import Image
 
+start_exporters()
+
+# Opt-in profiling of this rerun (PROFILE_PAGES=1 or ?profile=1)
+profile_page("detector")
 st.title("🔍 Crop Disease Detector")
 st.markdown("Upload a leaf image for instant diagnosis.")
 st.markdown("---")
 
+# Pick the detector variant (distilled students are lighter for low-end devices)
+variants = available_variants() or [DEFAULT_VARIANT]
+variant = st.sidebar.selectbox(
+    "Detector model",
+    variants,
+    index=variants.index(DEFAULT_VARIANT) if DEFAULT_VARIANT in variants else 0
+)
+
+use_tta = st.sidebar.checkbox(
+    "Extra checks for uncertain results (TTA)",
+    help="Re-scores low-confidence diagnoses over flipped, cropped and rescaled views of the photo."
+)
+
+# Cascade: a fast student answers easy photos, hard ones go to the selected model
+use_cascade = False
+if CASCADE_FAST_VARIANT in variants and CASCADE_FAST_VARIANT != variant:
+    use_cascade = st.sidebar.checkbox(
+        "Fast cascade mode",
+        help=f"{CASCADE_FAST_VARIANT} answers confident cases; uncertain ones are escalated to {variant}."
+    )
+
+use_ood_filter = st.sidebar.checkbox(
+    "Reject unclear or non-leaf photos",
+    value=OOD_FILTER_DEFAULT,
+    help="Blurry, badly exposed or non-leaf photos are rejected before the full diagnosis runs. "
+         "Off by default until the thresholds are calibrated on field photos."
+)
+
+remember_cases = st.sidebar.checkbox(
+    "Remember diagnoses and show similar past cases",
+    help="Stores an embedding of each photo so agronomists can retrieve similar confirmed cases."
+)
+
+lang = language_selector()
+crop_stage = st.sidebar.selectbox("Crop stage", list(CROP_STAGES), index=1, format_func=CROP_STAGES.get)
+
 # Load the model when the app runs
-model = load_model()
+model = load_model(variant)
+cascade = load_cascade(CASCADE_FAST_VARIANT, variant) if use_cascade else None
+ood_filter = load_ood_filter() if use_ood_filter else None
+# Embeddings need the timm feature API, which TorchScript exports don't have
+embedding_index = load_embedding_index(variant) if remember_cases and hasattr(model, "forward_features") else None
 
 uploaded_file = st.file_uploader(
     "Choose a leaf image (JPG or PNG)", 
@@ -19,26 +72,125 @@ if uploaded_file is not None:
     image = Image.open(uploaded_file)
     st.image(image, caption='Uploaded Image', use_column_width=True)
     
+    show_heatmap = st.checkbox("Show where the model looked (heatmap)")
+
     # 2. Run prediction on a button click
     if st.button('Diagnose Crop'):
-        with st.spinner('Analyzing image for diseases...'):
-            # Call the prediction function
-            label, confidence = predict_image(uploaded_file, model)
+        # Cheap pre-filter: skip the full model for junk uploads
+        accepted, reason = True, None
+        if ood_filter is not None:
+            accepted, reason, _ = ood_filter.check(image)
+
+        if not accepted:
+            st.warning(REJECTION_MESSAGES[reason])
+        else:
+            with st.spinner('Analyzing image for diseases...'):
+                # Call the prediction function (the heatmap comes from the same forward pass)
+                # Only one inference path runs; the options it cannot combine with are reported below
+                stage, similar = None, None
+                requested = {"TTA": use_tta, "fast cascade": use_cascade, "similar cases": remember_cases}
+                if show_heatmap:
+                    label, confidence, heatmap = predict_with_heatmap(uploaded_file, model, variant)
+                    path, applied = "the heatmap", set()
+                elif cascade is not None:
+                    label, confidence, stage = cascade.predict(uploaded_file)
+                    heatmap = None
+                    path, applied = "fast cascade mode", {"fast cascade"}
+                elif embedding_index is not None:
+                    label, confidence, similar, stage = predict_and_index(uploaded_file, model, embedding_index)
+                    heatmap = None
+                    path, applied = "similar-case lookup", {"similar cases"}
+                else:
+                    label, confidence = predict_image(uploaded_file, model, tta=use_tta)
+                    heatmap = None
+                    path, applied = "this model", {"TTA"}
+                ignored = [name for name, on in requested.items() if on and name not in applied]
             
-            st.markdown("### Diagnosis Result:")
+                # Shared with the AI Assistant as context for follow-up questions
+                st.session_state["last_diagnosis"] = {"label": label, "confidence": confidence, "file": uploaded_file.name}
+
+                render_timer = stage_timer("detector.render")
+                st.markdown("### Diagnosis Result:")
             
-            # Use color-coding based on the prediction
-            if "healthy" in label.lower():
-                st.success(f"**Status: {label}**")
-                st.balloons()
-            else:
-                st.error(f"**Disease Detected: {label}**")
+                # Use color-coding based on the prediction
+                if "healthy" in label.lower():
+                    st.success(f"**{t('detector.status', lang, label=label_text(label, lang))}**")
+                    st.balloons()
+                else:
+                    st.error(f"**{t('detector.disease', lang, label=label_text(label, lang))}**")
                 
-            st.info(f"Confidence: **{confidence:.2%}**")
+                st.info(t("detector.confidence", lang, confidence=f"**{confidence:.2%}**"))
+                if stage in ("fast", "accurate"):
+                    st.caption(f"Answered by the {'fast' if stage == 'fast' else 'full'} model.")
+                elif stage in ("exact", "duplicate"):
+                    st.caption("Answered from a previously diagnosed, matching photo.")
+                if ignored:
+                    st.caption(f"Not applied with {path}: {', '.join(ignored)}.")
+
+                if similar:
+                    st.markdown("**Similar past cases:**")
+                    st.dataframe([
+                        {
+                            "Diagnosis": case["confirmed_label"] or case["label"],
+                            "Confirmed": bool(case["confirmed_label"]),
+                            "Similarity": f"{case['similarity']:.1%}",
+                            "Date": case["created_at"][:10],
+                        }
+                        for case in similar
+                    ])
+
+                if heatmap is not None:
+                    st.image(overlay_heatmap(image, heatmap), caption='Regions that drove the diagnosis', use_column_width=True)
+                elif show_heatmap:
+                    st.caption("Heatmap is not available for this model variant.")
             
-            # Provide actionable advice (you can integrate the LLM here!)
-            st.markdown("---")
-            st.markdown(f"**Recommended Action for {label}:**")
-            # This is a placeholder for more detailed advice.
-            # In the future, we can use the AI Assistant to generate recommendations.
-            st.write("Please consult with a local agricultural expert for specific treatment options.")
\ No newline at end of file
+                render_timer.stop()
+
+    # Treatment advice is pre-generated per class x language x stage, so it renders instantly;
+    # only follow-up questions call the LLM. Kept outside the button so follow-ups survive reruns.
+    diagnosis = st.session_state.get("last_diagnosis")
+    if diagnosis and diagnosis.get("file") == uploaded_file.name:
+        label = diagnosis["label"]
+        advice = load_advice().get(label, lang, crop_stage)
+        st.markdown("---")
+        st.markdown(f"**{t('detector.action', lang, label=label_text(label, lang))}**")
+        if advice["text"]:
+            # English fallback text goes through the cached on-demand translator
+            text = advice["text"] if advice["language"] == lang else load_translator().translate(advice["text"], lang)
+            st.write(text)
+            if advice["source"] != "cache":
+                st.caption(t("detector.general_advice", lang))
+            if advice["stale"]:
+                st.caption(t("detector.advice_stale", lang))
+        else:
+            st.write(t("detector.consult", lang))
+
+        followups = st.session_state.setdefault("advice_followups", {}).setdefault(label, [])
+        for question, answer in followups:
+            st.markdown(f"**Q:** {question}  \n{answer}")
+        with st.form("advice_followup", clear_on_submit=True):
+            question = st.text_input(f"Ask a follow-up question about {label_text(label)}:")
+            asked = st.form_submit_button("Ask")
+        if asked and question.strip():
+            if not OPENAI_API_KEY:
+                st.info("Follow-up questions need OPENAI_API_KEY to be set.")
+            else:
+                try:
+                    with st.spinner("Asking the assistant..."):
+                        answer, _ = chat_completion(
+                            OPENAI_API_KEY, OPENAI_MODEL,
+                            followup_messages(label, advice["text"], question.strip(), lang),
+                            max_tokens=300, temperature=0.3
+                        )
+                    followups.append((question.strip(), answer))
+                    st.markdown(f"**Q:** {question.strip()}  \n{answer}")
+                except Exception as e:
+                    st.error(f"Could not reach the assistant: {type(e).__name__}: {e}")
+
+if cascade is not None:
+    with st.sidebar.expander("Cascade statistics"):
+        st.json(cascade.summary())
+
+if ood_filter is not None:
+    with st.sidebar.expander("Photo pre-filter statistics"):
+        st.json(ood_filter.summary())
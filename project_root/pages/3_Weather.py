@@ -1,9 +1,22 @@
 # pages/Weather_Dashboard.py
 import streamlit as st
 import pandas as pd
-from utils.api_handlers import get_weather, get_weather_icon, detect_severe_alerts, crop_advisory, irrigation_advice
+from utils.api_handlers import get_weather_icon, detect_severe_alerts, crop_advisory, irrigation_advice
+from utils.telemetry import start_exporters, stage_timer
+from utils.profiling import profile_page
+from utils.weather_analytics import hourly_chart_frame
+from utils.weather_archive import forecast_skill
+from utils.irrigation import read_fields, irrigation_schedule
+from utils.weather_store import get_weather_snapshot, start_prefetcher
+from utils.translation import language_selector, t
 
 st.set_page_config(page_title="Farmer Weather Dashboard", layout="wide")
+start_exporters()
+# Keeps snapshots of WEATHER_LOCATIONS fresh so the page works offline
+start_prefetcher()
+
+# Opt-in profiling of this rerun (PROFILE_PAGES=1 or ?profile=1)
+profile_page("weather")
 st.title("🌾 Farmer Weather Dashboard")
 st.markdown("Get 5-day forecast, charts, alerts and crop advisories.")
 
@@ -14,17 +27,38 @@ with col_input:
 with col_crop:
     crop_choice = st.selectbox("Crop (for advisory):", ["Wheat","Rice","Maize","Generic"])
 
+# Irrigation planner input (one row per registered field)
+with st.sidebar:
+    # Advisories and alerts come from the pre-translated template table
+    lang = language_selector()
+    st.subheader("💧 Irrigation Planner")
+    fields_file = st.file_uploader(
+        "Fields CSV", type=["csv"],
+        help="Columns: field_id, crop, soil, area_ha [, latitude, initial_depletion, mad]. "
+             "See data/sample_fields.csv."
+    )
+    default_lat = st.number_input("Default latitude", value=28.6, min_value=-66.0, max_value=66.0)
+
 if st.button("Get Weather"):
     with st.spinner("Fetching forecast..."):
-        result = get_weather(city_input, days=5)
+        result = get_weather_snapshot(city_input, days=5)
 
     if 'error' in result:
         st.error(result['error'])
     else:
+        render_timer = stage_timer("weather.render")
         city = result.get("city", city_input)
         current = result.get("current", {})
         daily = result.get("daily", [])
 
+        # Snapshot freshness
+        age = result.get("snapshot_age_minutes", 0)
+        age_text = f"{age:.0f} min ago" if age < 120 else f"{age / 60:.1f} h ago"
+        if result.get("stale"):
+            st.warning(f"Showing the last saved forecast (updated {age_text}); a refresh is running in the background.")
+        else:
+            st.caption(f"Forecast updated {age_text}.")
+
         # Top metrics
         st.subheader(f"Current Weather — {city}")
         icon = get_weather_icon(current.get("weatherCode", None) or current.get("weather_code", None) or 1000)
@@ -38,51 +72,101 @@ if st.button("Get Weather"):
         st.markdown(f"### {icon} Condition (code: {current.get('weatherCode','N/A')})")
         st.markdown("---")
 
-        # Charts - construct dataframe
+        # Charts - one daily frame, charted by column groups
         df = pd.DataFrame(daily)
         if not df.empty:
             df['date'] = pd.to_datetime(df['date'])
-            df = df.set_index('date').sort_index()
-            # Plot temps
-            temp_df = df[['temp_min','temp_max']].rename(columns={'temp_min':'Min','temp_max':'Max'})
+            df = df.set_index('date').sort_index().rename(columns={
+                'temp_min': 'Min', 'temp_max': 'Max', 'rain_chance': 'RainChance', 'wind_avg': 'Wind'
+            })
             st.subheader("Temperature (5-day)")
-            st.line_chart(temp_df)
+            st.line_chart(df[['Min', 'Max']])
 
-            # Rain probability
             st.subheader("Rain Probability (5-day)")
-            rain_df = df[['rain_chance']].rename(columns={'rain_chance':'RainChance'})
-            st.line_chart(rain_df)
+            st.line_chart(df[['RainChance']])
 
-            # Wind
             st.subheader("Wind Speed (5-day)")
-            wind_df = df[['wind_avg']].rename(columns={'wind_avg':'Wind'})
-            st.line_chart(wind_df)
+            st.line_chart(df[['Wind']])
         else:
             st.info("No daily forecast data available for charts.")
 
         st.markdown("---")
 
+        # Hourly outlook and agronomic indicators (computed once per fetch)
+        hourly = result.get("hourly", [])
+        indicators = result.get("indicators", {})
+        if hourly and indicators:
+            st.subheader("⏱️ Hourly Outlook")
+            frame = hourly_chart_frame(hourly, indicators)
+            st.line_chart(frame[['temperature', 'humidity']])
+            rain_cols = [c for c in frame.columns if c.startswith('rain_next_')]
+            st.line_chart(frame[['precipitationProbability'] + rain_cols])
+
+            m = st.columns(3)
+            m[0].metric(f"Growing degree days (base {indicators['gdd_base']:g}°C)", indicators["gdd_total"])
+            m[1].metric("Heat-stress hours (≥35°C)", indicators["heat_stress_total"])
+            m[2].metric("Spray windows", len(indicators["spray_windows"]))
+
+            if indicators["spray_windows"]:
+                st.markdown("**Spray windows** (calm, dry hours, UTC)")
+                st.dataframe(pd.DataFrame(indicators["spray_windows"]), hide_index=True)
+            else:
+                st.info("No calm, dry window of 3+ hours in the forecast — avoid spraying.")
+
+        st.markdown("---")
+
         # Alerts (rule-based)
         st.subheader("⚠️ Rule-based Alerts")
-        alerts = detect_severe_alerts(result)
+        alerts = detect_severe_alerts(result, lang)
         if alerts:
             for a in alerts:
                 st.error(a)
         else:
-            st.success("No severe alerts detected by rule-set.")
+            st.success(t("alert.none", lang))
 
         st.markdown("---")
 
         # Crop Advisory
         st.subheader("🌱 Crop Advisory")
-        advice = crop_advisory(result, crop_choice)
+        advice = crop_advisory(result, crop_choice, lang)
         st.info(advice)
 
         # Irrigation Advice
         st.subheader("💧 Irrigation Guidance")
-        irr = irrigation_advice(result)
+        irr = irrigation_advice(result, lang)
         st.info(irr)
 
+        # Field-level schedule from the ET water balance
+        if fields_file is not None:
+            st.subheader("🗓️ Irrigation Schedule")
+            try:
+                fields = read_fields(fields_file, default_latitude=default_lat)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                with stage_timer("weather.irrigation"):
+                    schedule = irrigation_schedule(fields, daily)
+                c = st.columns(3)
+                c[0].metric("Fields", len(fields))
+                c[1].metric("Fields needing water", schedule["field_id"].nunique())
+                c[2].metric("Total volume (m³)", f"{schedule['volume_m3'].sum():,.0f}")
+                if schedule.empty:
+                    st.success("No field reaches its irrigation threshold within the forecast.")
+                else:
+                    st.dataframe(schedule, hide_index=True)
+                    st.download_button("Download schedule (CSV)", schedule.to_csv(index=False),
+                                       file_name="irrigation_schedule.csv", mime="text/csv")
+
+        # Skill of past forecasts for this location, from the local archive
+        with st.expander("📚 Forecast archive — temperature skill (last 30 days)"):
+            now = pd.Timestamp.now(tz="UTC")
+            skill = forecast_skill(city, now - pd.Timedelta(days=30), now)
+            if skill.empty:
+                st.info("Not enough archived forecasts for this location yet.")
+            else:
+                skill["lead"] = skill["lead"].astype(str)
+                st.dataframe(skill.round(2), hide_index=True)
+
         st.markdown("---")
         st.subheader("5-Day Forecast (Readable View)")
         if daily:
@@ -105,7 +189,4 @@ if st.button("Get Weather"):
         else:
             st.info("No forecast data available.")
 
-
-
-
-       
+        render_timer.stop()
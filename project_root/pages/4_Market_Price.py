@@ -1,13 +1,19 @@
 import streamlit as st
-import pandas as pd
 
-from utils.api_handlers import load_market_data
+from utils.market_store import load_market_store
+from utils.price_alerts import load_price_alerts
+from utils.telemetry import start_exporters, stage_timer
+from utils.profiling import profile_page
+from utils.charting import PIXEL_BUDGET, downsample, page_bounds
 
 st.set_page_config(
     page_title="Market Price Tracker",
     layout="wide"
 )
+start_exporters()
 
+# Opt-in profiling of this rerun (PROFILE_PAGES=1 or ?profile=1)
+profile_page("market_price")
 st.title("📈 Market Price Tracker")
 
 st.markdown("---")
@@ -17,32 +23,70 @@ st.markdown("---")
 # ----------------------
 st.header("📊 Local Market Price Data")
 
-market_df = load_market_data()
+store = load_market_store()
 
-if market_df is None or market_df.empty:
+if len(store) == 0:
     st.warning("Market data could not be loaded.")
 else:
-    # Fix column names (optional but recommended)
-    market_df = market_df.rename(columns={
-        'Min_x0020_Price': 'Min_Price',
-        'Max_x0020_Price': 'Max_Price',
-        'Modal_x0020_Price': 'Modal_Price'
-    })
-
     # Filter by commodity
-    available_items = market_df['Commodity'].unique().tolist()
+    available_items = store.commodities()
     selected_item = st.selectbox("Select Commodity:", available_items)
 
-    filtered_df = market_df[market_df['Commodity'] == selected_item]
+    # Positional slice of the shared typed store, no per-rerun copies
+    with stage_timer("market.filter"):
+        filtered_df = store.select(selected_item)
+
+    # Price alerts, matched whenever new prices are ingested
+    with st.sidebar:
+        st.subheader("🔔 Price Alert")
+        with st.form("price_alert", clear_on_submit=True):
+            phone = st.text_input("Mobile number:")
+            alert_market = st.selectbox("Market:", sorted(filtered_df['Market'].unique()))
+            rule = st.radio("Notify when the modal price:", ["goes above", "goes below", "changes by (%)"])
+            value = st.number_input("Value (₹/quintal or %):", min_value=0.0, value=1000.0, step=50.0)
+            if st.form_submit_button("Subscribe"):
+                if not phone.strip():
+                    st.error("Enter a mobile number.")
+                else:
+                    kind = {"goes above": "above", "goes below": "below", "changes by (%)": "pct_change"}[rule]
+                    load_price_alerts().subscribe(phone.strip(), selected_item, alert_market, kind, value)
+                    st.success(f"Alert saved for {selected_item} at {alert_market}.")
+
+    render_timer = stage_timer("market.render")
 
     st.subheader(f"Price Trend for {selected_item}")
 
-    # Ensure charting works only if column is numeric
     try:
-        filtered_df['Modal_Price'] = pd.to_numeric(filtered_df['Modal_Price'], errors='coerce')
-        st.line_chart(filtered_df[['Arrival_Date', 'Modal_Price']].set_index('Arrival_Date'))
+        # Zoom re-queries the store; the chart never gets more than PIXEL_BUDGET points
+        first_day, last_day = (d.date() for d in store.date_range(selected_item))
+        col_zoom, col_method = st.columns([3, 1])
+        with col_method:
+            method = st.selectbox("Downsampling:", ["minmax", "lttb"],
+                                  help="min-max keeps price spikes; LTTB keeps the overall shape")
+        with col_zoom:
+            if first_day < last_day:
+                zoom = st.slider("Date range:", min_value=first_day, max_value=last_day,
+                                 value=(first_day, last_day), format="DD-MM-YYYY")
+            else:
+                zoom = (first_day, last_day)
+
+        with stage_timer("market.downsample"):
+            window = store.select(selected_item, zoom[0], zoom[1], columns=['Arrival_Date', 'Modal_Price'])
+            points = downsample(window, 'Arrival_Date', 'Modal_Price', PIXEL_BUDGET, method)
+        st.line_chart(points.set_index('Arrival_Date')['Modal_Price'])
+        st.caption(f"Showing {len(points):,} of {len(window):,} price points.")
     except Exception as e:
         st.error(f"Error plotting price chart: {e}")
 
+    # Server-side pagination: only the visible page is sent to the browser
     st.subheader("Raw Data Table")
-    st.dataframe(filtered_df)
+    col_size, col_page = st.columns([1, 1])
+    with col_size:
+        page_size = st.selectbox("Rows per page:", [25, 50, 100, 250], index=1)
+    with col_page:
+        n_pages = page_bounds(len(filtered_df), 1, page_size)[2]
+        page = st.number_input(f"Page (of {n_pages}):", min_value=1, max_value=n_pages, value=1)
+    start, stop, _ = page_bounds(len(filtered_df), int(page), page_size)
+    st.dataframe(filtered_df.iloc[start:stop])
+    st.caption(f"Rows {start + 1:,}–{stop:,} of {len(filtered_df):,}.")
+    render_timer.stop()
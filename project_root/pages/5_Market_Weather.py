@@ -0,0 +1,100 @@
+import streamlit as st
+
+from utils.features import (build_feature_table, feature_columns, feature_table_csv, weather_price_correlation,
+                            WEATHER_LAGS_DAYS)
+from utils.charting import page_bounds
+from utils.telemetry import start_exporters, stage_timer
+from utils.profiling import profile_page
+
+st.set_page_config(
+    page_title="Market × Weather Analytics",
+    layout="wide"
+)
+start_exporters()
+
+# Opt-in profiling of this rerun (PROFILE_PAGES=1 or ?profile=1)
+profile_page("market_weather")
+st.title("🌦️📈 Market × Weather Analytics")
+st.markdown(
+    "Mandi prices joined with the archived weather of the same district, "
+    f"lagged by {', '.join(str(l) for l in WEATHER_LAGS_DAYS)} day(s)."
+)
+
+with st.spinner("Joining market prices with weather..."):
+    features = build_feature_table()
+
+if features.empty:
+    st.warning("Market data could not be loaded.")
+    st.stop()
+
+columns = feature_columns(features)
+covered = features["location"].notna()
+c = st.columns(3)
+c[0].metric("Price rows", f"{len(features):,}")
+c[1].metric("Districts with weather", features.loc[covered, "District"].nunique())
+c[2].metric("Rows with weather", f"{covered.mean():.0%}")
+
+if not columns or not covered.any():
+    st.info(
+        "No archived weather matches the market districts yet. Add the districts to "
+        "WEATHER_LOCATIONS (e.g. 'Salem,IN;Madurai,IN') so the prefetcher archives their forecasts."
+    )
+    st.stop()
+
+st.markdown("---")
+
+# ----------------------
+# 1. SERIES EXPLORER
+# ----------------------
+st.header("🔎 Price vs Weather")
+
+with_weather = features[covered]
+col_c, col_d, col_f = st.columns(3)
+with col_c:
+    commodity = st.selectbox("Commodity:", sorted(with_weather["Commodity"].unique()))
+with col_d:
+    districts = sorted(with_weather.loc[with_weather["Commodity"] == commodity, "District"].unique())
+    district = st.selectbox("District:", districts)
+with col_f:
+    feature = st.selectbox("Weather feature:", columns)
+
+with stage_timer("market_weather.filter"):
+    series = with_weather[(with_weather["Commodity"] == commodity) & (with_weather["District"] == district)]
+    daily = series.groupby("Arrival_Date")[["Modal_Price", feature]].mean()
+
+render_timer = stage_timer("market_weather.render")
+st.subheader(f"{commodity} — {district}")
+st.line_chart(daily[["Modal_Price"]])
+st.line_chart(daily[[feature]])
+
+with st.expander("Joined rows"):
+    # Only the visible page is sent to the browser
+    col_size, col_page = st.columns(2)
+    with col_size:
+        page_size = st.selectbox("Rows per page:", [25, 50, 100, 250], index=1)
+    with col_page:
+        n_pages = page_bounds(len(series), 1, page_size)[2]
+        page = st.number_input(f"Page (of {n_pages}):", min_value=1, max_value=n_pages, value=1)
+    start, stop, _ = page_bounds(len(series), int(page), page_size)
+    st.dataframe(series[["Market", "Variety", "Arrival_Date", "Modal_Price", "price_change_pct"] + columns]
+                 .iloc[start:stop], hide_index=True)
+    st.caption(f"Rows {start + 1:,}–{stop:,} of {len(series):,}.")
+
+st.markdown("---")
+
+# ----------------------
+# 2. CORRELATIONS
+# ----------------------
+st.header("🔗 Price Change vs Lagged Weather")
+corr = weather_price_correlation(features)
+if corr.empty:
+    st.info("Not enough joined rows per commodity to estimate correlations.")
+else:
+    st.dataframe(corr, use_container_width=True)
+
+# The CSV is encoded on request (once per table build), not on every rerun
+if st.button("Prepare feature table (CSV)") or st.session_state.get("feature_csv_requested"):
+    st.session_state["feature_csv_requested"] = True
+    st.download_button("Download feature table (CSV)", feature_table_csv(),
+                       file_name="market_weather_features.csv", mime="text/csv")
+render_timer.stop()
@@ -0,0 +1,41 @@
+"""
+Pre-generate treatment advice for every detector class x language x crop stage.
+
+Calls the assistant backend once per missing entry and writes the versioned
+cache (data/advice/advice-v<ADVICE_VERSION>.json) that the Detector page
+serves after each diagnosis. Re-running only fills in missing entries; the
+cache is rebuilt when the crop-disease knowledge base changes or with --force.
+
+Usage (from project_root):
+    OPENAI_API_KEY=sk-... python -m scripts.build_advice_cache --languages en hi --stages vegetative flowering
+"""
+import argparse
+import os
+
+from utils.advice import ADVICE_LANGUAGES, CROP_STAGES, AdviceCache
+from utils.llm import chat_completion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--languages", nargs="+", choices=list(ADVICE_LANGUAGES), default=list(ADVICE_LANGUAGES))
+    parser.add_argument("--stages", nargs="+", choices=list(CROP_STAGES), default=list(CROP_STAGES))
+    parser.add_argument("--force", action="store_true", help="Regenerate every entry.")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY", "")
+    if not api_key:
+        parser.error("Set OPENAI_API_KEY to generate advice.")
+
+    cache = AdviceCache()
+    generated = cache.build(
+        lambda messages: chat_completion(api_key, args.model, messages, max_tokens=400, temperature=0.3)[0],
+        languages=args.languages, stages=args.stages, model=args.model, force=args.force,
+        progress=lambda key: print(f"generated {key}"),
+    )
+    print(f"{generated} new entries, {len(cache.entries)} total in {cache.path}")
+
+
+if __name__ == "__main__":
+    main()
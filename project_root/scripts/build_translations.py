@@ -0,0 +1,46 @@
+"""
+Pre-translate every fixed advisory template into the supported languages.
+
+Writes the compact lookup table (data/translations/templates.json) that the
+pages read at render time, so alerts, advisories and disease labels cost a
+dictionary lookup in every language. Uses the assistant backend by default
+or a local CPU NLLB model with --backend mt.
+
+Usage (from project_root):
+    OPENAI_API_KEY=sk-... python -m scripts.build_translations --languages hi te gu pa
+    python -m scripts.build_translations --backend mt
+"""
+import argparse
+import os
+import time
+
+from utils.llm import OPENAI_MODEL
+from utils.translation import LANGUAGES, TEMPLATES, build_template_table, llm_backend, mt_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["llm", "mt"], default="llm")
+    parser.add_argument("--model", default=None, help="LLM or MT model name (defaults per backend).")
+    choices = [l for l in LANGUAGES if l != "en"]
+    parser.add_argument("--languages", nargs="+", choices=choices, default=choices)
+    args = parser.parse_args()
+
+    if args.backend == "mt":
+        translate = mt_backend(args.model) if args.model else mt_backend()
+    else:
+        api_key = os.environ.get("OPENAI_API_KEY", "")
+        if not api_key:
+            parser.error("Set OPENAI_API_KEY or use --backend mt.")
+        translate = llm_backend(api_key, args.model or OPENAI_MODEL)
+
+    start = time.perf_counter()
+    table = build_template_table(translate, args.languages)
+    elapsed = time.perf_counter() - start
+    for language, entries in table.items():
+        print(f"{language}: {len(entries)}/{len(TEMPLATES)} templates translated")
+    print(f"Done in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Merge the small per-fetch Parquet files of the weather archive.
+
+Every fetched forecast is archived as its own file, so a location prefetched
+hourly adds 48 files a day. This rewrites each closed partition (issue dates
+before today) as one file sorted by issue time, which keeps archive queries
+from opening thousands of files. Partitions are locked while they are
+merged (a .compact.lock file), so a run that overlaps the prefetcher's daily
+compaction skips the partitions the other run is working on.
+
+Usage (from project_root):
+    python -m scripts.compact_weather_archive
+    python -m scripts.compact_weather_archive --before 2026-10-01
+"""
+import argparse
+import time
+
+from utils.weather_archive import WEATHER_ARCHIVE_DIR, compact_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directory", default=WEATHER_ARCHIVE_DIR)
+    parser.add_argument("--before", default=None, help="Only compact issue dates before this YYYY-MM-DD (default: today).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    removed = compact_archive(args.directory, args.before)
+    print(f"Merged {removed} files in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
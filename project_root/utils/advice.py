@@ -0,0 +1,163 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import streamlit as st
+
+from utils.model_inference import CLASS_NAMES
+from utils.rag import KNOWLEDGE_DIR, split_markdown
+from utils.telemetry import count
+from utils.translation import LANGUAGES
+
+# --- Treatment Advice per Diagnosis ---
+
+# Bump when the prompt or the entry format changes; each version has its own cache file
+ADVICE_VERSION = 1
+ADVICE_DIR = os.environ.get("ADVICE_DIR", "data/advice")
+
+ADVICE_LANGUAGES = LANGUAGES
+CROP_STAGES = {
+    "seedling": "seedling / early growth",
+    "vegetative": "vegetative (tillering, leafing out)",
+    "flowering": "flowering / heading",
+    "maturity": "grain filling to maturity",
+}
+
+ADVICE_PROMPT = (
+    "You are an agronomist writing treatment advice for smallholder farmers in India. Write in {language}, "
+    "in short simple sentences. The crop is {crop} at the {stage} stage and the leaf diagnosis is {disease}. "
+    "Give: 1) what to do in the next 48 hours, 2) products and doses if a spray is needed, with the "
+    "pre-harvest interval where relevant, 3) what to avoid at this stage, 4) how to prevent it next season. "
+    "Use at most 180 words and base the advice on this reference:\n\n{reference}"
+)
+
+def split_label(label: str) -> Tuple[str, str]:
+    """'Wheat___Yellow_Rust' -> ('Wheat', 'Yellow Rust')."""
+    crop, _, disease = label.replace("___", "__").partition("__")
+    return crop, disease.replace("_", " ")
+
+def reference_sections(directory: str = KNOWLEDGE_DIR) -> Dict[str, str]:
+    """Crop-disease knowledge-base section per class name (healthy classes share one)."""
+    path = os.path.join(directory, "crop_diseases.md")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        sections = {s["title"].split(" — ")[-1]: s["text"] for s in split_markdown(f.read())}
+    references = {}
+    for label in CLASS_NAMES:
+        crop, disease = split_label(label)
+        key = "Healthy Leaves" if disease == "Healthy" else f"{crop} {disease}"
+        if key in sections:
+            references[label] = sections[key]
+    return references
+
+def advice_messages(label: str, language: str, stage: str, reference: str) -> List[Dict[str, str]]:
+    crop, disease = split_label(label)
+    prompt = ADVICE_PROMPT.format(language=ADVICE_LANGUAGES[language], crop=crop, stage=CROP_STAGES[stage],
+                                  disease="healthy (no disease)" if disease == "Healthy" else disease,
+                                  reference=reference or "(none)")
+    return [{"role": "user", "content": prompt}]
+
+class AdviceCache:
+    """
+    Pre-generated advice for every class x language x crop stage, stored as
+    one JSON file per ADVICE_VERSION. Lookups are dictionary reads; entries
+    missing from the file fall back to English, then to the knowledge-base
+    reference text, so a diagnosis never waits on the LLM.
+    """
+
+    def __init__(self, directory: str = ADVICE_DIR, version: int = ADVICE_VERSION):
+        self.path = os.path.join(directory, f"advice-v{version}.json")
+        self.version = version
+        self._lock = threading.Lock()
+        self.references = reference_sections()
+        self.meta: Dict[str, Any] = {"version": version}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.meta, self.entries = data.get("meta", self.meta), data.get("entries", {})
+        # The knowledge base only changes on deploy, so this is checked once per load
+        self.stale = bool(self.entries) and self.meta.get("knowledge_hash") != self.knowledge_hash()
+
+    @staticmethod
+    def key(label: str, language: str, stage: str) -> str:
+        return f"{label}|{language}|{stage}"
+
+    def knowledge_hash(self) -> str:
+        return hashlib.sha256(json.dumps(self.references, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def get(self, label: str, language: str = "en", stage: str = "vegetative") -> Dict[str, Any]:
+        """
+        {"text", "source", "language", "stale"}; source is "cache", "cache-en" or
+        "knowledge". Cached text is still served when the knowledge base changed
+        after generation (stale=True), so the page can flag it until the
+        cache is rebuilt.
+        """
+        for lang, source in ((language, "cache"), ("en", "cache-en")):
+            entry = self.entries.get(self.key(label, lang, stage))
+            if entry:
+                count("advice_served", source=source, stale=str(self.stale).lower())
+                return {"text": entry["text"], "source": source, "language": lang, "stale": self.stale}
+        count("advice_served", source="knowledge")
+        return {"text": self.references.get(label, ""), "source": "knowledge", "language": "en", "stale": False}
+
+    def build(self, generate: Callable[[List[Dict[str, str]]], str], languages: Optional[List[str]] = None,
+              stages: Optional[List[str]] = None, labels: Optional[List[str]] = None,
+              model: str = "", force: bool = False, progress: Optional[Callable[[str], None]] = None) -> int:
+        """
+        Generates every missing class x language x stage entry with
+        `generate(messages) -> text` and saves after each one, so an
+        interrupted run resumes where it stopped. Returns the number generated.
+        """
+        knowledge_hash = self.knowledge_hash()
+        if force or self.meta.get("knowledge_hash") not in (None, knowledge_hash):
+            self.entries = {}
+        generated = 0
+        for label in labels or CLASS_NAMES:
+            for language in languages or list(ADVICE_LANGUAGES):
+                for stage in stages or list(CROP_STAGES):
+                    key = self.key(label, language, stage)
+                    if key in self.entries:
+                        continue
+                    text = generate(advice_messages(label, language, stage, self.references.get(label, "")))
+                    with self._lock:
+                        self.entries[key] = {"text": text.strip(),
+                                             "generated_at": datetime.utcnow().isoformat(timespec="seconds")}
+                        self.meta = {"version": self.version, "model": model, "knowledge_hash": knowledge_hash}
+                        self.save()
+                    generated += 1
+                    if progress:
+                        progress(key)
+        self.stale = bool(self.entries) and self.meta.get("knowledge_hash") != knowledge_hash
+        return generated
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"meta": self.meta, "entries": self.entries}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+def followup_messages(label: str, advice: str, question: str, language: str = "en") -> List[Dict[str, str]]:
+    """Live follow-up question about a diagnosis, grounded in its cached advice."""
+    crop, disease = split_label(label)
+    return [
+        {"role": "system", "content": (
+            f"You are a farm advisor. The farmer's {crop} leaf was diagnosed as {disease}. Answer their "
+            f"follow-up question in {ADVICE_LANGUAGES.get(language, 'English')}, briefly and practically, "
+            f"consistent with this advice already given:\n\n{advice}"
+        )},
+        {"role": "user", "content": question},
+    ]
+
+@st.cache_resource
+def load_advice() -> AdviceCache:
+    advice = AdviceCache()
+    if advice.stale:
+        # Rebuild with scripts/build_advice_cache.py after editing the knowledge base
+        count("advice_cache_stale")
+    return advice
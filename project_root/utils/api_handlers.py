@@ -1,23 +1,24 @@
 import requests
 import streamlit as st
-import os
-import pandas as pd
 from datetime import datetime
 from typing import Dict, Any, List
 
+from utils.telemetry import stage_timer, record_payload
+from utils.weather_analytics import forecast_indicators
+from utils.translation import t
+from utils.resources import RESOURCES
+
 # --- Weather API Handler ---
 
 BASE_URL = "https://api.tomorrow.io/v4/timelines"
 
-@st.cache_data(ttl=1800)
-def get_weather(city_name: str, days: int = 5) -> Dict[str, Any]:
+# One pooled HTTP session per process, closed after 10 idle minutes
+RESOURCES.register("weather_http", lambda: requests.Session(), idle_seconds=600, close=lambda s: s.close())
+
+def fetch_timelines(city_name: str) -> Dict[str, Any]:
     """
-    Returns:
-      {
-        "city": city_name,
-        "current": {temperature, humidity, windSpeed, precipitationProbability, weatherCode, time},
-        "daily": [ {date, temp_min, temp_max, rain_chance, wind_avg, weather_code}, ... up to `days` ]
-      }
+    Raw Tomorrow.io timelines request (hourly + daily). Returns the decoded
+    JSON, or {"error": ...} on failure. Not cached; see utils/weather_store.py.
     """
     try:
         api_key = st.secrets["TOMORROW_API_KEY"]
@@ -37,14 +38,23 @@ def get_weather(city_name: str, days: int = 5) -> Dict[str, Any]:
     }
 
     try:
-        res = requests.get(BASE_URL, params=params, timeout=15)
+        with stage_timer("weather.http"):
+            res = RESOURCES.get("weather_http").get(BASE_URL, params=params, timeout=15)
+        record_payload("weather.response", len(res.content))
         res.raise_for_status()
-        data = res.json()
+        with stage_timer("weather.parse"):
+            data = res.json()
     except requests.exceptions.HTTPError as e:
         return {"error": f"HTTP Error: {e} - {res.text if 'res' in locals() else ''}"}
     except requests.exceptions.RequestException as e:
         return {"error": f"Network error: {e}"}
 
+    return data
+
+def parse_timelines(city_name: str, data: Dict[str, Any], days: int = 5) -> Dict[str, Any]:
+    """
+    Normalizes a timelines response into a forecast dict (city, current, hourly, daily, indicators).
+    """
     # Basic validation
     timelines = data.get("data", {}).get("timelines", [])
     if not timelines:
@@ -57,20 +67,21 @@ def get_weather(city_name: str, days: int = 5) -> Dict[str, Any]:
     if not hourly_tl or not daily_tl:
         return {"error": "Missing hourly or daily timeline in API response."}
 
+    # Hourly series
+    hourly_list: List[Dict[str, Any]] = []
+    for h in hourly_tl.get("intervals", []):
+        vals = h.get("values", {})
+        hourly_list.append({
+            "time": h.get("startTime"),  # ISO string
+            "temperature": vals.get("temperature"),
+            "humidity": vals.get("humidity"),
+            "windSpeed": vals.get("windSpeed"),
+            "precipitationProbability": vals.get("precipitationProbability"),
+            "weatherCode": vals.get("weatherCode")
+        })
+
     # Current = first hourly values
-    try:
-        current_entry = hourly_tl["intervals"][0]
-        current_vals = current_entry["values"]
-        current = {
-            "temperature": current_vals.get("temperature"),
-            "humidity": current_vals.get("humidity"),
-            "windSpeed": current_vals.get("windSpeed"),
-            "precipitationProbability": current_vals.get("precipitationProbability"),
-            "weatherCode": current_vals.get("weatherCode"),
-            "time": current_entry.get("startTime")  # ISO string
-        }
-    except Exception:
-        current = {}
+    current = dict(hourly_list[0]) if hourly_list else {}
 
     # Build daily list
     daily_list: List[Dict[str, Any]] = []
@@ -85,7 +96,12 @@ def get_weather(city_name: str, days: int = 5) -> Dict[str, Any]:
             "weather_code": vals.get("weatherCode")
         })
 
-    return {"city": city_name, "current": current, "daily": daily_list}
+    # Derived agronomic indicators, computed once per fetch over the full hourly series
+    with stage_timer("weather.indicators"):
+        indicators = forecast_indicators(hourly_list)
+
+    return {"city": city_name, "current": current, "hourly": hourly_list, "daily": daily_list,
+            "indicators": indicators}
 
 def get_weather_icon(code: int) -> str:
     icons = {
@@ -95,10 +111,10 @@ def get_weather_icon(code: int) -> str:
     }
     return icons.get(code, "🌡️")
 
-def detect_severe_alerts(weather: Dict[str, Any]) -> list:
+def detect_severe_alerts(weather: Dict[str, Any], lang: str = "en") -> list:
     """
     Produces rule-based alerts from forecast (since free tier lacks built-in alerts).
-    Rules are conservative and transparent.
+    Rules are conservative and transparent. Messages are rendered in `lang`.
     """
     alerts = []
     curr = weather.get("current", {})
@@ -106,30 +122,30 @@ def detect_severe_alerts(weather: Dict[str, Any]) -> list:
         # Heavy rain soon
         p = curr.get("precipitationProbability")
         if p is not None and p >= 70:
-            alerts.append("High probability of heavy rain in the next hour (>=70%). Protect harvested crops and check drainage.")
+            alerts.append(t("alert.rain_now", lang))
 
         # Very high temperature
-        t = curr.get("temperature")
-        if t is not None and t >= 40:
-            alerts.append("Very high temperature (>=40°C). Take measures to reduce heat stress on crops and workers.")
+        temp = curr.get("temperature")
+        if temp is not None and temp >= 40:
+            alerts.append(t("alert.heat_now", lang))
 
         # High wind
         w = curr.get("windSpeed")
         if w is not None and w >= 15:
-            alerts.append("High winds forecasted (>=15 m/s). Secure lightweight structures and avoid spraying.")
+            alerts.append(t("alert.wind_now", lang))
 
     # Scan daily forecasts for multi-day alerts
     for day in weather.get("daily", []):
         if (day.get("rain_chance") or 0) >= 80:
-            alerts.append(f"Heavy rain likely on {day['date']} (>=80% chance).")
+            alerts.append(t("alert.rain_day", lang, date=day['date']))
         if (day.get("temp_max") or -999) >= 40:
-            alerts.append(f"Extreme heat expected on {day['date']} (max >=40°C).")
+            alerts.append(t("alert.heat_day", lang, date=day['date']))
 
     return alerts
 
-def crop_advisory(weather: Dict[str, Any], crop: str = "wheat") -> str:
+def crop_advisory(weather: Dict[str, Any], crop: str = "wheat", lang: str = "en") -> str:
     """
-    Simple rule-based crop advice. Extend rules for more crops.
+    Simple rule-based crop advice in `lang`. Extend rules (and TEMPLATES) for more crops.
     """
     # use current & next day
     current = weather.get("current", {})
@@ -142,72 +158,42 @@ def crop_advisory(weather: Dict[str, Any], crop: str = "wheat") -> str:
     if crop in ["wheat", "barley"]:
         # Avoid spraying if rain likely soon
         if rain is not None and rain >= 40:
-            return "Rain expected soon — postpone pesticide/fertilizer spraying."
+            return t("crop.wheat.rain", lang)
         if temp is not None and temp >= 35:
-            return "High temperature — irrigate early morning or late evening to reduce stress."
-        return "Conditions look normal for field operations. Monitor rain chance before spraying."
+            return t("crop.wheat.heat", lang)
+        return t("crop.wheat.normal", lang)
     elif crop in ["rice"]:
         # rice needs water: if low rain chance and high temp -> irrigate
         if rain is not None and rain <= 20 and (temp is not None and temp >= 30):
-            return "Low rain chance and high temp — consider irrigation to maintain paddy water level."
-        return "Monitor standing water and rainfall; schedule irrigation if rain stays low."
+            return t("crop.rice.irrigate", lang)
+        return t("crop.rice.normal", lang)
     elif crop in ["maize","corn"]:
         if rain is not None and rain >= 50:
-            return "High rain chance — ensure field drainage to avoid waterlogging."
-        return "Okay for operations; ensure irrigation during dry spells."
+            return t("crop.maize.rain", lang)
+        return t("crop.maize.normal", lang)
     else:
         # generic
         if rain is not None and rain >= 50:
-            return "High probability of rain — avoid chemical spraying and protect harvested crops."
-        return "No specific advisory. Monitor rainfall and temperature."
+            return t("crop.generic.rain", lang)
+        return t("crop.generic.normal", lang)
 
-def irrigation_advice(weather: Dict[str, Any]) -> str:
+def irrigation_advice(weather: Dict[str, Any], lang: str = "en") -> str:
     """
     Heuristic irrigation advice when soil moisture/ET not available.
     Simple rule: if rain chance low and daytime temps high => suggest irrigation soon.
     """
     daily = weather.get("daily", [])
     if not daily:
-        return "Insufficient forecast data for irrigation advice."
+        return t("irrigation.no_data", lang)
 
     next_day = daily[0]
     rain = (next_day.get("rain_chance") or 0)
     tmax = next_day.get("temp_max")
 
     if rain >= 50:
-        return "Substantial chance of rain tomorrow — postpone irrigation."
+        return t("irrigation.rain", lang)
     if tmax is not None and tmax >= 34 and rain <= 20:
-        return "High temperatures and low rain chance — consider irrigating tomorrow morning."
+        return t("irrigation.irrigate", lang)
     if tmax is not None and tmax < 20 and rain <= 20:
-        return "Cool conditions — irrigation may be deferred."
-    return "Monitor rainfall and crop growth; use soil checks for final decision."
-
-
-
-
-# --- Market Data Handler ---
-
-@st.cache_data
-def load_market_data(file_name="market_prices.csv"):
-    """Loads a pandas DataFrame from the local CSV file in the data folder."""
-
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    file_path = os.path.join(base_dir, 'data', file_name)
-
-    try:
-        df = pd.read_csv(file_path)
-
-        # Convert date column
-        if 'Date' in df.columns:
-            df['Date'] = pd.to_datetime(df['Date'])
-            df = df.set_index('Date').sort_index()
-
-        return df
-
-    except FileNotFoundError:
-        st.error(f"Error: The data file '{file_path}' was not found.")
-        return pd.DataFrame()
-
-    except Exception as e:
-        st.error(f"An error occurred while reading the CSV: {e}")
-        return pd.DataFrame()
+        return t("irrigation.defer", lang)
+    return t("irrigation.monitor", lang)
@@ -0,0 +1,151 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.model_inference import CLASS_NAMES, preprocess_image
+
+# --- Class Activation Maps for the Detector ---
+
+CAM_CACHE_DIR = os.environ.get("CAM_CACHE_DIR", "data/cam_cache")
+# Least recently used entries are deleted past this size (a hit refreshes the file's mtime)
+CAM_CACHE_MAX_MB = float(os.environ.get("CAM_CACHE_MAX_MB", "200"))
+# The directory is scanned for pruning once per this many writes
+CAM_PRUNE_EVERY = 50
+
+_writes = 0
+_prune_lock = threading.Lock()
+
+def image_hash(image_file) -> str:
+    """SHA-1 of the raw upload bytes (the file position is restored)."""
+    if hasattr(image_file, "getvalue"):
+        data = image_file.getvalue()
+    else:
+        data = image_file.read()
+        image_file.seek(0)
+    return hashlib.sha1(data).hexdigest()
+
+def prune_cam_cache(directory: str = CAM_CACHE_DIR, max_mb: float = CAM_CACHE_MAX_MB) -> int:
+    """Deletes the least recently used cache files until the cache fits under the cap. Returns the number deleted."""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for _, size, path in files:
+        if total <= max_mb * 1024 ** 2:
+            break
+        try:
+            os.remove(path)
+            deleted += 1
+        except OSError:
+            pass
+        total -= size
+    return deleted
+
+def _cached_write():
+    """Counts a cache write and prunes the cache every CAM_PRUNE_EVERY writes."""
+    global _writes
+    with _prune_lock:
+        _writes += 1
+        if _writes % CAM_PRUNE_EVERY:
+            return
+    prune_cam_cache()
+
+def forward_with_features(model, tensor):
+    """
+    Runs the model once and also returns the last spatial feature map.
+    timm models expose forward_features/forward_head; anything else
+    (e.g. TorchScript exports) falls back to a plain forward without features.
+    """
+    if hasattr(model, "forward_features") and hasattr(model, "forward_head"):
+        features = model.forward_features(tensor)
+        return model.forward_head(features), features
+    return model(tensor), None
+
+def classifier_weights(model):
+    """Weights of the final linear classifier, or None if there isn't one."""
+    head = model.get_classifier() if hasattr(model, "get_classifier") else None
+    if isinstance(head, torch.nn.Linear):
+        return head.weight
+    return None
+
+def class_activation_maps(features: torch.Tensor, weights: torch.Tensor, class_idx: torch.Tensor) -> np.ndarray:
+    """
+    Computes CAMs for a whole batch in one matmul.
+    features: (B, C, H, W), weights: (num_classes, C), class_idx: (B,).
+    Returns (B, H, W) float32 maps normalized to [0, 1].
+    """
+    bs, chs, h, w = features.shape
+    cams = torch.bmm(weights[class_idx].unsqueeze(1), features.reshape(bs, chs, h * w)).reshape(bs, h * w)
+    cams = cams - cams.min(dim=1, keepdim=True).values
+    cams = cams / cams.max(dim=1, keepdim=True).values.clamp_min(1e-12)
+    return cams.reshape(bs, h, w).cpu().numpy().astype(np.float32)
+
+def predict_with_heatmap(image_file, model, variant: str = "default"):
+    """
+    Same result as predict_image plus a CAM heatmap, from a single forward pass.
+    Results are cached on disk by image hash (size-capped by CAM_CACHE_MAX_MB),
+    so re-uploads skip inference. Returns (label, confidence, heatmap or None).
+    """
+    cache_path = os.path.join(CAM_CACHE_DIR, variant, f"{image_hash(image_file)}.npz")
+    try:
+        with np.load(cache_path) as cached:
+            heatmap = cached["heatmap"].astype(np.float32) if cached["heatmap"].size else None
+            result = CLASS_NAMES[int(cached["class_idx"])], float(cached["confidence"]), heatmap
+    except (OSError, ValueError, KeyError):
+        result = None  # not cached, or pruned meanwhile
+    if result is not None:
+        try:
+            os.utime(cache_path)  # mark as recently used for pruning
+        except OSError:
+            pass
+        return result
+
+    _, tensor = preprocess_image(image_file)
+    with torch.no_grad():
+        logits, features = forward_with_features(model, tensor)
+        probabilities = torch.nn.functional.softmax(logits, dim=1)
+        confidence, class_idx = torch.max(probabilities, 1)
+
+        heatmap = None
+        weights = classifier_weights(model)
+        if features is not None and features.ndim == 4 and weights is not None and features.shape[1] == weights.shape[1]:
+            heatmap = class_activation_maps(features, weights, class_idx)[0]
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{threading.get_ident()}.tmp.npz"
+    np.savez(
+        tmp_path,
+        class_idx=class_idx.item(),
+        confidence=confidence.item(),
+        heatmap=heatmap.astype(np.float16) if heatmap is not None else np.empty(0, dtype=np.float16)
+    )
+    os.replace(tmp_path, cache_path)
+    _cached_write()
+    return CLASS_NAMES[class_idx.item()], confidence.item(), heatmap
+
+def overlay_heatmap(image: Image.Image, heatmap: np.ndarray, alpha: float = 0.4) -> Image.Image:
+    """Blends a jet-coloured heatmap over the original photo."""
+    mask = Image.fromarray((heatmap * 255).astype(np.uint8)).resize(image.size, Image.BILINEAR)
+    x = np.asarray(mask, dtype=np.float32)[..., None] / 255.0
+
+    # Jet colormap without a matplotlib dependency
+    colored = np.clip(np.concatenate([
+        1.5 - np.abs(4 * x - 3),
+        1.5 - np.abs(4 * x - 2),
+        1.5 - np.abs(4 * x - 1),
+    ], axis=-1), 0, 1)
+
+    base = np.asarray(image.convert("RGB"), dtype=np.float32) / 255.0
+    blended = (1 - alpha) * base + alpha * colored
+    return Image.fromarray((blended * 255).astype(np.uint8))
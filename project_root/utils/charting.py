@@ -0,0 +1,78 @@
+import math
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# --- Chart Downsampling ---
+
+# Points sent per chart; roughly one per horizontal pixel of a wide-layout chart
+PIXEL_BUDGET = 1000
+
+def _as_float(x: np.ndarray) -> np.ndarray:
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[s]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and, per
+    bucket, the point forming the largest triangle with the previously kept
+    point and the next bucket's mean. `x` must be sorted. Returns indices.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    xf, yf = _as_float(x), y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 inner buckets
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = xf[nxt_lo:nxt_hi].mean(), yf[nxt_lo:nxt_hi].mean()
+        # Twice the triangle area, vectorized over the bucket
+        area = np.abs((xf[prev] - avg_x) * (yf[lo:hi] - yf[prev])
+                      - (xf[prev] - xf[lo:hi]) * (avg_y - yf[prev]))
+        prev = lo + int(np.argmax(area))
+        out[i + 1] = prev
+    return out
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Index of the minimum and maximum of each of `n_buckets` equal-count buckets, in order."""
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+
+    bucket = (np.arange(n) * n_buckets) // n
+    values = np.nan_to_num(y.astype(np.float64), nan=np.inf)
+    # Stable sort by (bucket, value): first of each bucket = min, last = max
+    order = np.lexsort((values, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+def downsample(frame: pd.DataFrame, x: str, y: str, max_points: int = PIXEL_BUDGET,
+               method: str = "minmax") -> pd.DataFrame:
+    """
+    At most `max_points` rows of `frame` (sorted by `x`) that keep the shape
+    of `y`: "minmax" keeps every bucket's extremes (spikes survive),
+    "lttb" keeps the visually most significant point per bucket.
+    """
+    frame = frame.dropna(subset=[y]).sort_values(x, kind="stable")
+    if len(frame) <= max_points:
+        return frame
+    if method == "lttb":
+        idx = lttb_indices(frame[x].to_numpy(), frame[y].to_numpy(), max_points)
+    else:
+        idx = minmax_indices(frame[y].to_numpy(), max_points // 2)
+    return frame.iloc[idx]
+
+def page_bounds(total_rows: int, page: int, page_size: int) -> Tuple[int, int, int]:
+    """(start, stop, number of pages) for 1-based `page`."""
+    n_pages = max(1, math.ceil(total_rows / page_size))
+    page = min(max(1, page), n_pages)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total_rows), n_pages
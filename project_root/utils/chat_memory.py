@@ -0,0 +1,202 @@
+import os
+import sqlite3
+import functools
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+import streamlit as st
+
+from utils.telemetry import count, stage_timer
+
+# --- Multi-turn Chat Memory ---
+
+CHAT_DB = os.environ.get("CHAT_DB", "data/chat_sessions.db")
+
+# Verbatim history kept in the prompt; older turns are folded into a summary
+CHAT_HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", "1500"))
+# Compaction shrinks history to this share of the budget so it runs rarely
+COMPACT_TARGET = 0.6
+SUMMARY_MAX_TOKENS = 300
+KEEP_RECENT_MESSAGES = 4
+
+# Fixed overhead per chat message in the Chat Completions format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a farmer and a farm advisor. Keep facts the "
+    "advisor will need later (crops, location, problems, prices, advice already given) and drop small talk. "
+    "Reply with the summary only, at most {words} words."
+)
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model: str):
+    """tiktoken encoding for `model`, loaded once per process (None if tiktoken is missing)."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Exact token count with tiktoken, or ~4 characters per token without it."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+def message_tokens(messages: List[Dict[str, str]], model: str = "gpt-4o-mini") -> int:
+    return sum(count_tokens(m["content"], model) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+class ChatMemory:
+    """
+    Chat sessions per user in SQLite. Each message stores its token count
+    (counted once, on write). The prompt history is a running summary of
+    compacted turns plus the most recent turns verbatim, bounded by
+    `history_tokens`.
+    """
+
+    def __init__(self, path: str = CHAT_DB, model: str = "gpt-4o-mini",
+                 history_tokens: int = CHAT_HISTORY_TOKENS, keep_recent: int = KEEP_RECENT_MESSAGES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.model = model
+        self.history_tokens = history_tokens
+        self.keep_recent = keep_recent
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                title TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                summary TEXT DEFAULT '',
+                summary_upto INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id, updated_at);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                session_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                created_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+        """)
+        self.db.commit()
+
+    # ---- sessions ----
+
+    def create_session(self, user_id: str, title: str = "New chat") -> int:
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        with self._lock, self.db:
+            cur = self.db.execute(
+                "INSERT INTO sessions (user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (user_id, title, now, now)
+            )
+        return cur.lastrowid
+
+    def sessions(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            "SELECT id, title, updated_at FROM sessions WHERE user_id = ? ORDER BY updated_at DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
+        return [{"id": r[0], "title": r[1], "updated_at": r[2]} for r in rows]
+
+    def messages(self, session_id: int, after_id: int = 0) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            "SELECT id, role, content, tokens FROM messages WHERE session_id = ? AND id > ? ORDER BY id",
+            (session_id, after_id)
+        ).fetchall()
+        return [{"id": r[0], "role": r[1], "content": r[2], "tokens": r[3]} for r in rows]
+
+    def append(self, session_id: int, role: str, content: str):
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        tokens = count_tokens(content, self.model) + MESSAGE_OVERHEAD_TOKENS
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT INTO messages (session_id, role, content, tokens, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, role, content, tokens, now)
+            )
+            # First question becomes the session title
+            self.db.execute(
+                "UPDATE sessions SET updated_at = ?, title = CASE WHEN title = 'New chat' AND ? = 'user' "
+                "THEN substr(?, 1, 60) ELSE title END WHERE id = ?",
+                (now, role, content, session_id)
+            )
+
+    # ---- history ----
+
+    def _summary(self, session_id: int):
+        row = self.db.execute("SELECT summary, summary_upto FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return (row[0] or "", row[1] or 0) if row else ("", 0)
+
+    def compact(self, session_id: int, summarize: Optional[Callable[[str, List[Dict[str, Any]]], str]] = None):
+        """
+        When the verbatim history exceeds the budget, folds the oldest turns
+        into the running summary (via `summarize(previous_summary, turns)`)
+        until it is back under COMPACT_TARGET x budget. Without a summarizer,
+        or if it fails, the oldest turns are evicted.
+        """
+        summary, upto = self._summary(session_id)
+        recent = self.messages(session_id, after_id=upto)
+        total = sum(m["tokens"] for m in recent)
+        if total <= self.history_tokens:
+            return
+
+        target = self.history_tokens * COMPACT_TARGET
+        evicted = []
+        while total > target and len(recent) - len(evicted) > self.keep_recent:
+            total -= recent[len(evicted)]["tokens"]
+            evicted.append(recent[len(evicted)])
+        if not evicted:
+            return
+
+        with stage_timer("chat.compact"):
+            new_summary = summary
+            if summarize is not None:
+                try:
+                    new_summary = summarize(summary, evicted)
+                except Exception:
+                    count("chat_summary_failed")
+            count("chat_compactions", mode="summary" if new_summary != summary else "evict")
+        with self._lock, self.db:
+            self.db.execute("UPDATE sessions SET summary = ?, summary_upto = ? WHERE id = ?",
+                            (new_summary, evicted[-1]["id"], session_id))
+
+    def history(self, session_id: int) -> List[Dict[str, str]]:
+        """
+        Prompt messages: the running summary (if any) followed by the newest
+        verbatim turns that fit `history_tokens`, so the prompt stays bounded
+        even when a single turn is very long.
+        """
+        summary, upto = self._summary(session_id)
+        recent, used = [], 0
+        for m in reversed(self.messages(session_id, after_id=upto)):
+            if recent and used + m["tokens"] > self.history_tokens:
+                break
+            recent.append({"role": m["role"], "content": m["content"]})
+            used += m["tokens"]
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+        return messages + recent[::-1]
+
+def summary_messages(previous: str, turns: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Chat Completions request that folds `turns` into the `previous` summary."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT.format(words=int(SUMMARY_MAX_TOKENS * 0.7))},
+        {"role": "user", "content": f"Current summary: {previous or '(empty)'}\n\nNew turns:\n{transcript}"},
+    ]
+
+@st.cache_resource
+def load_chat_memory(model: str = "gpt-4o-mini") -> ChatMemory:
+    return ChatMemory(model=model)
@@ -0,0 +1,306 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import torch
+import streamlit as st
+
+from utils.model_inference import CLASS_NAMES, preprocess_image
+from utils.cam import image_hash
+
+# --- Embedding Index of Diagnosed Leaf Images ---
+
+EMBEDDING_DIR = os.environ.get("EMBEDDING_DIR", "data/embeddings")
+
+# Cosine similarity above which an upload is treated as a near-duplicate
+DUPLICATE_SIMILARITY = 0.985
+
+def extract_embedding(model, tensor: torch.Tensor):
+    """
+    Feature-extraction forward pass (no classifier head). Returns the pooled
+    penultimate-layer output and its L2-normalised float32 numpy copy (B, D).
+    """
+    with torch.no_grad():
+        pooled = model.forward_head(model.forward_features(tensor), pre_logits=True)
+    embedding = torch.nn.functional.normalize(pooled, dim=1)
+    return pooled, embedding.cpu().numpy().astype(np.float32)
+
+def _kmeans(x: np.ndarray, nlist: int, iters: int = 10, seed: int = 2024) -> np.ndarray:
+    """Spherical k-means on unit vectors; returns (nlist, D) unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        # Re-seed empty clusters from random points
+        sums[empty] = x[rng.choice(len(x), int(empty.sum()))]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True).clip(1e-12)
+    return centroids
+
+class EmbeddingIndex:
+    """
+    Stores embeddings in a float16 memory-mapped array and searches them with
+    an IVF (inverted file) index: vectors are bucketed by their nearest
+    k-means centroid and a query only scans the `nprobe` closest buckets.
+    Until the index is trained, search falls back to a chunked brute-force scan.
+    Case metadata lives in SQLite next to the vectors.
+    """
+
+    def __init__(self, directory: str = EMBEDDING_DIR, chunk: int = 65536):
+        self.directory = directory
+        self.chunk = chunk
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._training = False
+
+        self.db = sqlite3.connect(os.path.join(directory, "cases.db"), check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS cases ("
+            "id INTEGER PRIMARY KEY, image_hash TEXT, label TEXT, confidence REAL, "
+            "created_at TEXT, confirmed_label TEXT)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_cases_hash ON cases(image_hash)")
+        self.db.commit()
+
+        self.meta_path = os.path.join(directory, "index.json")
+        self.meta = {"dim": None, "count": 0, "capacity": 0}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+        # A crash between the SQLite commit and the meta write in add() leaves the
+        # meta count behind; the cases table is the source of truth for it
+        stored = self.db.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM cases").fetchone()[0]
+        if stored > self.meta["count"] and self.meta["dim"]:
+            # The memmap may have grown in that add() too; its file size has the real capacity
+            file_rows = os.path.getsize(os.path.join(directory, "vectors.f16")) // (2 * self.meta["dim"])
+            self.meta["capacity"] = max(self.meta["capacity"], file_rows)
+            self.meta["count"] = min(stored, self.meta["capacity"])
+            self._save_meta()
+
+        self.vectors = None
+        self.assign = None
+        if self.meta["dim"]:
+            self._open(self.meta["capacity"])
+
+        self.centroids = None
+        self.lists: List[np.ndarray] = []
+        centroid_path = os.path.join(directory, "centroids.npy")
+        if os.path.exists(centroid_path):
+            self.centroids = np.load(centroid_path)
+            self._build_lists()
+
+    # ---- storage ----
+
+    def _open(self, capacity: int):
+        dim = self.meta["dim"]
+        self.vectors = np.memmap(os.path.join(self.directory, "vectors.f16"), dtype=np.float16,
+                                 mode="r+" if os.path.exists(os.path.join(self.directory, "vectors.f16")) else "w+",
+                                 shape=(capacity, dim))
+        self.assign = np.memmap(os.path.join(self.directory, "assign.i32"), dtype=np.int32,
+                                mode="r+" if os.path.exists(os.path.join(self.directory, "assign.i32")) else "w+",
+                                shape=(capacity,))
+        self.meta["capacity"] = capacity
+
+    def _save_meta(self):
+        with open(self.meta_path, "w") as f:
+            json.dump(self.meta, f)
+
+    def _build_lists(self):
+        count = self.meta["count"]
+        assign = np.asarray(self.assign[:count])
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(len(self.centroids))]
+
+    def __len__(self):
+        return self.meta["count"]
+
+    # ---- writes ----
+
+    def add(self, embedding: np.ndarray, label: str, confidence: float, image_hash: str) -> int:
+        """Appends one embedding with its diagnosis and returns its id."""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if self.meta["dim"] is None:
+                self.meta["dim"] = int(embedding.shape[0])
+                self._open(4096)
+            idx = self.meta["count"]
+            if idx >= self.meta["capacity"]:
+                self.vectors.flush()
+                self.assign.flush()
+                self._open(self.meta["capacity"] * 2)
+
+            self.vectors[idx] = embedding.astype(np.float16)
+            bucket = -1
+            if self.centroids is not None:
+                bucket = int(np.argmax(self.centroids @ embedding))
+                self.lists[bucket] = np.append(self.lists[bucket], idx)
+            self.assign[idx] = bucket
+
+            self.db.execute(
+                "INSERT INTO cases (id, image_hash, label, confidence, created_at) VALUES (?, ?, ?, ?, ?)",
+                (idx, image_hash, label, float(confidence), datetime.utcnow().isoformat(timespec="seconds"))
+            )
+            self.db.commit()
+            self.meta["count"] = idx + 1
+            self._save_meta()
+        return idx
+
+    def confirm(self, case_id: int, label: str):
+        """Records an agronomist-confirmed label for a stored case."""
+        with self._lock:
+            self.db.execute("UPDATE cases SET confirmed_label = ? WHERE id = ?", (label, case_id))
+            self.db.commit()
+
+    def train(self, nlist: int = 1024, sample: int = 20000, iters: int = 10):
+        """
+        (Re)trains the IVF centroids on a sample and re-buckets every vector.
+        k-means and the re-bucketing scan run outside the lock, so searches and
+        adds continue meanwhile; vectors added during training are bucketed
+        when the new centroids are swapped in.
+        """
+        with self._lock:
+            count = self.meta["count"]
+            vectors = self.vectors
+            nlist = min(nlist, max(1, count // 39))  # keep ~39+ training points per centroid
+            rng = np.random.default_rng(2024)
+            ids = np.sort(rng.choice(count, min(sample, count), replace=False))
+            training = np.asarray(vectors[ids], dtype=np.float32)
+
+        centroids = _kmeans(training, nlist, iters)
+        assign = np.concatenate([
+            np.argmax(np.asarray(vectors[start:min(start + self.chunk, count)], dtype=np.float32) @ centroids.T, axis=1)
+            for start in range(0, count, self.chunk)
+        ])
+
+        with self._lock:
+            added = np.asarray(self.vectors[count:self.meta["count"]], dtype=np.float32)
+            self.assign[:count] = assign
+            if len(added):
+                self.assign[count:self.meta["count"]] = np.argmax(added @ centroids.T, axis=1)
+            self.assign.flush()
+            np.save(os.path.join(self.directory, "centroids.npy"), centroids)
+            self.centroids = centroids
+            self._build_lists()
+            self.meta["trained_count"] = count
+            self._save_meta()
+
+    def maybe_train(self, min_count: int = 20000):
+        """
+        Starts training in a background thread once enough vectors exist, and
+        again each time the store doubles. Returns immediately.
+        """
+        with self._lock:
+            trained = self.meta.get("trained_count", 0)
+            if self._training or self.meta["count"] < max(min_count, 2 * trained):
+                return
+            self._training = True
+
+        def run():
+            try:
+                self.train()
+            finally:
+                with self._lock:
+                    self._training = False
+
+        threading.Thread(target=run, name="embedding-index-train", daemon=True).start()
+
+    # ---- reads ----
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: int = 8):
+        """Returns [(id, cosine similarity)] of the k nearest stored embeddings."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        # Snapshot the index state; the scan itself runs without the lock
+        # (a resize in add() opens a new memmap, the old one stays readable)
+        with self._lock:
+            count = self.meta["count"]
+            # add() replaces elements of self.lists in place, so copy the outer list
+            vectors, centroids, lists = self.vectors, self.centroids, list(self.lists)
+        if count == 0:
+            return []
+
+        if centroids is not None:
+            probe = np.argsort(-(centroids @ query))[:nprobe]
+            ids = np.concatenate([lists[p] for p in probe])
+            if len(ids) == 0:
+                return []
+            ids = np.sort(ids)
+            scores = np.asarray(vectors[ids], dtype=np.float32) @ query
+        else:
+            ids = np.arange(count)
+            scores = np.concatenate([
+                np.asarray(vectors[start:min(start + self.chunk, count)], dtype=np.float32) @ query
+                for start in range(0, count, self.chunk)
+            ])
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def cases(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not ids:
+            return {}
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT id, label, confidence, created_at, confirmed_label FROM cases "
+                f"WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        return {
+            row[0]: {"id": row[0], "label": row[1], "confidence": row[2],
+                     "created_at": row[3], "confirmed_label": row[4]}
+            for row in rows
+        }
+
+    def find_by_hash(self, image_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.db.execute("SELECT id FROM cases WHERE image_hash = ? LIMIT 1", (image_hash,)).fetchone()
+        return self.cases([row[0]]).get(row[0]) if row else None
+
+    def similar_cases(self, query: np.ndarray, k: int = 5, nprobe: int = 8) -> List[Dict[str, Any]]:
+        hits = self.search(query, k, nprobe)
+        details = self.cases([case_id for case_id, _ in hits])
+        return [{**details[case_id], "similarity": score} for case_id, score in hits if case_id in details]
+
+@st.cache_resource
+def load_embedding_index(variant: str):
+    """One index per detector variant (embeddings are not comparable across models)."""
+    return EmbeddingIndex(os.path.join(EMBEDDING_DIR, variant))
+
+def predict_and_index(image_file, model, index: EmbeddingIndex, k: int = 5):
+    """
+    Diagnoses an upload while capturing its embedding. Exact re-uploads are
+    answered from the index without inference, and near-duplicates reuse the
+    stored diagnosis instead of running the classifier head.
+    Returns (label, confidence, similar cases, source) where source is
+    "exact", "duplicate" or "model".
+    """
+    digest = image_hash(image_file)
+    seen = index.find_by_hash(digest)
+    if seen is not None:
+        label = seen["confirmed_label"] or seen["label"]
+        return label, seen["confidence"], [], "exact"
+
+    _, tensor = preprocess_image(image_file)
+    pooled, embeddings = extract_embedding(model, tensor)
+    embedding = embeddings[0]
+
+    similar = index.similar_cases(embedding, k)
+    if similar and similar[0]["similarity"] >= DUPLICATE_SIMILARITY:
+        nearest = similar[0]
+        label, confidence, source = nearest["confirmed_label"] or nearest["label"], nearest["confidence"], "duplicate"
+    else:
+        with torch.no_grad():
+            probabilities = torch.nn.functional.softmax(model.get_classifier()(pooled), dim=1)
+        confidence, class_idx = torch.max(probabilities, 1)
+        label, confidence, source = CLASS_NAMES[class_idx.item()], confidence.item(), "model"
+
+    index.add(embedding, label, confidence, digest)
+    index.maybe_train()
+    return label, confidence, similar, source
@@ -0,0 +1,162 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.market_store import load_market_store
+from utils.resources import RESOURCES
+from utils.telemetry import instrumented_cache, mark_cache_miss, stage_timer
+from utils.weather_archive import archived_locations, best_available, location_slug
+
+# --- Market x Weather Feature Pipeline ---
+
+WEATHER_LAGS_DAYS = (1, 3, 7)
+HEAT_STRESS_TEMP = 35.0
+
+# Daily weather columns that get lagged onto every price row
+WEATHER_FEATURES = ["tmax", "tmin", "rain_prob", "humidity", "heat_hours",
+                    "rain_prob_3d", "tmax_7d", "heat_hours_7d"]
+
+SERIES_KEYS = ["State", "District", "Market", "Commodity", "Variety"]
+
+def district_locations(districts: List[str], locations: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Maps market districts to archived weather locations by slug: "Salem"
+    matches archive location "salem" or "salem-in".
+    """
+    locations = archived_locations() if locations is None else locations
+    mapping = {}
+    for district in districts:
+        slug = location_slug(district)
+        match = next((loc for loc in locations if loc == slug or loc.startswith(slug + "-")), None)
+        if match:
+            mapping[district] = match
+    return mapping
+
+def daily_weather(location: str, start, end) -> pd.DataFrame:
+    """Daily aggregates plus rolling windows from the archive's best-available hourly series."""
+    hourly = best_available(location, start, end)
+    if hourly.empty:
+        return pd.DataFrame()
+
+    hourly = hourly.tz_convert(None) if hourly.index.tz is not None else hourly
+    day = hourly.resample("D")
+    daily = pd.DataFrame({
+        "tmax": day["temperature"].max(),
+        "tmin": day["temperature"].min(),
+        "rain_prob": day["precipitationProbability"].max(),
+        "humidity": day["humidity"].mean(),
+        "heat_hours": (hourly["temperature"] >= HEAT_STRESS_TEMP).resample("D").sum(),
+    })
+    daily["rain_prob_3d"] = daily["rain_prob"].rolling(3, min_periods=1).mean()
+    daily["tmax_7d"] = daily["tmax"].rolling(7, min_periods=1).max()
+    daily["heat_hours_7d"] = daily["heat_hours"].rolling(7, min_periods=1).sum()
+    return daily.astype(np.float32).rename_axis("date").reset_index()
+
+def market_prices(market_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Price rows with a per-series change relative to the previous arrival.
+    Accepts the raw CSV frame or the typed MarketStore frame.
+    """
+    prices = market_df.rename(columns={
+        'Min_x0020_Price': 'Min_Price',
+        'Max_x0020_Price': 'Max_Price',
+        'Modal_x0020_Price': 'Modal_Price'
+    })
+    prices = prices.assign(
+        Arrival_Date=pd.to_datetime(prices["Arrival_Date"], dayfirst=True, errors="coerce"),
+        Modal_Price=pd.to_numeric(prices["Modal_Price"], errors="coerce").astype(np.float32),
+    ).dropna(subset=["Arrival_Date", "Modal_Price"])
+    prices = prices.sort_values(SERIES_KEYS + ["Arrival_Date"], ignore_index=True)
+    prices["price_change_pct"] = (
+        prices.groupby(SERIES_KEYS, observed=True)["Modal_Price"].pct_change() * 100
+    ).astype(np.float32)
+    return prices
+
+def join_weather_features(prices: pd.DataFrame, weather: pd.DataFrame,
+                          lags=WEATHER_LAGS_DAYS, tolerance_days: int = 1) -> pd.DataFrame:
+    """
+    As-of joins the daily weather of each row's location onto the price rows:
+    for lag L, the row gets the latest weather day on or before
+    Arrival_Date - L (at most `tolerance_days` older). One merge_asof per lag.
+    """
+    features = prices.sort_values("Arrival_Date", kind="stable")
+    if weather.empty:
+        return features
+    weather = weather.sort_values("date", kind="stable")
+    for lag in lags:
+        lagged = weather.rename(columns={c: f"{c}_lag{lag}" for c in WEATHER_FEATURES})
+        # Shifting the weather forward by L days aligns day D - L with price day D
+        lagged["date"] = lagged["date"] + pd.Timedelta(days=lag)
+        features = pd.merge_asof(
+            features, lagged, left_on="Arrival_Date", right_on="date", by="location",
+            direction="backward", tolerance=pd.Timedelta(days=tolerance_days)
+        ).drop(columns="date")
+    return features
+
+@instrumented_cache("build_feature_table")
+def build_feature_table(lags=WEATHER_LAGS_DAYS) -> pd.DataFrame:
+    """
+    One row per price observation with lagged weather features for its
+    district. Rows from districts without archived weather keep NaN features.
+    Built once per market-store version and shared by every session as a
+    read-only view (rebuilt after 30 min to pick up new weather).
+    """
+    store = load_market_store()
+    return RESOURCES.get("feature_table", tuple(lags), id(store), store.version)
+
+def _build_feature_table(lags, store_id, store_version) -> pd.DataFrame:
+    mark_cache_miss("build_feature_table")
+    market_df = load_market_store().frame
+    if market_df.empty:
+        return pd.DataFrame()
+
+    with stage_timer("features.prices"):
+        prices = market_prices(market_df)
+        mapping = district_locations(prices["District"].dropna().unique().tolist())
+        prices["location"] = prices["District"].map(mapping)
+
+    start = prices["Arrival_Date"].min() - pd.Timedelta(days=max(lags) + 7)
+    end = prices["Arrival_Date"].max()
+    with stage_timer("features.weather"):
+        frames = []
+        for location in sorted(set(mapping.values())):
+            daily = daily_weather(location, start, end)
+            if not daily.empty:
+                frames.append(daily.assign(location=location))
+        weather = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    with stage_timer("features.join"):
+        with_location = prices[prices["location"].notna()]
+        joined = join_weather_features(with_location, weather, lags)
+        features = pd.concat([joined, prices[prices["location"].isna()]], ignore_index=True)
+    return features.sort_values(SERIES_KEYS + ["Arrival_Date"], ignore_index=True)
+
+RESOURCES.register("feature_table", _build_feature_table, idle_seconds=1800, max_age_seconds=1800)
+
+def feature_table_csv(lags=WEATHER_LAGS_DAYS) -> bytes:
+    """The feature table as CSV bytes, encoded once per table build and shared by every session."""
+    store = load_market_store()
+    return RESOURCES.get("feature_csv", tuple(lags), id(store), store.version)
+
+def _build_feature_csv(lags, store_id, store_version) -> bytes:
+    with stage_timer("features.csv"):
+        return build_feature_table(lags).to_csv(index=False).encode("utf-8")
+
+RESOURCES.register("feature_csv", _build_feature_csv, idle_seconds=600, max_age_seconds=1800,
+                   depends_on=("feature_table",))
+
+def feature_columns(features: pd.DataFrame) -> List[str]:
+    return [c for c in features.columns if any(c.startswith(f"{w}_lag") for w in WEATHER_FEATURES)]
+
+def weather_price_correlation(features: pd.DataFrame, by: str = "Commodity", min_rows: int = 20) -> pd.DataFrame:
+    """Correlation of price change with each lagged weather feature, per group."""
+    columns = feature_columns(features)
+    data = features.dropna(subset=["price_change_pct"])
+    if data.empty or not columns:
+        return pd.DataFrame()
+    sizes = data.groupby(by, observed=True).size()
+    data = data[data[by].isin(sizes[sizes >= min_rows].index)]
+    return data.groupby(by, observed=True)[columns + ["price_change_pct"]].apply(
+        lambda group: group[columns].corrwith(group["price_change_pct"])
+    ).round(3)
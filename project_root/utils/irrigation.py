@@ -0,0 +1,142 @@
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# --- Evapotranspiration-based Irrigation Scheduler ---
+
+# Mid-season crop coefficient (FAO-56 Table 12) and effective root depth (m)
+CROP_PARAMS = {
+    "wheat":   {"kc": 1.15, "root_depth": 1.2},
+    "rice":    {"kc": 1.20, "root_depth": 0.5},
+    "maize":   {"kc": 1.20, "root_depth": 1.0},
+    "cotton":  {"kc": 1.15, "root_depth": 1.2},
+    "sugarcane": {"kc": 1.25, "root_depth": 1.2},
+    "potato":  {"kc": 1.15, "root_depth": 0.5},
+    "tomato":  {"kc": 1.15, "root_depth": 0.8},
+    "generic": {"kc": 1.00, "root_depth": 0.8},
+}
+
+# Available water capacity in mm of water per m of soil
+SOIL_AWC_MM_PER_M = {
+    "sand": 70.0,
+    "sandy loam": 110.0,
+    "loam": 150.0,
+    "clay loam": 170.0,
+    "clay": 190.0,
+}
+
+# The free forecast tier gives rain probability, not amount: expected rain is
+# probability x a typical event depth, of which EFFECTIVE_RAIN_FRACTION infiltrates.
+RAIN_EVENT_MM = 10.0
+EFFECTIVE_RAIN_FRACTION = 0.8
+
+FIELD_COLUMNS = ["field_id", "crop", "soil", "area_ha"]
+FIELD_DEFAULTS = {"latitude": 28.6, "initial_depletion": 0.3, "mad": 0.5}
+
+def read_fields(file, default_latitude: Optional[float] = None) -> pd.DataFrame:
+    """
+    Reads a registered-fields CSV. Required columns: field_id, crop, soil,
+    area_ha. Optional: latitude, initial_depletion (fraction of available
+    water already used), mad (management-allowed depletion fraction).
+    Raises ValueError with a readable message on bad input.
+    """
+    fields = pd.read_csv(file)
+    fields.columns = [c.strip().lower() for c in fields.columns]
+    missing = [c for c in FIELD_COLUMNS if c not in fields.columns]
+    if missing:
+        raise ValueError(f"Fields file is missing column(s): {', '.join(missing)}")
+
+    defaults = dict(FIELD_DEFAULTS)
+    if default_latitude is not None:
+        defaults["latitude"] = default_latitude
+    for column, value in defaults.items():
+        if column not in fields.columns:
+            fields[column] = value
+        fields[column] = pd.to_numeric(fields[column], errors="coerce").fillna(value)
+
+    fields["crop"] = fields["crop"].astype(str).str.strip().str.lower()
+    fields["soil"] = fields["soil"].astype(str).str.strip().str.lower()
+    unknown_soil = sorted(set(fields["soil"]) - set(SOIL_AWC_MM_PER_M))
+    if unknown_soil:
+        raise ValueError(f"Unknown soil type(s): {', '.join(unknown_soil)}. "
+                         f"Use one of: {', '.join(SOIL_AWC_MM_PER_M)}")
+    fields["area_ha"] = pd.to_numeric(fields["area_ha"], errors="coerce").fillna(0.0)
+    return fields
+
+def extraterrestrial_radiation(latitude_deg: np.ndarray, day_of_year: np.ndarray) -> np.ndarray:
+    """FAO-56 eq. 21, Ra in MJ m-2 day-1 for every (field, day) pair -> (n_fields, n_days)."""
+    phi = np.radians(latitude_deg)[:, None]
+    j = day_of_year[None, :]
+    dr = 1 + 0.033 * np.cos(2 * np.pi * j / 365)
+    delta = 0.409 * np.sin(2 * np.pi * j / 365 - 1.39)
+    ws = np.arccos(np.clip(-np.tan(phi) * np.tan(delta), -1.0, 1.0))
+    return (24 * 60 / np.pi) * 0.0820 * dr * (
+        ws * np.sin(phi) * np.sin(delta) + np.cos(phi) * np.cos(delta) * np.sin(ws)
+    )
+
+def hargreaves_et0(tmin: np.ndarray, tmax: np.ndarray, ra: np.ndarray) -> np.ndarray:
+    """
+    Hargreaves reference ET (mm/day). Penman-Monteith would need solar
+    radiation, which the forecast does not provide.
+    """
+    tmean = (tmin + tmax) / 2
+    return np.maximum(0.0023 * 0.408 * ra * (tmean + 17.8) * np.sqrt(np.clip(tmax - tmin, 0, None)), 0.0)
+
+def simulate_water_balance(fields: pd.DataFrame, daily: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Root-zone water balance over the forecast horizon, vectorized across
+    fields (one loop step per forecast day). A field is irrigated back to
+    field capacity when its depletion reaches mad x TAW.
+    Returns (n_fields, n_days) arrays: et0, etc, rain, depletion, irrigation (mm).
+    """
+    days = pd.to_datetime([d["date"] for d in daily])
+    tmin = np.array([np.nan if d.get("temp_min") is None else d["temp_min"] for d in daily], dtype=np.float64)
+    tmax = np.array([np.nan if d.get("temp_max") is None else d["temp_max"] for d in daily], dtype=np.float64)
+    tmin, tmax = np.fmin(tmin, tmax), np.fmax(tmin, tmax)
+    rain_chance = np.nan_to_num(
+        np.array([d.get("rain_chance") or 0 for d in daily], dtype=np.float64)
+    )
+
+    crops = fields["crop"].where(fields["crop"].isin(CROP_PARAMS.keys()), "generic")
+    kc = crops.map(lambda c: CROP_PARAMS[c]["kc"]).to_numpy()
+    root_depth = crops.map(lambda c: CROP_PARAMS[c]["root_depth"]).to_numpy()
+    taw = fields["soil"].map(SOIL_AWC_MM_PER_M).to_numpy() * root_depth
+    raw = fields["mad"].to_numpy() * taw
+
+    ra = extraterrestrial_radiation(fields["latitude"].to_numpy(dtype=np.float64), days.dayofyear.to_numpy())
+    et0 = np.nan_to_num(hargreaves_et0(tmin[None, :], tmax[None, :], ra))
+    etc = kc[:, None] * et0
+    rain = np.broadcast_to(rain_chance / 100 * RAIN_EVENT_MM * EFFECTIVE_RAIN_FRACTION, etc.shape)
+
+    n_fields, n_days = etc.shape
+    depletion = np.empty((n_fields, n_days))
+    irrigation = np.zeros((n_fields, n_days))
+    dr = fields["initial_depletion"].to_numpy() * taw
+    for d in range(n_days):
+        dr = np.clip(dr + etc[:, d] - rain[:, d], 0.0, taw)
+        due = dr >= raw
+        irrigation[due, d] = dr[due]
+        dr = np.where(due, 0.0, dr)
+        depletion[:, d] = dr
+
+    return {"dates": days, "et0": et0, "etc": etc, "rain": rain,
+            "depletion": depletion, "irrigation": irrigation, "taw": taw}
+
+def irrigation_schedule(fields: pd.DataFrame, daily: List[Dict[str, Any]]) -> pd.DataFrame:
+    """One row per (field, day) that needs water: depth in mm and volume in m³."""
+    if fields.empty or not daily:
+        return pd.DataFrame(columns=["field_id", "crop", "date", "depth_mm", "volume_m3", "etc_mm"])
+
+    balance = simulate_water_balance(fields, daily)
+    field_idx, day_idx = np.nonzero(balance["irrigation"] > 0)
+    depth = balance["irrigation"][field_idx, day_idx]
+    return pd.DataFrame({
+        "field_id": fields["field_id"].to_numpy()[field_idx],
+        "crop": fields["crop"].to_numpy()[field_idx],
+        "date": balance["dates"][day_idx].date,
+        "depth_mm": depth.round(1),
+        # 1 mm over 1 ha = 10 m³
+        "volume_m3": (depth * fields["area_ha"].to_numpy()[field_idx] * 10).round(1),
+        "etc_mm": balance["etc"][field_idx, day_idx].round(2),
+    }).sort_values(["date", "field_id"], ignore_index=True)
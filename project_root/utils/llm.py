@@ -0,0 +1,74 @@
+import os
+from typing import Dict, Any, Iterator, List, Tuple
+
+import requests
+
+from utils.resources import RESOURCES
+from utils.telemetry import count, record_payload, stage_timer
+
+# --- LLM Client ---
+
+# Used by features that call the assistant outside the AI Assistant page
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+
+# Keep-alive connections to the API shared by every session (openai.requestssession)
+RESOURCES.register("llm_http", lambda: requests.Session(), idle_seconds=600, close=lambda s: s.close())
+
+def chat_completion(api_key: str, model: str, messages: List[Dict[str, str]],
+                    max_tokens: int = 256, temperature: float = 0.7) -> Tuple[str, Dict[str, Any]]:
+    """
+    One Chat Completions call with latency, payload and token telemetry.
+    Returns (text, usage); API errors propagate to the caller.
+    """
+    # Imported on use so pages that only format advisories do not need the SDK
+    import openai
+
+    openai.api_key = api_key
+    openai.requestssession = RESOURCES.get("llm_http")
+    with stage_timer("assistant.http", model=model):
+        resp = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+    with stage_timer("assistant.parse"):
+        text = resp["choices"][0]["message"]["content"]
+    record_payload("assistant.response", len(text.encode("utf-8")))
+
+    usage = dict(resp["usage"]) if "usage" in resp else {}
+    if usage:
+        count("llm_prompt_tokens", usage.get("prompt_tokens") or 0, model=model)
+        count("llm_completion_tokens", usage.get("completion_tokens") or 0, model=model)
+    return text, usage
+
+def chat_completion_stream(api_key: str, model: str, messages: List[Dict[str, str]],
+                           max_tokens: int = 256, temperature: float = 0.7) -> Iterator[str]:
+    """
+    Streaming variant of chat_completion: yields text deltas as they arrive,
+    so callers (e.g. voice mode) can act on the first sentence early.
+    """
+    import openai
+
+    openai.api_key = api_key
+    openai.requestssession = RESOURCES.get("llm_http")
+    first_token = stage_timer("assistant.first_token", model=model)
+    n_bytes = 0
+    with stage_timer("assistant.http", model=model, stream=True):
+        stream = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if not delta:
+                continue
+            if n_bytes == 0:
+                first_token.stop()
+            n_bytes += len(delta.encode("utf-8"))
+            yield delta
+    record_payload("assistant.response", n_bytes)
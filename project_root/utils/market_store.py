@@ -0,0 +1,149 @@
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.resources import RESOURCES
+from utils.telemetry import instrumented_cache, mark_cache_miss, record_payload, stage_timer
+
+# --- Typed Market Store ---
+
+MARKET_DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'market_prices.csv')
+
+CATEGORY_COLUMNS = ["State", "District", "Market", "Commodity", "Variety", "Grade"]
+PRICE_COLUMNS = ["Min_Price", "Max_Price", "Modal_Price"]
+RAW_PRICE_COLUMNS = {
+    'Min_x0020_Price': 'Min_Price',
+    'Max_x0020_Price': 'Max_Price',
+    'Modal_x0020_Price': 'Modal_Price'
+}
+
+def parse_market_frame(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Typed copy of a raw market feed: dictionary-encoded categories,
+    datetime64 arrival dates (dd-mm-yyyy) and int32 prices (float32 when
+    a price is missing).
+    """
+    raw = raw.rename(columns=RAW_PRICE_COLUMNS)
+    frame = pd.DataFrame({c: raw[c].astype("category") for c in CATEGORY_COLUMNS if c in raw.columns})
+    frame["Arrival_Date"] = pd.to_datetime(raw["Arrival_Date"], dayfirst=True, errors="coerce")
+    for column in PRICE_COLUMNS:
+        price = pd.to_numeric(raw[column], errors="coerce")
+        frame[column] = price.astype(np.int32) if price.notna().all() else price.astype(np.float32)
+    return frame[frame["Arrival_Date"].notna()]
+
+class MarketStore:
+    """
+    Market prices parsed once, sorted by (Commodity, Arrival_Date). A
+    commodity's rows are one contiguous block found with searchsorted, so
+    selections are positional slices of the shared frame instead of
+    boolean-mask copies. `version` increases on every ingest.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[["MarketStore", pd.DataFrame], None]] = []
+        self.version = 0
+        self._state = self._index(frame)
+
+    @staticmethod
+    def _index(frame: pd.DataFrame):
+        """(sorted frame, dates, commodity -> slice), swapped in as one tuple so readers never mix versions."""
+        frame = frame.sort_values(["Commodity", "Arrival_Date"], kind="stable", ignore_index=True)
+        # Category order is the sort order, so the codes are non-decreasing
+        codes = frame["Commodity"].cat.codes.to_numpy()
+        categories = frame["Commodity"].cat.categories
+        bounds = np.searchsorted(codes, np.arange(len(categories) + 1))
+        groups: Dict[str, slice] = {
+            name: slice(int(bounds[i]), int(bounds[i + 1]))
+            for i, name in enumerate(categories) if bounds[i + 1] > bounds[i]
+        }
+        return frame, frame["Arrival_Date"].to_numpy(), groups
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        return self._state[0]
+
+    def __len__(self):
+        return len(self.frame)
+
+    def memory_bytes(self) -> int:
+        frame, dates, _ = self._state
+        return int(frame.memory_usage(deep=True).sum()) + dates.nbytes
+
+    def commodities(self) -> List[str]:
+        return list(self._state[2])
+
+    @staticmethod
+    def _slice(state, commodity: str, start=None, end=None) -> slice:
+        _, dates, groups = state
+        block = groups.get(commodity, slice(0, 0))
+        lo, hi = block.start, block.stop
+        if start is not None:
+            lo += int(np.searchsorted(dates[block], np.datetime64(pd.Timestamp(start)), side="left"))
+        if end is not None:
+            hi = block.start + int(np.searchsorted(dates[block], np.datetime64(pd.Timestamp(end)), side="right"))
+        return slice(lo, max(lo, hi))
+
+    def commodity_slice(self, commodity: str, start=None, end=None) -> slice:
+        """Row positions of `commodity` (optionally within [start, end]) as a slice."""
+        return self._slice(self._state, commodity, start, end)
+
+    def select(self, commodity: str, start=None, end=None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rows of one commodity as a positional slice (no mask, no copy of the full frame)."""
+        state = self._state
+        rows = self._slice(state, commodity, start, end)
+        selection = state[0].iloc[rows]
+        return selection if columns is None else selection[columns]
+
+    def date_range(self, commodity: str):
+        _, dates, groups = self._state
+        rows = groups.get(commodity)
+        if rows is None or rows.stop == rows.start:
+            return None, None
+        return pd.Timestamp(dates[rows.start]), pd.Timestamp(dates[rows.stop - 1])
+
+    # ---- ingestion ----
+
+    def on_ingest(self, callback: Callable[["MarketStore", pd.DataFrame], None]):
+        """Registers callback(store, new_rows), called after every ingest."""
+        self._listeners.append(callback)
+
+    def ingest(self, raw: pd.DataFrame) -> int:
+        """Appends a raw feed batch (same columns as the CSV), re-indexes and bumps the version."""
+        new_rows = parse_market_frame(raw)
+        with self._lock:
+            combined = pd.concat([self.frame, new_rows], ignore_index=True)
+            for column in CATEGORY_COLUMNS:
+                if column in combined.columns:
+                    combined[column] = combined[column].astype("category")
+            self._state = self._index(combined)
+            self.version += 1
+        for callback in self._listeners:
+            callback(self, new_rows)
+        return len(new_rows)
+
+def read_market_store(file_path: str = MARKET_DATA_FILE) -> MarketStore:
+    """Parses the CSV into a MarketStore. Usable outside Streamlit (see market_api.py)."""
+    record_payload("market.csv", os.path.getsize(file_path))
+    with stage_timer("market.parse"):
+        return MarketStore(parse_market_frame(pd.read_csv(file_path)))
+
+def _build_market_store(file_path: str) -> MarketStore:
+    mark_cache_miss("load_market_store")
+    return read_market_store(file_path)
+
+# Kept for the life of the process: price alerts and the RAG index follow its ingests
+RESOURCES.register("market_store", _build_market_store)
+
+@instrumented_cache("load_market_store")
+def load_market_store(file_path: str = MARKET_DATA_FILE) -> MarketStore:
+    """Shared typed store, parsed once per process."""
+    try:
+        return RESOURCES.get("market_store", file_path)
+    except FileNotFoundError:
+        st.error(f"Error: The data file '{file_path}' was not found.")
+        st.stop()
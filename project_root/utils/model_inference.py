@@ -1,29 +1,118 @@
+import os
+import time
+import threading
 import torch
 import timm
 import streamlit as st
 from PIL import Image
 from torchvision import transforms
 
+from utils.telemetry import REGISTRY, instrumented_cache, mark_cache_miss, stage_timer
+from utils.profiling import inference_trace
+from utils.resources import RESOURCES
+
+# --- Model Variants ---
+
+# Detector variants that can be selected at runtime. Students are distilled
+# from the EfficientNetV2 teacher in models/cnn_model.py and exported with
+# the same "<name>_best_model.pth" naming.
+MODEL_VARIANTS = {
+    "EfficientNetV2-Small": {
+        "arch": "tf_efficientnetv2_s",
+        "weights": "models/EfficientNetV2-Small_best_model.pth",
+    },
+    "MobileNetV3-Large": {
+        "arch": "mobilenetv3_large_100",
+        "weights": "models/MobileNetV3-Large_best_model.pth",
+    },
+    "EfficientNet-Lite0": {
+        "arch": "tf_efficientnet_lite0",
+        "weights": "models/EfficientNet-Lite0_best_model.pth",
+    },
+}
+
+# Channel-pruned EfficientNetV2 models are exported as TorchScript because
+# their layer widths no longer match the timm architecture.
+for _pct in (30, 50, 70):
+    MODEL_VARIANTS[f"EfficientNetV2-Small-pruned{_pct}"] = {
+        "format": "torchscript",
+        "weights": f"models/EfficientNetV2-Small-pruned{_pct}.pt",
+    }
+
+# Can be overridden per deployment, e.g. DETECTOR_MODEL=MobileNetV3-Large on kiosks
+DEFAULT_VARIANT = os.environ.get("DETECTOR_MODEL", "EfficientNetV2-Small")
+
+# These are the 17 classes from your training script (MUST match your training labels)
+CLASS_NAMES = [
+    'Corn___Common_Rust',
+    'Corn___Gray_Leaf_Spot',
+    'Corn___Healthy',
+    'Corn___Northern_Leaf_Blight',
+    'Potato___Early_Blight',
+    'Potato___Healthy',
+    'Potato___Late_Blight',
+    'Rice___Brown_Spot',
+    'Rice___Healthy',
+    'Rice___Leaf_Blast',
+    'Rice___Neck_Blast',
+    'Sugarcane__Bacterial_Blight',
+    'Sugarcane__Healthy',
+    'Sugarcane__Red_Rot',
+    'Wheat___Brown_Rust',
+    'Wheat___Healthy',
+    'Wheat___Yellow_Rust'
+]
+
+def available_variants():
+    """Returns the variant names whose weight files are present on disk."""
+    return [name for name, cfg in MODEL_VARIANTS.items() if os.path.exists(cfg["weights"])]
+
 # --- Model Loading ---
 
-@st.cache_resource
-def load_model():
+# Unused detector variants are unloaded after this long (see utils/resources.py)
+MODEL_IDLE_SECONDS = float(os.environ.get("DETECTOR_IDLE_MINUTES", "30")) * 60
+
+@instrumented_cache("load_model")
+def load_model(variant: str = DEFAULT_VARIANT):
     """
-    Loads the pre-trained EfficientNetV2-Small model and 
-    the fine-tuned weights.
+    Returns the shared detector variant (the EfficientNetV2-Small teacher
+    by default, a distilled student or a pruned model), loading it on first use.
     """
+    return RESOURCES.get("detector_model", variant)
+
+def _build_model(variant: str):
+    """Builds a detector variant with its fine-tuned weights."""
+    if variant not in MODEL_VARIANTS:
+        st.error(f"Unknown model variant '{variant}'. Choose one of: {', '.join(MODEL_VARIANTS)}")
+        st.stop()
+    config = MODEL_VARIANTS[variant]
+    mark_cache_miss("load_model")
+
+    if config.get("format") == "torchscript":
+        try:
+            model = torch.jit.load(config["weights"], map_location=torch.device('cpu'))
+        except ValueError:
+            # torch.jit.load reports a missing file as ValueError
+            st.error(f"Model file not found at {config['weights']}. Please make sure it's in the 'models' directory.")
+            st.stop()
+        except Exception as e:
+            st.error(f"Error loading the model: {e}")
+            st.stop()
+        model.eval()
+        return model
+
     # 1. Define the number of classes your model was trained on
-    num_classes = 17  # CORRECTED: Was 38, should be 17
+    num_classes = len(CLASS_NAMES)
 
     # 2. Create the model architecture using timm
     model = timm.create_model(
-        'tf_efficientnetv2_s',
+        config["arch"],
         pretrained=False,  # We are loading our own weights, so no need to download
         num_classes=num_classes
     )
-    
+
     # 3. Load your fine-tuned weights
-    model_path = 'models/EfficientNetV2-Small_best_model.pth'
+    model_path = config["weights"]
     try:
         # Load the state dict
         model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
@@ -40,51 +129,171 @@ def load_model():
 
 # --- Image Prediction ---
 
-def predict_image(image_file, model):
+# The same transformations used during training
+TRANSFORM = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
+def preprocess_image(image_file):
+    """
+    Decodes the uploaded image and returns it together with the
+    normalized tensor (with batch dimension) the model expects.
+    """
+    # The page may already have read the upload to display it
+    if hasattr(image_file, "seek"):
+        image_file.seek(0)
+    with stage_timer("detector.decode"):
+        image = Image.open(image_file).convert('RGB')
+    with stage_timer("detector.preprocess"):
+        tensor = TRANSFORM(image).unsqueeze(0)
+    return image, tensor
+
+# --- Test-Time Augmentation ---
+
+# TTA only runs when the single-view confidence is below this value
+TTA_THRESHOLD = 0.80
+
+# Zoomed-out view: the whole image shrunk to 196px and reflect-padded back to
+# 224, so the leaf appears smaller than in the base view (the crops zoom in)
+TTA_SCALE_TRANSFORM = transforms.Compose([
+    transforms.Resize((196, 196)),
+    transforms.Pad(14, padding_mode="reflect"),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
+def tta_views(image: Image.Image, base: torch.Tensor = None) -> torch.Tensor:
+    """
+    Builds flips, centre crops and a rescaled view of one image and stacks
+    them into a single (views, 3, 224, 224) batch.
+    """
+    if base is None:
+        base = TRANSFORM(image)
+    views = [base, torch.flip(base, dims=[2]), torch.flip(base, dims=[1])]
+
+    # Zoomed-in centre crops
+    w, h = image.size
+    for scale in (0.85, 0.70):
+        cw, ch = int(w * scale), int(h * scale)
+        left, top = (w - cw) // 2, (h - ch) // 2
+        views.append(TRANSFORM(image.crop((left, top, left + cw, top + ch))))
+
+    views.append(TTA_SCALE_TRANSFORM(image))
+    return torch.stack(views)
+
+def predict_image(image_file, model, tta: bool = False, tta_threshold: float = TTA_THRESHOLD):
     """
-    Preprocesses the uploaded image, runs inference, and returns the 
+    Preprocesses the uploaded image, runs inference, and returns the
     predicted class and confidence score.
+
+    With tta=True, low-confidence results (below tta_threshold) are re-scored
+    by averaging the softmax over augmented views in one batched forward pass.
     """
-    
-    # 1. Define the same transformations used during training
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
-    
-    # 2. Preprocess the image
-    image = Image.open(image_file).convert('RGB')
-    tensor = transform(image).unsqueeze(0)  # Add batch dimension
-    
-    # 3. Run prediction
-    with torch.no_grad():
+
+    # 1. Preprocess the image
+    image, tensor = preprocess_image(image_file)
+
+    # 2. Run prediction
+    with torch.no_grad(), stage_timer("detector.forward"), inference_trace("forward"):
         output = model(tensor)
-    
-    # 4. Post-process the output
+
+    # 3. Post-process the output
     probabilities = torch.nn.functional.softmax(output, dim=1)
     confidence, predicted_class_idx = torch.max(probabilities, 1)
-    
-    # 5. Define your class names (MUST match your training labels)
-    #    These are the 17 classes from your training script
-    class_names = [
-        'Corn___Common_Rust', 
-        'Corn___Gray_Leaf_Spot', 
-        'Corn___Healthy', 
-        'Corn___Northern_Leaf_Blight',
-        'Potato___Early_Blight', 
-        'Potato___Healthy', 
-        'Potato___Late_Blight',
-        'Rice___Brown_Spot', 
-        'Rice___Healthy', 
-        'Rice___Leaf_Blast', 
-        'Rice___Neck_Blast',
-        'Sugarcane__Bacterial_Blight', 
-        'Sugarcane__Healthy', 
-        'Sugarcane__Red_Rot',
-        'Wheat___Brown_Rust', 
-        'Wheat___Healthy', 
-        'Wheat___Yellow_Rust'
-    ]
-    
-    return class_names[predicted_class_idx.item()], confidence.item()
\ No newline at end of file
+
+    # 4. Borderline result: average over augmented views
+    if tta and confidence.item() < tta_threshold:
+        with torch.no_grad(), stage_timer("detector.forward_tta"), inference_trace("forward_tta"):
+            view_output = model(tta_views(image, tensor[0]))
+        probabilities = torch.nn.functional.softmax(view_output, dim=1).mean(dim=0, keepdim=True)
+        confidence, predicted_class_idx = torch.max(probabilities, 1)
+
+    return CLASS_NAMES[predicted_class_idx.item()], confidence.item()
+
+# --- Cascade Inference ---
+
+# The fast model answers on its own when its top-1 confidence reaches the
+# threshold; calibrate it with benchmarks/cascade_calibration.py.
+CASCADE_FAST_VARIANT = os.environ.get("CASCADE_FAST_MODEL", "MobileNetV3-Large")
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", "0.90"))
+
+class CascadeDetector:
+    """
+    Two-stage detector: a small, fast model classifies first and only images
+    whose confidence is below `threshold` are escalated to the accurate model.
+    Per-stage run/hit counts and latencies are kept for monitoring.
+    """
+
+    def __init__(self, fast_model, accurate_model, threshold: float = CASCADE_THRESHOLD):
+        self.fast_model = fast_model
+        self.accurate_model = accurate_model
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.stats = {
+            "fast": {"runs": 0, "hits": 0, "total_ms": 0.0},
+            "accurate": {"runs": 0, "hits": 0, "total_ms": 0.0},
+        }
+
+    def _run(self, model, tensor):
+        start = time.perf_counter()
+        with torch.no_grad(), inference_trace("cascade"):
+            probabilities = torch.nn.functional.softmax(model(tensor), dim=1)
+        confidence, predicted_class_idx = torch.max(probabilities, 1)
+        return confidence.item(), predicted_class_idx.item(), (time.perf_counter() - start) * 1000
+
+    def _record(self, stage: str, elapsed_ms: float, hit: bool):
+        REGISTRY.observe("stage_latency_ms", elapsed_ms, {"stage": f"cascade.{stage}"})
+        with self._lock:
+            self.stats[stage]["runs"] += 1
+            self.stats[stage]["hits"] += int(hit)
+            self.stats[stage]["total_ms"] += elapsed_ms
+
+    def predict(self, image_file):
+        """Returns (label, confidence, stage) where stage is "fast" or "accurate"."""
+        # Preprocess once, both stages share the tensor
+        _, tensor = preprocess_image(image_file)
+
+        confidence, class_idx, elapsed_ms = self._run(self.fast_model, tensor)
+        resolved = confidence >= self.threshold
+        self._record("fast", elapsed_ms, resolved)
+        if resolved:
+            return CLASS_NAMES[class_idx], confidence, "fast"
+
+        confidence, class_idx, elapsed_ms = self._run(self.accurate_model, tensor)
+        self._record("accurate", elapsed_ms, True)
+        return CLASS_NAMES[class_idx], confidence, "accurate"
+
+    def summary(self) -> dict:
+        """Hit rate and mean latency per stage, plus the mean cost per diagnosis."""
+        with self._lock:
+            stats = {stage: dict(values) for stage, values in self.stats.items()}
+
+        total = stats["fast"]["runs"]
+        summary = {"diagnoses": total, "threshold": self.threshold}
+        for stage, values in stats.items():
+            summary[stage] = {
+                "runs": values["runs"],
+                "hit_rate": values["hits"] / total if total else 0.0,
+                "mean_ms": values["total_ms"] / values["runs"] if values["runs"] else 0.0,
+            }
+        summary["mean_ms_per_diagnosis"] = (
+            (stats["fast"]["total_ms"] + stats["accurate"]["total_ms"]) / total if total else 0.0
+        )
+        return summary
+
+def load_cascade(fast_variant: str = CASCADE_FAST_VARIANT, accurate_variant: str = DEFAULT_VARIANT,
+                 threshold: float = CASCADE_THRESHOLD):
+    """
+    Returns the shared cascade detector (one instance, and one set of counters,
+    for all sessions).
+    """
+    return RESOURCES.get("detector_cascade", fast_variant, accurate_variant, threshold)
+
+RESOURCES.register("detector_model", _build_model, idle_seconds=MODEL_IDLE_SECONDS)
+RESOURCES.register(
+    "detector_cascade",
+    lambda fast, accurate, threshold: CascadeDetector(load_model(fast), load_model(accurate), threshold),
+    idle_seconds=MODEL_IDLE_SECONDS, depends_on=("detector_model",)
+)
@@ -0,0 +1,120 @@
+import os
+import threading
+from collections import Counter
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.model_inference import TRANSFORM, CASCADE_FAST_VARIANT, MODEL_IDLE_SECONDS, MODEL_VARIANTS, load_model
+from utils.resources import RESOURCES
+
+# --- Out-of-distribution Pre-filter ---
+
+# The thresholds below are uncalibrated starting points, so the Detector page
+# leaves the filter off unless OOD_FILTER_DEFAULT=1
+OOD_FILTER_DEFAULT = os.environ.get("OOD_FILTER_DEFAULT", "").lower() in ("1", "true", "yes")
+
+# Every threshold can be overridden with an env var, e.g. OOD_MIN_SHARPNESS=40
+OOD_THRESHOLDS = {
+    "min_sharpness": 60.0,     # variance of the Laplacian on the 128px grayscale image
+    "min_brightness": 0.12,    # mean luminance in [0, 1]
+    "max_brightness": 0.92,
+    "max_clipped": 0.35,       # share of pixels that are pure black or white
+    "max_energy": -4.0,        # energy score of the cheap model; higher = less leaf-like
+}
+
+REJECTION_MESSAGES = {
+    "blurry": "The photo is too blurry. Hold the phone steady and focus on the leaf.",
+    "too_dark": "The photo is too dark. Take it in daylight.",
+    "too_bright": "The photo is overexposed. Avoid direct sunlight on the lens.",
+    "clipped": "Large parts of the photo are pure black or white. Retake it with the leaf filling the frame.",
+    "not_leaf": "This does not look like a crop leaf. Upload a close-up of a single leaf.",
+}
+
+def thresholds_from_env(defaults: Dict[str, float] = OOD_THRESHOLDS) -> Dict[str, float]:
+    """Returns the default thresholds with any OOD_<NAME> env overrides applied."""
+    return {key: float(os.environ.get(f"OOD_{key.upper()}", value)) for key, value in defaults.items()}
+
+class OODFilter:
+    """
+    Cheap checks that run before the main forward pass: blur/exposure
+    statistics on a downscaled copy, then an energy score from the small
+    (distilled) model. Keeps a counter per rejection reason.
+    """
+
+    def __init__(self, scorer_model=None, thresholds: Optional[Dict[str, float]] = None, size: int = 128):
+        self.scorer_model = scorer_model
+        self.thresholds = {**OOD_THRESHOLDS, **(thresholds or {})}
+        self.size = size
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def image_stats(self, image: Image.Image) -> Dict[str, float]:
+        """Sharpness and exposure statistics, vectorized over the downscaled grayscale image."""
+        gray = np.asarray(image.convert("L").resize((self.size, self.size), Image.BILINEAR), dtype=np.float32)
+
+        # 4-neighbour Laplacian via array slicing
+        laplacian = (4 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1]
+                     - gray[1:-1, :-2] - gray[1:-1, 2:])
+        return {
+            "sharpness": float(laplacian.var()),
+            "brightness": float(gray.mean() / 255.0),
+            "clipped": float(np.mean((gray <= 5) | (gray >= 250))),
+        }
+
+    def energy_score(self, image: Image.Image) -> Optional[float]:
+        """Energy score -logsumexp(logits); None when no scorer model is loaded."""
+        if self.scorer_model is None:
+            return None
+        with torch.no_grad():
+            logits = self.scorer_model(TRANSFORM(image.convert("RGB")).unsqueeze(0))
+        return float(-torch.logsumexp(logits, dim=1).item())
+
+    def check(self, image: Image.Image) -> Tuple[bool, Optional[str], Dict[str, Any]]:
+        """Returns (accepted, rejection reason or None, stats)."""
+        t = self.thresholds
+        stats = self.image_stats(image)
+
+        reason = None
+        if stats["sharpness"] < t["min_sharpness"]:
+            reason = "blurry"
+        elif stats["brightness"] < t["min_brightness"]:
+            reason = "too_dark"
+        elif stats["brightness"] > t["max_brightness"]:
+            reason = "too_bright"
+        elif stats["clipped"] > t["max_clipped"]:
+            reason = "clipped"
+        else:
+            # Only pay for the model when the cheap statistics pass
+            stats["energy"] = self.energy_score(image)
+            if stats["energy"] is not None and stats["energy"] > t["max_energy"]:
+                reason = "not_leaf"
+
+        with self._lock:
+            self.counters["checked"] += 1
+            self.counters[reason or "accepted"] += 1
+
+        return reason is None, reason, stats
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+def _build_ood_filter(scorer_variant: str) -> OODFilter:
+    scorer = None
+    if scorer_variant in MODEL_VARIANTS and os.path.exists(MODEL_VARIANTS[scorer_variant]["weights"]):
+        scorer = load_model(scorer_variant)
+    return OODFilter(scorer, thresholds_from_env())
+
+def load_ood_filter(scorer_variant: str = CASCADE_FAST_VARIANT) -> OODFilter:
+    """
+    Shared pre-filter. The energy check uses the small model when its weights
+    are available; otherwise only the image statistics are applied.
+    """
+    return RESOURCES.get("ood_filter", scorer_variant)
+
+# Holds a reference to the scorer model, so it is evicted together with (before) it
+RESOURCES.register("ood_filter", _build_ood_filter, idle_seconds=MODEL_IDLE_SECONDS,
+                   depends_on=("detector_model",))
@@ -0,0 +1,277 @@
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.market_store import load_market_store
+from utils.telemetry import count, stage_timer
+
+# --- Price-alert Subscriptions ---
+
+PRICE_ALERTS_DB = os.environ.get("PRICE_ALERTS_DB", "data/price_alerts.db")
+
+# above: price crosses up through value; below: crosses down through value;
+# pct_change: moves by at least value % from the previous price, either way
+RULE_KINDS = ("above", "below", "pct_change")
+
+Key = Tuple[str, str]  # (commodity, market)
+
+class PriceAlertEngine:
+    """
+    Threshold and percent-change rules per (commodity, market), kept in
+    SQLite and mirrored in memory as sorted value arrays per key and kind.
+    A new price for a key is matched with two binary searches per kind, so
+    the cost depends on the matches, not on the number of subscriptions.
+    Matches go to an SQLite outbox for the SMS/IVR sender to drain.
+    """
+
+    def __init__(self, path: str = PRICE_ALERTS_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                id INTEGER PRIMARY KEY,
+                subscriber TEXT NOT NULL,
+                commodity TEXT NOT NULL,
+                market TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value REAL NOT NULL,
+                active INTEGER NOT NULL DEFAULT 1,
+                created_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_subscriptions_key ON subscriptions(commodity, market);
+            -- Append-only log of deactivations, read incrementally by sync()
+            CREATE TABLE IF NOT EXISTS unsubscribed (
+                seq INTEGER PRIMARY KEY,
+                subscription_id INTEGER NOT NULL,
+                created_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY,
+                subscription_id INTEGER,
+                subscriber TEXT,
+                commodity TEXT,
+                market TEXT,
+                kind TEXT,
+                value REAL,
+                price REAL,
+                previous_price REAL,
+                arrival_date TEXT,
+                created_at TEXT,
+                sent_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox(sent_at, id);
+        """)
+        self.db.commit()
+
+        # key -> kind -> (sorted values, subscription ids)
+        self._index: Dict[Key, Dict[str, Tuple[np.ndarray, np.ndarray]]] = defaultdict(dict)
+        # Additions since the last merge, merged lazily on the next match for that key
+        self._pending: Dict[Key, Dict[str, List[Tuple[float, int]]]] = defaultdict(lambda: defaultdict(list))
+        self._inactive = set()
+        self._subscribers: Dict[int, str] = {}
+        self.last_price: Dict[Key, float] = {}
+        self._load()
+
+    # ---- index ----
+
+    def _load(self):
+        rows = pd.read_sql_query(
+            "SELECT id, subscriber, commodity, market, kind, value FROM subscriptions WHERE active = 1", self.db
+        )
+        self._max_id = self.db.execute("SELECT COALESCE(MAX(id), 0) FROM subscriptions").fetchone()[0]
+        self._max_unsubscribed = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM unsubscribed").fetchone()[0]
+        self._subscribers = dict(zip(rows["id"], rows["subscriber"]))
+        rows = rows.sort_values(["commodity", "market", "kind", "value"], kind="stable")
+        for (commodity, market, kind), group in rows.groupby(["commodity", "market", "kind"], sort=False):
+            self._index[(commodity, market)][kind] = (
+                group["value"].to_numpy(np.float64), group["id"].to_numpy(np.int64)
+            )
+
+    def _rules(self, key: Key, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+        pending = self._pending.get(key, {}).get(kind)
+        if pending:
+            values, ids = self._index[key].get(kind, (np.empty(0), np.empty(0, np.int64)))
+            add_values, add_ids = (np.array(a) for a in zip(*pending))
+            values, ids = np.concatenate([values, add_values]), np.concatenate([ids, add_ids.astype(np.int64)])
+            order = np.argsort(values, kind="stable")
+            self._index[key][kind] = (values[order], ids[order])
+            pending.clear()
+        return self._index.get(key, {}).get(kind, (np.empty(0), np.empty(0, np.int64)))
+
+    def sync(self):
+        """
+        Picks up rules written and deactivated by other processes (e.g. the
+        Streamlit page while market_api.py runs) since the last load or sync.
+        Both reads are range scans on a primary key past the last seen id.
+        Call with self._lock held.
+        """
+        rows = self.db.execute(
+            "SELECT id, subscriber, commodity, market, kind, value, active FROM subscriptions WHERE id > ?",
+            (self._max_id,)
+        ).fetchall()
+        for sub_id, subscriber, commodity, market, kind, value, active in rows:
+            self._max_id = max(self._max_id, sub_id)
+            if active:
+                self._pending[(commodity, market)][kind].append((value, sub_id))
+                self._subscribers[sub_id] = subscriber
+        for seq, sub_id in self.db.execute(
+            "SELECT seq, subscription_id FROM unsubscribed WHERE seq > ? ORDER BY seq", (self._max_unsubscribed,)
+        ):
+            self._inactive.add(sub_id)
+            self._subscribers.pop(sub_id, None)
+            self._max_unsubscribed = seq
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    # ---- subscriptions ----
+
+    def subscribe(self, subscriber: str, commodity: str, market: str, kind: str, value: float) -> int:
+        return self.subscribe_many([(subscriber, commodity, market, kind, value)])[0]
+
+    def subscribe_many(self, rules: Iterable[Tuple[str, str, str, str, float]]) -> List[int]:
+        """Bulk insert of (subscriber, commodity, market, kind, value) rules; returns their ids."""
+        rules = list(rules)
+        bad = {r[3] for r in rules} - set(RULE_KINDS)
+        if bad:
+            raise ValueError(f"Unknown rule kind(s): {', '.join(sorted(bad))}")
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        with self._lock, self.db:
+            # Take the write lock first so no other writer can claim these ids, and
+            # pull in their earlier rules so _max_id never skips past them
+            self.db.execute("BEGIN IMMEDIATE")
+            self.sync()
+            start = self._max_id + 1
+            ids = list(range(start, start + len(rules)))
+            self.db.executemany(
+                "INSERT INTO subscriptions (id, subscriber, commodity, market, kind, value, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(i, *rule[:4], float(rule[4]), now) for i, rule in zip(ids, rules)]
+            )
+            for i, (subscriber, commodity, market, kind, value) in zip(ids, rules):
+                self._pending[(commodity, market)][kind].append((float(value), i))
+                self._subscribers[i] = subscriber
+            if ids:
+                self._max_id = ids[-1]
+        return ids
+
+    def unsubscribe(self, subscription_id: int):
+        with self._lock, self.db:
+            self.db.execute("UPDATE subscriptions SET active = 0 WHERE id = ?", (subscription_id,))
+            self.db.execute("INSERT INTO unsubscribed (subscription_id, created_at) VALUES (?, ?)",
+                            (subscription_id, datetime.utcnow().isoformat(timespec="seconds")))
+            self._inactive.add(subscription_id)
+            self._subscribers.pop(subscription_id, None)
+
+    # ---- matching ----
+
+    def match(self, key: Key, price: float, previous: Optional[float]) -> List[Tuple[int, str, float]]:
+        """(subscription id, kind, rule value) of every rule triggered by previous -> price."""
+        # A blank modal price must neither fire rules nor become the reference price
+        if previous is None or not np.isfinite(price) or not np.isfinite(previous) or price == previous:
+            return []
+        hits = []
+        values, ids = self._rules(key, "above")
+        if price > previous and len(values):
+            # previous < value <= price
+            lo, hi = np.searchsorted(values, previous, "right"), np.searchsorted(values, price, "right")
+            hits += [(int(i), "above", float(v)) for v, i in zip(values[lo:hi], ids[lo:hi])]
+        values, ids = self._rules(key, "below")
+        if price < previous and len(values):
+            # price <= value < previous
+            lo, hi = np.searchsorted(values, price, "left"), np.searchsorted(values, previous, "left")
+            hits += [(int(i), "below", float(v)) for v, i in zip(values[lo:hi], ids[lo:hi])]
+        values, ids = self._rules(key, "pct_change")
+        if previous > 0 and len(values):
+            change = abs(price - previous) / previous * 100
+            hi = np.searchsorted(values, change, "right")
+            hits += [(int(i), "pct_change", float(v)) for v, i in zip(values[:hi], ids[:hi])]
+        return [h for h in hits if h[0] not in self._inactive] if self._inactive else hits
+
+    def prime(self, frame: pd.DataFrame):
+        """Sets the reference price per (commodity, market) from already stored rows."""
+        latest = (frame[frame["Modal_Price"].notna()].sort_values("Arrival_Date", kind="stable")
+                  .groupby(["Commodity", "Market"], observed=True)["Modal_Price"].last())
+        self.last_price.update({key: float(p) for key, p in latest.items()})
+
+    def process_batch(self, rows: pd.DataFrame) -> int:
+        """
+        Matches a batch of new price rows (typed MarketStore columns) and writes
+        the alerts to the outbox. Each (commodity, market) is evaluated in
+        date order against its previous price. Returns the number of alerts.
+        """
+        # Rows without a modal price (blank in the feed, NaN after parsing) carry no price movement
+        rows = rows[rows["Modal_Price"].notna()]
+        if rows.empty:
+            return 0
+        with stage_timer("alerts.match"):
+            prices = (rows.sort_values("Arrival_Date", kind="stable")
+                      .groupby(["Commodity", "Market", "Arrival_Date"], observed=True, sort=False)["Modal_Price"]
+                      .mean().reset_index())
+            alerts = []
+            now = datetime.utcnow().isoformat(timespec="seconds")
+            with self._lock:
+                self.sync()
+                for commodity, market, day, price in prices.itertuples(index=False, name=None):
+                    key = (str(commodity), str(market))
+                    previous = self.last_price.get(key)
+                    for sub_id, kind, value in self.match(key, float(price), previous):
+                        alerts.append((sub_id, self._subscribers.get(sub_id), key[0], key[1], kind, value,
+                                       float(price), previous, pd.Timestamp(day).date().isoformat(), now))
+                    self.last_price[key] = float(price)
+
+        if alerts:
+            with self._lock, self.db:
+                self.db.executemany(
+                    "INSERT INTO outbox (subscription_id, subscriber, commodity, market, kind, value, price, "
+                    "previous_price, arrival_date, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", alerts
+                )
+        count("price_alerts", len(alerts))
+        return len(alerts)
+
+    def attach(self, store):
+        """Primes reference prices from a MarketStore and evaluates every future ingest."""
+        self.prime(store.frame)
+        store.on_ingest(lambda _store, new_rows: self.process_batch(new_rows))
+
+    # ---- outbox ----
+
+    def pending(self, limit: int = 500) -> List[Dict[str, Any]]:
+        """Oldest unsent alerts, for the SMS/IVR sender."""
+        cur = self.db.execute(
+            "SELECT id, subscriber, commodity, market, kind, value, price, previous_price, arrival_date "
+            "FROM outbox WHERE sent_at IS NULL ORDER BY id LIMIT ?", (limit,)
+        )
+        columns = [c[0] for c in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    def mark_sent(self, outbox_ids: List[int]):
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        with self._lock, self.db:
+            self.db.executemany("UPDATE outbox SET sent_at = ? WHERE id = ?", [(now, i) for i in outbox_ids])
+
+@st.cache_resource
+def load_price_alerts() -> PriceAlertEngine:
+    """Shared engine attached to the shared market store."""
+    engine = PriceAlertEngine()
+    engine.attach(load_market_store())
+    return engine
+
+def format_alert(alert: Dict[str, Any]) -> str:
+    """Short SMS text for one outbox row."""
+    if alert["kind"] == "pct_change":
+        change = (alert["price"] - alert["previous_price"]) / alert["previous_price"] * 100
+        return (f"{alert['commodity']} at {alert['market']}: ₹{alert['price']:,.0f}/qtl "
+                f"({change:+.1f}% since last report) on {alert['arrival_date']}.")
+    direction = "above" if alert["kind"] == "above" else "below"
+    return (f"{alert['commodity']} at {alert['market']} is {direction} ₹{alert['value']:,.0f}: "
+            f"₹{alert['price']:,.0f}/qtl on {alert['arrival_date']}.")
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import streamlit as st
+
+# --- Opt-in Production Profiling ---
+
+# Enable for every session with PROFILE_PAGES=1, or per request with ?profile=1
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_MB = float(os.environ.get("PROFILE_MAX_MB", "200"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "10"))
+
+# Script thread id -> profiler of the rerun running on it
+_active: Dict[int, "SamplingProfiler"] = {}
+_active_lock = threading.Lock()
+
+def profiling_requested() -> bool:
+    if os.environ.get("PROFILE_PAGES", "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return st.query_params.get("profile") in ("1", "true")
+    except Exception:
+        return False
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval_ms` from a background
+    thread and aggregates folded stacks ("a;b;c count"), the input format of
+    flamegraph.pl and speedscope. The profiled thread runs untouched.
+
+    With `until_frame` (a module frame on the profiled thread), sampling
+    ends on its own once that frame has returned or raised, and `on_done`
+    is called from the sampling thread.
+    """
+
+    def __init__(self, thread_id: int, interval_ms: float = PROFILE_INTERVAL_MS, max_depth: int = 64,
+                 until_frame=None, on_done: Optional[Callable[["SamplingProfiler"], None]] = None, page: str = ""):
+        self.thread_id = thread_id
+        self.page = page
+        self.interval = interval_ms / 1000
+        self.max_depth = max_depth
+        self.until_frame = until_frame
+        self.on_done = on_done
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.elapsed_ms = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="page-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack, running = [], self.until_frame is None
+            while frame is not None:
+                running = running or frame is self.until_frame
+                if len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if not running:
+                break
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+        self.elapsed_ms = int((time.perf_counter() - self.started) * 1000)
+        self.until_frame = None
+        if self.on_done is not None and not self._stop.is_set():
+            self.on_done(self)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+def enforce_size_cap(directory: str = PROFILE_DIR, max_mb: float = PROFILE_MAX_MB):
+    """
+    Deletes the oldest artifacts until the directory fits under the cap.
+    Several sessions may run this at once, so files that another run
+    already deleted are skipped.
+    """
+    files = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.isfile(path):
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+        except OSError:
+            continue
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= max_mb * 1024 ** 2:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+def _artifact_path(page: str, suffix: str) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S_%f")
+    return os.path.join(PROFILE_DIR, f"{stamp}_{page}{suffix}")
+
+def _finish(profiler: SamplingProfiler):
+    with _active_lock:
+        if _active.get(profiler.thread_id) is profiler:
+            del _active[profiler.thread_id]
+    if profiler.samples:
+        profiler.write_folded(_artifact_path(profiler.page, f"_{profiler.elapsed_ms}ms.folded"))
+        enforce_size_cap()
+
+def profile_page(page: str):
+    """
+    Profiles the current Streamlit rerun of a page; call it once at the top
+    of the page script. When profiling is requested, the rest of the run is
+    sampled and written as a folded-stack file once the page script returns
+    (or stops early via st.stop()/rerun). Inference sections also write a
+    torch.profiler trace, see inference_trace.
+    """
+    if not profiling_requested():
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    thread_id = threading.get_ident()
+    profiler = SamplingProfiler(thread_id, until_frame=sys._getframe(1), on_done=_finish, page=page)
+    with _active_lock:
+        _active[thread_id] = profiler
+    profiler.start()
+
+@contextmanager
+def inference_trace(section: str):
+    """torch.profiler trace around an inference section, only inside a profiled rerun."""
+    with _active_lock:
+        profiler = _active.get(threading.get_ident())
+    if profiler is None:
+        yield
+        return
+
+    import torch
+    with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True) as prof:
+        yield
+    prof.export_chrome_trace(_artifact_path(profiler.page, f"_{section}.trace.json"))
+    enforce_size_cap()
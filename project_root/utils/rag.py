@@ -0,0 +1,270 @@
+import os
+import re
+import math
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+
+from utils.telemetry import stage_timer
+from utils.translation import LANGUAGES
+
+# --- Retrieval-augmented Context ---
+
+KNOWLEDGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'knowledge')
+
+# Retrieved context must fit in this many prompt tokens
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_TOKEN_BUDGET", "700"))
+# Optional dense retrieval (needs sentence-transformers), fused with BM25
+RAG_EMBEDDING_MODEL = os.environ.get("RAG_EMBEDDING_MODEL", "")
+
+STOPWORDS = set("""
+a an and are as at be by for from has have how i in is it its my of on or our should so that the their
+them then there these this to was we what when where which who why will with you your do does can
+""".split())
+
+SYSTEM_TEMPLATE = (
+    "You are a helpful farm advisor for smallholder farmers in India. Answer in clear, simple {language}. "
+    "Use the context below when it is relevant and say which part you used (e.g. the market report or "
+    "the forecast). If the context does not cover the question, answer from general knowledge and say so.\n\n"
+    "Context:\n{context}"
+)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+def approx_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index (term -> {doc id: term frequency}).
+    Documents can be added and removed one at a time; a query only touches
+    the postings of its own terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, doc_id: str, text: str):
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self.doc_terms[doc_id] = terms
+        self.doc_len[doc_id] = sum(terms.values())
+        self.total_len += self.doc_len[doc_id]
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+
+    def remove(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_len -= self.doc_len.pop(doc_id)
+        for term in terms:
+            self.postings[term].pop(doc_id, None)
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        n = len(self.doc_terms)
+        if n == 0:
+            return []
+        avg_len = self.total_len / n
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+class KnowledgeIndex:
+    """
+    Shared snippets from the agronomy knowledge base (one per markdown
+    section) and the live market store. Each source is replaced as a unit,
+    so updates only re-index what changed. Per-session data (forecast,
+    last diagnosis) is pinned at retrieval time instead of indexed.
+    """
+
+    def __init__(self, embedding_model: str = RAG_EMBEDDING_MODEL):
+        self._lock = threading.Lock()
+        self.bm25 = BM25Index()
+        self.snippets: Dict[str, Dict[str, Any]] = {}
+        self.sources: Dict[str, List[str]] = {}
+        self.file_mtimes: Dict[str, float] = {}
+        self.market_version = None
+        self.encoder = None
+        self.vectors: Dict[str, np.ndarray] = {}
+        if embedding_model:
+            try:
+                from sentence_transformers import SentenceTransformer
+                self.encoder = SentenceTransformer(embedding_model)
+            except ImportError:
+                self.encoder = None
+
+    def set_source(self, source: str, snippets: List[Dict[str, str]]):
+        """Replaces every snippet of `source` with `snippets` ({"title", "text"} dicts)."""
+        with self._lock:
+            for doc_id in self.sources.pop(source, []):
+                self.bm25.remove(doc_id)
+                self.snippets.pop(doc_id, None)
+                self.vectors.pop(doc_id, None)
+            ids = []
+            for i, snippet in enumerate(snippets):
+                doc_id = f"{source}#{i}"
+                text = f"{snippet['title']}\n{snippet['text']}"
+                self.bm25.add(doc_id, text)
+                self.snippets[doc_id] = {**snippet, "source": source, "tokens": approx_tokens(text)}
+                ids.append(doc_id)
+            if self.encoder is not None and ids:
+                encoded = self.encoder.encode([self.snippets[i]["title"] + "\n" + self.snippets[i]["text"] for i in ids],
+                                              normalize_embeddings=True)
+                self.vectors.update(zip(ids, np.asarray(encoded, dtype=np.float32)))
+            self.sources[source] = ids
+
+    def sync_knowledge(self, directory: str = KNOWLEDGE_DIR):
+        """Re-indexes new or modified markdown files and drops deleted ones."""
+        paths = {os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".md")} \
+            if os.path.isdir(directory) else set()
+        for path in sorted(paths):
+            mtime = os.path.getmtime(path)
+            if self.file_mtimes.get(path) != mtime:
+                with open(path, encoding="utf-8") as f:
+                    self.set_source(f"kb:{os.path.basename(path)}", split_markdown(f.read()))
+                self.file_mtimes[path] = mtime
+        for path in set(self.file_mtimes) - paths:
+            self.set_source(f"kb:{os.path.basename(path)}", [])
+            del self.file_mtimes[path]
+
+    def refresh_market(self, store):
+        """Re-indexes the market snippets only when the store version changed."""
+        if self.market_version != (id(store), store.version):
+            self.set_source("market", market_snippets(store))
+            self.market_version = (id(store), store.version)
+
+    def retrieve(self, query: str, k: int = 6, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 pinned: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Top snippets for `query` whose total size fits `token_budget`.
+        `pinned` snippets (per-session data such as the user's forecast or
+        last diagnosis) are always included first.
+        """
+        pinned = [{**p, "source": "session", "tokens": approx_tokens(p["title"] + p["text"])} for p in pinned or []]
+        with stage_timer("rag.retrieve"), self._lock:
+            ranked = [doc_id for doc_id, _ in self.bm25.search(query, k * 3)]
+            if self.encoder is not None and self.vectors:
+                # Reciprocal rank fusion of BM25 and cosine-similarity rankings
+                ids = list(self.vectors)
+                q = np.asarray(self.encoder.encode([query], normalize_embeddings=True)[0], dtype=np.float32)
+                sims = np.stack([self.vectors[i] for i in ids]) @ q
+                dense = [ids[i] for i in np.argsort(-sims)[:k * 3]]
+                fused = Counter()
+                for ranking in (ranked, dense):
+                    for rank, doc_id in enumerate(ranking):
+                        fused[doc_id] += 1 / (60 + rank)
+                ranked = [doc_id for doc_id, _ in fused.most_common()]
+
+            selected, used = [], 0
+            for snippet in pinned + [self.snippets[doc_id] for doc_id in ranked]:
+                if used + snippet["tokens"] > token_budget:
+                    continue
+                selected.append(snippet)
+                used += snippet["tokens"]
+                if len(selected) == k + len(pinned):
+                    break
+            return selected
+
+def split_markdown(text: str) -> List[Dict[str, str]]:
+    """One snippet per '## ' section, titled '<document title> — <section>'."""
+    title_match = re.search(r"^# (.+)$", text, flags=re.M)
+    title = title_match.group(1).strip() if title_match else ""
+    snippets = []
+    for section in re.split(r"^## ", text, flags=re.M)[1:]:
+        heading, _, body = section.partition("\n")
+        body = " ".join(body.split())
+        if body:
+            snippets.append({"title": f"{title} — {heading.strip()}" if title else heading.strip(), "text": body})
+    return snippets
+
+# ---- live project data ----
+
+def market_snippets(store, top_markets: int = 5) -> List[Dict[str, str]]:
+    """Latest modal prices per commodity from the market store."""
+    snippets = []
+    for commodity in store.commodities():
+        rows = store.select(commodity, columns=["Market", "District", "Arrival_Date", "Modal_Price"])
+        latest_day = rows["Arrival_Date"].iloc[-1]
+        today = rows[rows["Arrival_Date"] == latest_day].nlargest(top_markets, "Modal_Price")
+        quotes = "; ".join(f"{r.Market} ({r.District}) ₹{r.Modal_Price:,.0f}" for r in today.itertuples())
+        snippets.append({
+            "title": f"Mandi prices — {commodity}",
+            "text": f"Modal prices per quintal for {commodity} on {latest_day:%d %b %Y}: {quotes}.",
+        })
+    return snippets
+
+def weather_snippets(weather: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Current conditions, daily forecast and agronomic indicators for one location."""
+    if not weather or "error" in weather:
+        return []
+    city, current = weather.get("city", ""), weather.get("current", {})
+    days = "; ".join(
+        f"{d['date']}: {d.get('temp_min')}–{d.get('temp_max')} °C, rain chance {d.get('rain_chance')}%"
+        for d in weather.get("daily", [])
+    )
+    snippets = [{
+        "title": f"Weather forecast — {city}",
+        "text": (f"Now in {city}: {current.get('temperature')} °C, humidity {current.get('humidity')}%, "
+                 f"wind {current.get('windSpeed')} m/s, rain chance {current.get('precipitationProbability')}%. "
+                 f"Daily forecast: {days}."),
+    }]
+    indicators = weather.get("indicators") or {}
+    if indicators:
+        windows = ", ".join(f"{w['start']} to {w['end']}" for w in indicators.get("spray_windows", [])[:3]) or "none"
+        snippets.append({
+            "title": f"Spraying and crop stress outlook — {city}",
+            "text": (f"Spray windows (calm, dry, UTC): {windows}. Heat-stress hours (≥35 °C) in the forecast: "
+                     f"{indicators.get('heat_stress_total')}. Growing degree days: {indicators.get('gdd_total')}."),
+        })
+    return snippets
+
+def diagnosis_snippets(diagnosis: Optional[Dict[str, Any]]) -> List[Dict[str, str]]:
+    if not diagnosis:
+        return []
+    crop, _, disease = diagnosis["label"].replace("___", "__").partition("__")
+    return [{
+        "title": "Latest leaf diagnosis",
+        "text": (f"The detector's last diagnosis for this user was {crop} {disease.replace('_', ' ')} "
+                 f"with {diagnosis['confidence']:.0%} confidence."),
+    }]
+
+def build_messages(question: str, snippets: List[Dict[str, Any]],
+                   history: Optional[List[Dict[str, str]]] = None, language: str = "en") -> List[Dict[str, str]]:
+    """
+    System prompt with the retrieved context, then earlier chat turns (if
+    any), then the question. The model answers directly in `language`.
+    """
+    context = "\n\n".join(f"[{i + 1}] {s['title']}\n{s['text']}" for i, s in enumerate(snippets)) or "(none)"
+    return [
+        {"role": "system", "content": SYSTEM_TEMPLATE.format(context=context, language=LANGUAGES.get(language, "English"))},
+        *(history or []),
+        {"role": "user", "content": question},
+    ]
+
+@st.cache_resource
+def load_knowledge_index() -> KnowledgeIndex:
+    index = KnowledgeIndex()
+    index.sync_knowledge()
+    return index
@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.telemetry import count, stage_timer
+
+# --- Shared Resource Registry ---
+
+# Idle resources are checked for eviction this often
+SWEEP_SECONDS = float(os.environ.get("RESOURCE_SWEEP_SECONDS", "60"))
+
+Key = Tuple[str, tuple]
+
+def estimate_bytes(value: Any) -> int:
+    """Approximate resident size of a shared resource."""
+    if hasattr(value, "memory_bytes"):
+        return int(value.memory_bytes())
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if hasattr(value, "parameters") and hasattr(value, "buffers"):
+        # torch.nn.Module / ScriptModule
+        return int(sum(t.numel() * t.element_size() for t in list(value.parameters()) + list(value.buffers())))
+    return sys.getsizeof(value)
+
+def read_only(value: Any) -> Any:
+    """
+    Per-caller view of a shared value. Arrays are flagged read-only. Frames
+    are shallow copies: adding, dropping or replacing columns only affects
+    the caller's copy, but the column data is shared, so callers must not
+    modify values in place (no .loc/.iloc assignment, no inplace=True).
+    Use .copy() first when that is needed.
+    """
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    return value
+
+class ResourceRegistry:
+    """
+    Process-wide resources (models, stores, HTTP sessions, derived caches)
+    with explicit lifecycles. A resource is built on first use, shared by
+    every session, sized once it is built, and evicted (with its `close`
+    hook) after `idle_seconds` without use or `max_age_seconds` after
+    loading. A resource stays loaded while one of its dependents is loaded.
+    """
+
+    def __init__(self, sweep_seconds: float = SWEEP_SECONDS):
+        self.sweep_seconds = sweep_seconds
+        self._lock = threading.Lock()
+        self._specs: Dict[str, Dict[str, Any]] = {}
+        self._entries: Dict[Key, Dict[str, Any]] = {}
+        self._init_locks: Dict[Key, threading.Lock] = defaultdict(threading.Lock)
+        self._janitor: Optional[threading.Thread] = None
+
+    def register(self, name: str, factory: Callable[..., Any], idle_seconds: Optional[float] = None,
+                 max_age_seconds: Optional[float] = None, close: Optional[Callable[[Any], None]] = None,
+                 depends_on: Tuple[str, ...] = (), view: Callable[[Any], Any] = read_only):
+        """
+        `factory(*args)` builds the resource for get(name, *args). Without
+        idle_seconds/max_age_seconds the resource stays loaded for the life
+        of the process.
+        """
+        self._specs[name] = {"factory": factory, "idle_seconds": idle_seconds, "max_age_seconds": max_age_seconds,
+                             "close": close, "depends_on": tuple(depends_on), "view": view}
+
+    def get(self, name: str, *args) -> Any:
+        spec = self._specs[name]
+        key = (name, args)
+        entry = self._touch(key)
+        if entry is None:
+            # One loader per key; other keys (and hits) are not blocked meanwhile
+            with self._lock:
+                init_lock = self._init_locks[key]
+            with init_lock:
+                entry = self._touch(key)
+                if entry is None:
+                    start = time.perf_counter()
+                    with stage_timer("resource.load", resource=name):
+                        value = spec["factory"](*args)
+                    now = time.monotonic()
+                    entry = {"value": value, "bytes": estimate_bytes(value), "loaded_at": now, "last_used": now,
+                             "load_ms": (time.perf_counter() - start) * 1000, "hits": 0}
+                    with self._lock:
+                        self._entries[key] = entry
+                    count("resource_loads", resource=name)
+        self._start_janitor()
+        return spec["view"](entry["value"])
+
+    def _touch(self, key: Key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["last_used"] = time.monotonic()
+                entry["hits"] += 1
+            return entry
+
+    def evict(self, name: str, *args):
+        """Drops one resource (all argument variants when no args are given) and its dependents."""
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == name and (not args or k[1] == args)]
+            dependents = [n for n, s in self._specs.items() if name in s["depends_on"]]
+        for dependent in dependents:
+            self.evict(dependent)
+        for key in keys:
+            self._drop(key, reason="explicit")
+
+    def _drop(self, key: Key, reason: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        close = self._specs[key[0]]["close"]
+        if close is not None:
+            close(entry["value"])
+        count("resource_evictions", resource=key[0], reason=reason)
+
+    def evict_idle(self) -> int:
+        """Evicts expired resources, dependents before what they depend on. Returns the number evicted."""
+        now = time.monotonic()
+        with self._lock:
+            loaded = {k[0] for k in self._entries}
+            expired = []
+            for key, entry in self._entries.items():
+                spec = self._specs[key[0]]
+                if any(key[0] in self._specs[other]["depends_on"] for other in loaded):
+                    continue
+                if spec["idle_seconds"] is not None and now - entry["last_used"] > spec["idle_seconds"]:
+                    expired.append((key, "idle"))
+                elif spec["max_age_seconds"] is not None and now - entry["loaded_at"] > spec["max_age_seconds"]:
+                    expired.append((key, "age"))
+        for key, reason in expired:
+            self._drop(key, reason)
+        return len(expired)
+
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_seconds)
+            self.evict_idle()
+
+    def _start_janitor(self):
+        if self._janitor is None:
+            with self._lock:
+                if self._janitor is None:
+                    self._janitor = threading.Thread(target=self._sweep, name="resource-janitor", daemon=True)
+                    self._janitor.start()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """One row per loaded resource: size, load time, idle time and hits."""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "resource": name,
+                "args": ", ".join(map(str, args)),
+                "mb": round(entry["bytes"] / 2 ** 20, 1),
+                "load_ms": round(entry["load_ms"], 1),
+                "idle_s": round(now - entry["last_used"]),
+                "hits": entry["hits"],
+            } for (name, args), entry in self._entries.items()]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry["bytes"] for entry in self._entries.values())
+
+RESOURCES = ResourceRegistry()
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+import streamlit as st
+
+# --- Latency / Cache / Payload Instrumentation ---
+
+# Fixed bucket bounds keep every histogram at constant memory
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+SIZE_BUCKETS_BYTES = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus layout) with sum and count."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        if self.count == 0:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class MetricsRegistry:
+    """Process-wide store of counters and histograms, shared by every session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self.histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Optional[Dict[str, Any]]):
+        return name, tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+    @staticmethod
+    def _series(name: str, labels: LabelKey) -> str:
+        return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+    def inc(self, name: str, labels: Optional[Dict[str, Any]] = None, amount: float = 1):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None,
+                buckets=LATENCY_BUCKETS_MS):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        def fmt(labels: LabelKey, extra: str = "") -> str:
+            parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"app_{name}{fmt(labels)} {value:g}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(hist.buckets + (float("inf"),), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    bucket_labels = fmt(labels, 'le="%s"' % le)
+                    lines.append(f"app_{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"app_{name}_sum{fmt(labels)} {hist.sum:g}")
+                lines.append(f"app_{name}_count{fmt(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly view with estimated p50/p95 and cache hit ratios."""
+        with self._lock:
+            counters = {
+                self._series(name, labels): value
+                for (name, labels), value in self.counters.items()
+            }
+            histograms = {
+                self._series(name, labels): {
+                    "count": h.count,
+                    "mean": h.sum / h.count if h.count else None,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                }
+                for (name, labels), h in self.histograms.items()
+            }
+            caches = {}
+            for (name, labels), value in self.counters.items():
+                if name == "cache_requests_total":
+                    cache = dict(labels)["cache"]
+                    misses = self.counters.get(("cache_misses_total", labels), 0)
+                    caches[cache] = {"requests": value, "misses": misses,
+                                     "hit_ratio": 1 - misses / value if value else None}
+        return {"timestamp": time.time(), "counters": counters, "histograms": histograms, "caches": caches}
+
+REGISTRY = MetricsRegistry()
+
+# ---- recording helpers ----
+
+class StageTimer:
+    """Times one stage; usable as a context manager or with explicit stop()."""
+
+    def __init__(self, stage: str, **labels):
+        self.stage = stage
+        self.labels = labels
+        self.start = time.perf_counter()
+        self.elapsed_ms = None
+
+    def stop(self) -> float:
+        if self.elapsed_ms is None:
+            self.elapsed_ms = (time.perf_counter() - self.start) * 1000
+            REGISTRY.observe("stage_latency_ms", self.elapsed_ms, {"stage": self.stage, **self.labels})
+        return self.elapsed_ms
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+def stage_timer(stage: str, **labels) -> StageTimer:
+    """`with stage_timer("weather.http"):` records the block's latency."""
+    return StageTimer(stage, **labels)
+
+def instrumented_cache(cache: str):
+    """
+    Put above @st.cache_data / @st.cache_resource: counts requests and times
+    the call including cache lookup. Call mark_cache_miss(cache) inside the
+    cached body so hits = requests - misses.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            REGISTRY.inc("cache_requests_total", {"cache": cache})
+            with StageTimer(f"{cache}.total"):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def mark_cache_miss(cache: str):
+    REGISTRY.inc("cache_misses_total", {"cache": cache})
+
+def record_payload(payload: str, n_bytes: int):
+    REGISTRY.observe("payload_bytes", n_bytes, {"payload": payload}, buckets=SIZE_BUCKETS_BYTES)
+
+def count(event: str, amount: float = 1, **labels):
+    REGISTRY.inc("events_total", {"event": event, **labels}, amount)
+
+# ---- exporters ----
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(REGISTRY.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = REGISTRY.render_prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def _json_dumper(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(REGISTRY.snapshot(), f)
+        os.replace(tmp_path, path)  # atomic, readers never see a partial file
+
+@st.cache_resource(show_spinner=False)
+def start_exporters():
+    """
+    Starts the exporters once per process:
+      METRICS_PORT=9464          -> http://host:9464/metrics (Prometheus) and /metrics.json
+      METRICS_JSON=metrics.json  -> snapshot rewritten every METRICS_JSON_INTERVAL seconds (default 30)
+    """
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+
+    path = os.environ.get("METRICS_JSON")
+    if path:
+        interval = float(os.environ.get("METRICS_JSON_INTERVAL", "30"))
+        threading.Thread(target=_json_dumper, args=(path, interval), name="metrics-json", daemon=True).start()
+    return True
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import streamlit as st
+
+from utils.llm import chat_completion, OPENAI_API_KEY, OPENAI_MODEL
+from utils.telemetry import count, stage_timer
+
+# --- Translation of Advisory Text ---
+
+TRANSLATION_DIR = os.environ.get("TRANSLATION_DIR", "data/translations")
+# "llm" uses the assistant backend, "mt" a local CPU machine-translation model
+TRANSLATION_BACKEND = os.environ.get("TRANSLATION_BACKEND", "llm")
+TRANSLATION_MT_MODEL = os.environ.get("TRANSLATION_MT_MODEL", "facebook/nllb-200-distilled-600M")
+DYNAMIC_CACHE_SIZE = 2048
+
+LANGUAGES = {"en": "English", "hi": "हिन्दी (Hindi)", "te": "తెలుగు (Telugu)",
+             "gu": "ગુજરાતી (Gujarati)", "pa": "ਪੰਜਾਬੀ (Punjabi)"}
+# FLORES-200 codes used by NLLB models
+NLLB_CODES = {"en": "eng_Latn", "hi": "hin_Deva", "te": "tel_Telu", "gu": "guj_Gujr", "pa": "pan_Guru"}
+
+# English source of every fixed advisory string; {name} fields are filled at render time
+TEMPLATES: Dict[str, str] = {
+    # detect_severe_alerts
+    "alert.rain_now": "High probability of heavy rain in the next hour (>=70%). Protect harvested crops and check drainage.",
+    "alert.heat_now": "Very high temperature (>=40°C). Take measures to reduce heat stress on crops and workers.",
+    "alert.wind_now": "High winds forecasted (>=15 m/s). Secure lightweight structures and avoid spraying.",
+    "alert.rain_day": "Heavy rain likely on {date} (>=80% chance).",
+    "alert.heat_day": "Extreme heat expected on {date} (max >=40°C).",
+    "alert.none": "No severe alerts detected by rule-set.",
+    # crop_advisory
+    "crop.wheat.rain": "Rain expected soon — postpone pesticide/fertilizer spraying.",
+    "crop.wheat.heat": "High temperature — irrigate early morning or late evening to reduce stress.",
+    "crop.wheat.normal": "Conditions look normal for field operations. Monitor rain chance before spraying.",
+    "crop.rice.irrigate": "Low rain chance and high temp — consider irrigation to maintain paddy water level.",
+    "crop.rice.normal": "Monitor standing water and rainfall; schedule irrigation if rain stays low.",
+    "crop.maize.rain": "High rain chance — ensure field drainage to avoid waterlogging.",
+    "crop.maize.normal": "Okay for operations; ensure irrigation during dry spells.",
+    "crop.generic.rain": "High probability of rain — avoid chemical spraying and protect harvested crops.",
+    "crop.generic.normal": "No specific advisory. Monitor rainfall and temperature.",
+    # irrigation_advice
+    "irrigation.no_data": "Insufficient forecast data for irrigation advice.",
+    "irrigation.rain": "Substantial chance of rain tomorrow — postpone irrigation.",
+    "irrigation.irrigate": "High temperatures and low rain chance — consider irrigating tomorrow morning.",
+    "irrigation.defer": "Cool conditions — irrigation may be deferred.",
+    "irrigation.monitor": "Monitor rainfall and crop growth; use soil checks for final decision.",
+    # detector
+    "detector.status": "Status: {label}",
+    "detector.disease": "Disease Detected: {label}",
+    "detector.confidence": "Confidence: {confidence}",
+    "detector.action": "Recommended Action for {label}:",
+    "detector.general_advice": "Showing general guidance; tailored advice for this language and stage is not generated yet.",
+    "detector.advice_stale": "The reference guide was updated after this advice was written; check it with a local expert.",
+    "detector.consult": "Please consult with a local agricultural expert for specific treatment options.",
+    # disease labels, keyed by detector class name
+    "label.Corn___Common_Rust": "Maize — Common Rust",
+    "label.Corn___Gray_Leaf_Spot": "Maize — Gray Leaf Spot",
+    "label.Corn___Healthy": "Maize — Healthy",
+    "label.Corn___Northern_Leaf_Blight": "Maize — Northern Leaf Blight",
+    "label.Potato___Early_Blight": "Potato — Early Blight",
+    "label.Potato___Healthy": "Potato — Healthy",
+    "label.Potato___Late_Blight": "Potato — Late Blight",
+    "label.Rice___Brown_Spot": "Rice — Brown Spot",
+    "label.Rice___Healthy": "Rice — Healthy",
+    "label.Rice___Leaf_Blast": "Rice — Leaf Blast",
+    "label.Rice___Neck_Blast": "Rice — Neck Blast",
+    "label.Sugarcane__Bacterial_Blight": "Sugarcane — Bacterial Blight",
+    "label.Sugarcane__Healthy": "Sugarcane — Healthy",
+    "label.Sugarcane__Red_Rot": "Sugarcane — Red Rot",
+    "label.Wheat___Brown_Rust": "Wheat — Brown Rust",
+    "label.Wheat___Healthy": "Wheat — Healthy",
+    "label.Wheat___Yellow_Rust": "Wheat — Yellow Rust",
+}
+
+PLACEHOLDER = re.compile(r"\{[a-z_]+\}")
+
+LLM_TRANSLATE_PROMPT = (
+    "Translate the following agricultural advisory text for farmers from English to {language}. Use simple, "
+    "everyday words. Keep numbers, units and anything in curly braces such as {{date}} exactly as they are. "
+    "Reply with the translation only."
+)
+
+def source_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+# ---- backends ----
+
+def llm_backend(api_key: str, model: str) -> Callable[[List[str], str], List[str]]:
+    """Translates through the assistant backend, one request per text."""
+    def translate(texts: List[str], language: str) -> List[str]:
+        out = []
+        for text in texts:
+            messages = [
+                {"role": "system", "content": LLM_TRANSLATE_PROMPT.format(language=LANGUAGES[language])},
+                {"role": "user", "content": text},
+            ]
+            out.append(chat_completion(api_key, model, messages, max_tokens=600, temperature=0.0)[0].strip())
+        return out
+    return translate
+
+@functools.lru_cache(maxsize=1)
+def mt_backend(model_name: str = TRANSLATION_MT_MODEL) -> Callable[[List[str], str], List[str]]:
+    """Local NLLB model on CPU via transformers, loaded once per process."""
+    from transformers import pipeline
+
+    translator = pipeline("translation", model=model_name, device=-1)
+
+    def translate(texts: List[str], language: str) -> List[str]:
+        results = translator(texts, src_lang=NLLB_CODES["en"], tgt_lang=NLLB_CODES[language], max_length=400)
+        return [r["translation_text"] for r in results]
+    return translate
+
+def default_backend() -> Optional[Callable[[List[str], str], List[str]]]:
+    """Backend chosen by TRANSLATION_BACKEND, or None when it is not available here."""
+    if TRANSLATION_BACKEND == "mt":
+        try:
+            return mt_backend()
+        except ImportError:
+            return None
+    return llm_backend(OPENAI_API_KEY, OPENAI_MODEL) if OPENAI_API_KEY else None
+
+# ---- fixed templates ----
+
+def build_template_table(translate: Callable[[List[str], str], List[str]], languages: Optional[List[str]] = None,
+                         path: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Translates every template into each language and writes the lookup table
+    ({"sources": {key: hash of the English text}, "table": {language: {key: text}}}).
+    Translations that lose or invent a {placeholder} are dropped, so those
+    keys render in English.
+    """
+    path = path or os.path.join(TRANSLATION_DIR, "templates.json")
+    keys = sorted(TEMPLATES)
+    table = {}
+    for language in languages or [l for l in LANGUAGES if l != "en"]:
+        translated = translate([TEMPLATES[k] for k in keys], language)
+        table[language] = {
+            k: text for k, text in zip(keys, translated)
+            if sorted(PLACEHOLDER.findall(text)) == sorted(PLACEHOLDER.findall(TEMPLATES[k]))
+        }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"sources": {k: source_hash(TEMPLATES[k]) for k in keys}, "table": table},
+                  f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    os.replace(path + ".tmp", path)
+    template_table.cache_clear()
+    return table
+
+@functools.lru_cache(maxsize=1)
+def template_table(path: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+    """Pre-translated templates, loaded once; keys whose English source changed since the build are dropped."""
+    path = path or os.path.join(TRANSLATION_DIR, "templates.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    current = {k for k, h in data.get("sources", {}).items() if k in TEMPLATES and source_hash(TEMPLATES[k]) == h}
+    if len(current) < len(TEMPLATES):
+        count("translation_templates_missing", len(TEMPLATES) - len(current))
+    return {lang: {k: v for k, v in entries.items() if k in current} for lang, entries in data["table"].items()}
+
+def t(key: str, lang: str = "en", **params) -> str:
+    """Template `key` in `lang` (English when not translated) with `params` filled in."""
+    text = template_table().get(lang, {}).get(key) if lang != "en" else None
+    return (text or TEMPLATES[key]).format(**params)
+
+def label_text(label: str, lang: str = "en") -> str:
+    """Display name of a detector class, e.g. 'Wheat — Yellow Rust'."""
+    key = f"label.{label}"
+    return t(key, lang) if key in TEMPLATES else label
+
+# ---- dynamic text ----
+
+class DynamicTranslator:
+    """
+    On-demand translation of free text (LLM output, knowledge-base snippets)
+    behind an in-memory LRU and an SQLite disk cache, so each distinct text is
+    translated once per language across sessions and restarts.
+    """
+
+    def __init__(self, path: Optional[str] = None, backend: Optional[Callable] = None,
+                 maxsize: int = DYNAMIC_CACHE_SIZE):
+        path = path or os.path.join(TRANSLATION_DIR, "dynamic.db")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.backend = backend
+        self.maxsize = maxsize
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        self.db.commit()
+
+    @staticmethod
+    def _key(text: str, lang: str) -> str:
+        return lang + ":" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def translate(self, text: str, lang: str) -> str:
+        """`text` in `lang`; the English text is returned if no backend is available or it fails."""
+        if lang == "en" or not text.strip():
+            return text
+        key = self._key(text, lang)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                count("translation_cache", result="memory")
+                return self._lru[key]
+            row = self.db.execute("SELECT text FROM translations WHERE key = ?", (key,)).fetchone()
+        if row:
+            count("translation_cache", result="disk")
+            translated = row[0]
+        else:
+            if self.backend is None:
+                return text
+            try:
+                with stage_timer("translation.backend", lang=lang):
+                    translated = self.backend([text], lang)[0]
+            except Exception:
+                count("translation_failed")
+                return text
+            count("translation_cache", result="miss")
+            with self._lock, self.db:
+                self.db.execute("INSERT OR REPLACE INTO translations (key, text) VALUES (?, ?)", (key, translated))
+        with self._lock:
+            self._lru[key] = translated
+            if len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+        return translated
+
+@st.cache_resource
+def load_translator() -> DynamicTranslator:
+    return DynamicTranslator(backend=default_backend())
+
+def language_selector(container=None, label: str = "Language / भाषा") -> str:
+    """Sidebar language picker whose choice is shared by every page of the session."""
+    container = container or st.sidebar
+    options = list(LANGUAGES)
+    current = st.session_state.get("ui_language", "en")
+    lang = container.selectbox(label, options, index=options.index(current) if current in options else 0,
+                               format_func=LANGUAGES.get)
+    st.session_state["ui_language"] = lang
+    return lang
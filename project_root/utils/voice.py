@@ -0,0 +1,181 @@
+import io
+import os
+import re
+import wave
+import base64
+import threading
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from utils.resources import RESOURCES
+from utils.telemetry import count, stage_timer
+
+# --- Voice Mode (speech in, speech out) ---
+
+# faster-whisper model size ("tiny", "base", ...) or a local CTranslate2 model directory
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "base")
+# Piper voice (.onnx with its .onnx.json next to it); no voice means text-only answers
+PIPER_VOICE = os.environ.get("PIPER_VOICE", "models/tts/en_IN-voice-medium.onnx")
+VOICE_CPU_THREADS = int(os.environ.get("VOICE_CPU_THREADS", "2"))
+# Parallel transcriptions the shared Whisper model accepts
+VOICE_WORKERS = int(os.environ.get("VOICE_WORKERS", "2"))
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 8.0
+SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, float]:
+    """WAV bytes -> mono float32 samples at 16 kHz, and the duration in seconds."""
+    with wave.open(io.BytesIO(data)) as f:
+        rate, channels, width = f.getframerate(), f.getnchannels(), f.getsampwidth()
+        frames = f.readframes(f.getnframes())
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+    samples = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+    if width == 1:
+        samples = samples - 128.0
+    samples /= float(2 ** (8 * width - 1))
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        n = int(round(len(samples) * SAMPLE_RATE / rate))
+        samples = np.interp(np.linspace(0, len(samples) - 1, n), np.arange(len(samples)), samples)
+    samples = samples.astype(np.float32)
+    return samples, len(samples) / SAMPLE_RATE
+
+def encode_wav(samples: np.ndarray, rate: int) -> bytes:
+    """int16 or float32 mono samples -> WAV bytes."""
+    if samples.dtype != np.int16:
+        samples = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+def split_sentences(deltas: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Groups streamed text deltas into sentences. Yields (text so far, sentence)
+    once per delta; sentence is None until one is complete. The remainder is
+    flushed as a final sentence when the stream ends.
+    """
+    text, pending = "", ""
+    for delta in deltas:
+        text += delta
+        *done, pending = SENTENCE_END.split(pending + delta)
+        yield text, " ".join(d.strip() for d in done) or None
+    if pending.strip():
+        yield text, pending.strip()
+
+class SpeechModels:
+    """
+    Whisper (speech-to-text) and Piper (text-to-speech) models loaded once per
+    process and shared by every session. Either side is None when its
+    optional dependency or model file is missing or fails to load (e.g. the
+    Whisper download on an offline server); voice mode then degrades to
+    typing or text-only answers, and the reason is kept in `errors`.
+    """
+
+    def __init__(self, whisper_model: str = WHISPER_MODEL, piper_voice: str = PIPER_VOICE,
+                 cpu_threads: int = VOICE_CPU_THREADS, workers: int = VOICE_WORKERS):
+        self.stt = None
+        self.tts = None
+        # Piper voices are not thread-safe; synthesis is short, so serialise it
+        self._tts_lock = threading.Lock()
+        self.errors: Dict[str, str] = {}
+        try:
+            from faster_whisper import WhisperModel
+            with stage_timer("voice.load", model="whisper"):
+                self.stt = WhisperModel(whisper_model, device="cpu", compute_type="int8",
+                                        cpu_threads=cpu_threads, num_workers=workers)
+        except Exception as e:
+            self._load_failed("stt", e)
+        if piper_voice and os.path.exists(piper_voice):
+            try:
+                from piper.voice import PiperVoice
+                with stage_timer("voice.load", model="piper"):
+                    self.tts = PiperVoice.load(piper_voice)
+            except Exception as e:
+                self._load_failed("tts", e)
+
+    def _load_failed(self, side: str, error: Exception):
+        self.errors[side] = f"{type(error).__name__}: {error}"
+        count("voice_load_failed", side=side, error=type(error).__name__)
+
+    def transcribe_chunks(self, samples: np.ndarray, language: Optional[str] = None,
+                          chunk_seconds: float = CHUNK_SECONDS) -> Iterator[str]:
+        """
+        Transcribes `samples` (16 kHz float32) chunk by chunk and yields each
+        chunk's text as soon as it is decoded. The previous text is passed as
+        the prompt so words are not lost or repeated at chunk boundaries.
+        """
+        step = int(chunk_seconds * SAMPLE_RATE)
+        previous = ""
+        for start in range(0, len(samples), step):
+            chunk = samples[start:start + step]
+            if len(chunk) < SAMPLE_RATE // 4:
+                break
+            with stage_timer("voice.stt", model=WHISPER_MODEL):
+                segments, _ = self.stt.transcribe(chunk, language=language, beam_size=1, vad_filter=True,
+                                                  initial_prompt=previous[-200:] or None,
+                                                  condition_on_previous_text=False)
+                text = " ".join(s.text.strip() for s in segments).strip()
+            count("voice_seconds_transcribed", len(chunk) / SAMPLE_RATE)
+            if text:
+                previous = f"{previous} {text}".strip()
+                yield text
+
+    def synthesize(self, text: str) -> Optional[bytes]:
+        """WAV bytes for `text`, or None without a TTS voice."""
+        if self.tts is None or not text.strip():
+            return None
+        with self._tts_lock, stage_timer("voice.tts"):
+            audio = np.concatenate([
+                np.frombuffer(chunk, dtype=np.int16) for chunk in self.tts.synthesize_stream_raw(text)
+            ])
+        count("voice_seconds_synthesized", len(audio) / self.tts.config.sample_rate)
+        return encode_wav(audio, self.tts.config.sample_rate)
+
+    def memory_bytes(self) -> int:
+        """Weights on disk as a proxy for resident size (CTranslate2 and ONNX Runtime hold them natively)."""
+        size = 0
+        if self.stt is not None and os.path.isdir(WHISPER_MODEL):
+            size += sum(os.path.getsize(os.path.join(WHISPER_MODEL, f)) for f in os.listdir(WHISPER_MODEL))
+        if self.tts is not None:
+            size += os.path.getsize(PIPER_VOICE)
+        return size
+
+    def summary(self) -> Dict[str, Any]:
+        return {"stt": WHISPER_MODEL if self.stt is not None else None,
+                "tts": os.path.basename(PIPER_VOICE) if self.tts is not None else None,
+                "errors": dict(self.errors)}
+
+# Unloaded after 15 idle minutes; the next voice request reloads them
+RESOURCES.register("speech_models", lambda: SpeechModels(), idle_seconds=900)
+
+def load_speech_models() -> SpeechModels:
+    return RESOURCES.get("speech_models")
+
+def audio_queue_html(wav: bytes) -> str:
+    """
+    Player snippet for st.components.v1.html: appends the clip to a queue in
+    the parent page, so answer sentences play back to back while later ones
+    are still being generated.
+    """
+    clip = base64.b64encode(wav).decode("ascii")
+    return f"""<script>
+const w = window.parent;
+const q = w.__voiceQueue = w.__voiceQueue || {{items: [], playing: false}};
+q.items.push("data:audio/wav;base64,{clip}");
+function next() {{
+  if (q.playing || !q.items.length) return;
+  q.playing = true;
+  const audio = new w.Audio(q.items.shift());
+  audio.onended = audio.onerror = () => {{ q.playing = false; next(); }};
+  // Autoplay blocked or a bad clip: skip it so the rest of the queue still plays
+  audio.play().catch(() => {{ q.playing = false; next(); }});
+}}
+next();
+</script>"""
@@ -0,0 +1,109 @@
+from typing import Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+# --- Hourly Forecast Analytics ---
+
+HOURLY_FIELDS = ["temperature", "humidity", "windSpeed", "precipitationProbability", "weatherCode"]
+
+# Agronomic defaults (overridable per call)
+GDD_BASE_TEMP = 10.0        # °C, base for wheat/maize-type crops
+GDD_CAP_TEMP = 30.0         # °C, development does not speed up above this
+HEAT_STRESS_TEMP = 35.0     # °C
+SPRAY_MAX_WIND = 4.0        # m/s, drift risk above this
+SPRAY_MAX_RAIN = 20.0       # % precipitation probability
+SPRAY_MIN_HOURS = 3
+RAIN_WINDOWS_HOURS = (6, 24)
+
+def hourly_arrays(hourly: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Column arrays for the hourly series: "time" as datetime64[m] (UTC) and
+    every numeric field as float32 with NaN for missing values.
+    """
+    times = [h.get("time") or "" for h in hourly]
+    arrays = {"time": np.array([t.rstrip("Z")[:16] for t in times], dtype="datetime64[m]")}
+    for field in HOURLY_FIELDS:
+        arrays[field] = np.array(
+            [np.nan if h.get(field) is None else h[field] for h in hourly], dtype=np.float32
+        )
+    return arrays
+
+def _daily_groups(time: np.ndarray):
+    """Unique days and the day index of every hour."""
+    days, index = np.unique(time.astype("datetime64[D]"), return_inverse=True)
+    return days, index
+
+def growing_degree_days(time: np.ndarray, temperature: np.ndarray,
+                        base: float = GDD_BASE_TEMP, cap: float = GDD_CAP_TEMP):
+    """Daily GDD from hourly temperatures (degree-hours / 24). Returns (days, gdd)."""
+    days, index = _daily_groups(time)
+    degree_hours = np.clip(np.nan_to_num(temperature, nan=base), base, cap) - base
+    return days, np.bincount(index, weights=degree_hours, minlength=len(days)) / 24.0
+
+def heat_stress_hours(time: np.ndarray, temperature: np.ndarray, threshold: float = HEAT_STRESS_TEMP):
+    """Hours at or above `threshold` per day. Returns (days, hours)."""
+    days, index = _daily_groups(time)
+    hot = np.nan_to_num(temperature, nan=-np.inf) >= threshold
+    return days, np.bincount(index, weights=hot, minlength=len(days)).astype(np.int32)
+
+def rain_window_probability(precip_probability: np.ndarray, hours: int) -> np.ndarray:
+    """
+    Chance of rain in the next `hours` from each hour, 1 - prod(1 - p) over a
+    forward window, via a cumulative sum of log(1 - p). The tail uses the
+    hours that remain in the forecast.
+    """
+    p = np.clip(np.nan_to_num(precip_probability, nan=0.0) / 100.0, 0.0, 0.999)
+    log_dry = np.concatenate([[0.0], np.cumsum(np.log1p(-p))])
+    ends = np.minimum(np.arange(len(p)) + hours, len(p))
+    return ((1.0 - np.exp(log_dry[ends] - log_dry[:-1])) * 100.0).astype(np.float32)
+
+def spray_windows(time: np.ndarray, wind: np.ndarray, precip_probability: np.ndarray,
+                  max_wind: float = SPRAY_MAX_WIND, max_rain: float = SPRAY_MAX_RAIN,
+                  min_hours: int = SPRAY_MIN_HOURS) -> List[Dict[str, Any]]:
+    """Runs of at least `min_hours` consecutive calm, dry hours."""
+    ok = (np.nan_to_num(wind, nan=np.inf) <= max_wind) & (np.nan_to_num(precip_probability, nan=100) <= max_rain)
+    edges = np.diff(np.concatenate([[0], ok.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = (ends - starts) >= min_hours
+    return [
+        {"start": str(time[s]), "end": str(time[e - 1] + np.timedelta64(1, "h")), "hours": int(e - s)}
+        for s, e in zip(starts[keep], ends[keep])
+    ]
+
+def forecast_indicators(hourly: List[Dict[str, Any]], base_temp: float = GDD_BASE_TEMP) -> Dict[str, Any]:
+    """
+    All derived indicators for one forecast, as JSON-friendly values so they
+    can be stored with the snapshot and computed only once per fetch.
+    """
+    if not hourly:
+        return {}
+    a = hourly_arrays(hourly)
+    days, gdd = growing_degree_days(a["time"], a["temperature"], base_temp)
+    _, heat = heat_stress_hours(a["time"], a["temperature"])
+
+    indicators = {
+        "gdd_base": base_temp,
+        "gdd": [{"date": str(d), "gdd": round(float(g), 2)} for d, g in zip(days, gdd)],
+        "gdd_total": round(float(gdd.sum()), 2),
+        "heat_stress_hours": [{"date": str(d), "hours": int(h)} for d, h in zip(days, heat)],
+        "heat_stress_total": int(heat.sum()),
+        "spray_windows": spray_windows(a["time"], a["windSpeed"], a["precipitationProbability"]),
+    }
+    for hours in RAIN_WINDOWS_HOURS:
+        window = rain_window_probability(a["precipitationProbability"], hours)
+        indicators[f"rain_next_{hours}h"] = np.round(window, 1).tolist()
+    return indicators
+
+def hourly_chart_frame(hourly: List[Dict[str, Any]], indicators: Dict[str, Any]) -> pd.DataFrame:
+    """One time-indexed frame with every hourly series the Weather page charts."""
+    a = hourly_arrays(hourly)
+    frame = pd.DataFrame(
+        {field: a[field] for field in HOURLY_FIELDS if field != "weatherCode"},
+        index=pd.DatetimeIndex(a["time"], name="time")
+    )
+    for hours in RAIN_WINDOWS_HOURS:
+        series = indicators.get(f"rain_next_{hours}h")
+        if series is not None and len(series) == len(frame):
+            frame[f"rain_next_{hours}h"] = np.asarray(series, dtype=np.float32)
+    return frame
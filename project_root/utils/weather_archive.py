@@ -0,0 +1,259 @@
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils.telemetry import count, stage_timer
+from utils.weather_analytics import HOURLY_FIELDS, hourly_arrays
+
+# --- Historical Weather Archive ---
+
+# Layout: <ARCHIVE_DIR>/<kind>/location=<slug>/issue_date=<YYYY-MM-DD>/<issued>-<id>.parquet
+# (closed issue dates are merged into one compacted-<id>.parquet, see compact_archive)
+WEATHER_ARCHIVE_DIR = os.environ.get("WEATHER_ARCHIVE_DIR", "data/weather_archive")
+
+HOURLY_SCHEMA = pa.schema([
+    ("issued_at", pa.timestamp("s", tz="UTC")),
+    ("valid_time", pa.timestamp("s", tz="UTC")),
+    ("lead_hours", pa.int16()),
+    ("temperature", pa.float32()),
+    ("humidity", pa.float32()),
+    ("windSpeed", pa.float32()),
+    ("precipitationProbability", pa.float32()),
+    ("weatherCode", pa.int16()),
+])
+
+DAILY_SCHEMA = pa.schema([
+    ("issued_at", pa.timestamp("s", tz="UTC")),
+    ("date", pa.date32()),
+    ("lead_days", pa.int16()),
+    ("temp_max", pa.float32()),
+    ("temp_min", pa.float32()),
+    ("rain_chance", pa.float32()),
+    ("wind_avg", pa.float32()),
+    ("weather_code", pa.int16()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("location", pa.string()), ("issue_date", pa.string())]), flavor="hive"
+)
+
+def location_slug(location: str) -> str:
+    """Directory-safe partition key, e.g. "Ludhiana, IN" -> "ludhiana-in"."""
+    return re.sub(r"[^a-z0-9]+", "-", location.strip().lower()).strip("-") or "unknown"
+
+def _int_column(values: np.ndarray) -> pa.Array:
+    return pa.array(np.nan_to_num(values, nan=-1).astype(np.int16), mask=np.isnan(values))
+
+def _write(table: pa.Table, kind: str, slug: str, issued: datetime, directory: str) -> str:
+    folder = os.path.join(directory, kind, f"location={slug}", f"issue_date={issued:%Y-%m-%d}")
+    os.makedirs(folder, exist_ok=True)
+    name = f"{issued:%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+    path = os.path.join(folder, name)
+    tmp_path = os.path.join(folder, f".{name}.tmp")  # dot-prefixed: skipped by dataset discovery
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)  # readers never see a partial file
+    return path
+
+def archive_forecast(location: str, weather: Dict[str, Any], issued_at: Optional[float] = None,
+                     directory: str = WEATHER_ARCHIVE_DIR) -> Optional[Dict[str, str]]:
+    """
+    Appends one fetched forecast (hourly and daily timelines) to the archive.
+    Failures are counted and swallowed: archiving must never break a page.
+    """
+    if "error" in weather:
+        return None
+    issued = datetime.fromtimestamp(issued_at or time.time(), tz=timezone.utc).replace(microsecond=0)
+    slug = location_slug(location)
+    paths = {}
+    try:
+        with stage_timer("weather.archive"):
+            hourly = weather.get("hourly", [])
+            if hourly:
+                a = hourly_arrays(hourly)
+                valid = a["time"].astype("datetime64[s]")
+                lead = (valid - np.datetime64(issued.replace(tzinfo=None), "s")) // np.timedelta64(1, "h")
+                columns = {
+                    "issued_at": pa.array(np.full(len(valid), np.datetime64(issued.replace(tzinfo=None), "s"))),
+                    "valid_time": pa.array(valid),
+                    "lead_hours": pa.array(lead.astype(np.int16)),
+                    **{f: pa.array(a[f]) for f in HOURLY_FIELDS if f != "weatherCode"},
+                    "weatherCode": _int_column(a["weatherCode"]),
+                }
+                table = pa.Table.from_pydict(columns).cast(HOURLY_SCHEMA)
+                paths["hourly"] = _write(table, "hourly", slug, issued, directory)
+
+            daily = weather.get("daily", [])
+            if daily:
+                frame = pd.DataFrame(daily)
+                dates = pd.to_datetime(frame["date"]).dt.date
+                frame = frame.reindex(columns=["temp_max", "temp_min", "rain_chance", "wind_avg", "weather_code"])
+                columns = {
+                    "issued_at": pa.array(np.full(len(frame), np.datetime64(issued.replace(tzinfo=None), "s"))),
+                    "date": pa.array(dates),
+                    "lead_days": pa.array(
+                        [(d - issued.date()).days for d in dates], type=pa.int16()
+                    ),
+                    **{c: pa.array(frame[c].to_numpy(dtype=np.float32)) for c in
+                       ["temp_max", "temp_min", "rain_chance", "wind_avg"]},
+                    "weather_code": _int_column(frame["weather_code"].to_numpy(dtype=np.float64)),
+                }
+                table = pa.Table.from_pydict(columns).cast(DAILY_SCHEMA)
+                paths["daily"] = _write(table, "daily", slug, issued, directory)
+    except (OSError, pa.ArrowException, ValueError) as e:
+        count("weather.archive_error", error=type(e).__name__)
+        return None
+    return paths
+
+# A compaction lock older than this is left over from a crashed run
+COMPACT_LOCK_STALE_SECONDS = 3600
+
+def _acquire_partition_lock(folder: str) -> Optional[str]:
+    """Creates <folder>/.compact.lock exclusively; None if another run holds it."""
+    path = os.path.join(folder, ".compact.lock")
+    try:
+        if time.time() - os.path.getmtime(path) > COMPACT_LOCK_STALE_SECONDS:
+            os.remove(path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return None
+    return path
+
+def compact_archive(directory: str = WEATHER_ARCHIVE_DIR, before: Optional[str] = None) -> int:
+    """
+    Merges the many small per-fetch files of each closed partition (issue
+    dates before `before`, default today UTC) into one Parquet file sorted by
+    issue time. Each partition is compacted under an exclusive lock file, so
+    concurrent runs (the prefetcher and the script) skip partitions another
+    run is working on. The merged file is written before the originals are
+    removed, so readers never miss rows. Returns the number of files removed.
+    """
+    before = before or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    removed = 0
+    for kind, schema in (("hourly", HOURLY_SCHEMA), ("daily", DAILY_SCHEMA)):
+        root = os.path.join(directory, kind)
+        if not os.path.isdir(root):
+            continue
+        for location in os.listdir(root):
+            location_dir = os.path.join(root, location)
+            if not os.path.isdir(location_dir):
+                continue
+            for partition in os.listdir(location_dir):
+                folder = os.path.join(location_dir, partition)
+                if (not partition.startswith("issue_date=") or partition.split("=", 1)[1] >= before
+                        or not os.path.isdir(folder)):
+                    continue
+                lock = _acquire_partition_lock(folder)
+                if lock is None:
+                    continue
+                try:
+                    # Listed under the lock, so a finished concurrent run's output is seen as one file
+                    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".parquet"))
+                    if len(files) < 2:
+                        continue
+                    with stage_timer("weather.archive_compact", kind=kind):
+                        table = pa.concat_tables([pq.read_table(f, schema=schema) for f in files])
+                        table = table.sort_by([("issued_at", "ascending")])
+                        name = f"compacted-{uuid.uuid4().hex[:8]}.parquet"
+                        tmp_path = os.path.join(folder, f".{name}.tmp")
+                        pq.write_table(table, tmp_path, compression="zstd")
+                        os.replace(tmp_path, os.path.join(folder, name))
+                        for f in files:
+                            os.remove(f)
+                    removed += len(files)
+                except (OSError, pa.ArrowException) as e:
+                    count("weather.archive_error", error=type(e).__name__)
+                finally:
+                    try:
+                        os.remove(lock)
+                    except OSError:
+                        pass
+    count("weather.archive_compacted", removed)
+    return removed
+
+def _utc(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+def query_archive(location: str, start, end, kind: str = "hourly",
+                  columns: Optional[List[str]] = None,
+                  directory: str = WEATHER_ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    Every archived forecast row for `location` whose valid time (hourly) or
+    date (daily) falls in [start, end]. Partition pruning skips other
+    locations and issue dates older than the forecast horizon; the rest is a
+    vectorized Arrow filter.
+    """
+    root = os.path.join(directory, kind)
+    if not os.path.isdir(root):
+        return pd.DataFrame()
+
+    start, end = _utc(start), _utc(end)
+    # A forecast issued more than 16 days before `start` cannot reach it
+    earliest_issue = (start - pd.Timedelta(days=16)).strftime("%Y-%m-%d")
+
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    time_col = "valid_time" if kind == "hourly" else "date"
+    bounds = (start, end) if kind == "hourly" else (start.date(), end.date())
+    expr = (
+        (ds.field("location") == location_slug(location))
+        & (ds.field("issue_date") >= earliest_issue)
+        & (ds.field("issue_date") <= end.strftime("%Y-%m-%d"))
+        & (ds.field(time_col) >= pa.scalar(bounds[0]))
+        & (ds.field(time_col) <= pa.scalar(bounds[1]))
+    )
+    with stage_timer("weather.archive_query", kind=kind):
+        table = dataset.to_table(filter=expr, columns=columns)
+    return table.to_pandas()
+
+def best_available(location: str, start, end, directory: str = WEATHER_ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    Hourly series with the shortest-lead forecast for every valid time,
+    the closest thing to observations the archive has. Indexed by valid_time.
+    """
+    frame = query_archive(location, start, end, "hourly", directory=directory)
+    if frame.empty:
+        return frame
+    frame = frame[frame["lead_hours"] >= 0].sort_values(["valid_time", "lead_hours"])
+    return frame.drop_duplicates("valid_time").set_index("valid_time")[HOURLY_FIELDS]
+
+def forecast_skill(location: str, start, end, field: str = "temperature",
+                   lead_bins=(0, 6, 24, 48, 72, 120, 384),
+                   directory: str = WEATHER_ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    Mean absolute error and bias of `field` by forecast lead time, verified
+    against the shortest-lead forecast for the same hour.
+    """
+    frame = query_archive(location, start, end, "hourly",
+                          columns=["valid_time", "lead_hours", field], directory=directory)
+    if frame.empty:
+        return pd.DataFrame(columns=["lead", "mae", "bias", "n"])
+
+    reference = frame[frame["lead_hours"] >= 0].sort_values("lead_hours").drop_duplicates("valid_time")
+    joined = frame.merge(reference[["valid_time", field]], on="valid_time", suffixes=("", "_ref"))
+    joined = joined[joined["lead_hours"] > 0]
+    error = joined[field] - joined[f"{field}_ref"]
+    lead = pd.cut(joined["lead_hours"], bins=list(lead_bins), right=False)
+    grouped = error.groupby(lead, observed=True)
+    return pd.DataFrame({
+        "mae": grouped.apply(lambda e: e.abs().mean()),
+        "bias": grouped.mean(),
+        "n": grouped.size(),
+    }).rename_axis("lead").reset_index()
+
+def archived_locations(directory: str = WEATHER_ARCHIVE_DIR) -> List[str]:
+    root = os.path.join(directory, "hourly")
+    if not os.path.isdir(root):
+        return []
+    return sorted(name.split("=", 1)[1] for name in os.listdir(root) if name.startswith("location="))
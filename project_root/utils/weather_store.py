@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Set
+
+import streamlit as st
+
+from utils.api_handlers import fetch_timelines, parse_timelines
+from utils.telemetry import count
+from utils.weather_analytics import HOURLY_FIELDS
+from utils.weather_archive import archive_forecast, compact_archive
+
+# --- Offline-first Forecast Snapshot Store ---
+
+WEATHER_STORE_PATH = os.environ.get("WEATHER_STORE_PATH", "data/weather_snapshots.db")
+
+# How long a snapshot is served without trying to refresh it
+SNAPSHOT_MAX_AGE_MINUTES = float(os.environ.get("WEATHER_SNAPSHOT_MAX_AGE", "60"))
+
+DAILY_FIELDS = ["temp_max", "temp_min", "rain_chance", "wind_avg", "weather_code"]
+
+def _normalize_location(location: str) -> str:
+    return " ".join(location.strip().lower().split())
+
+class WeatherSnapshotStore:
+    """
+    SQLite store of forecast snapshots. Each fetch becomes one snapshot row
+    (indexed by location and issue time) plus its hourly and daily rows in
+    WITHOUT ROWID tables keyed by (snapshot_id, time).
+    """
+
+    def __init__(self, path: str = WEATHER_STORE_PATH, keep_per_location: int = 48):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.keep_per_location = keep_per_location
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY,
+                location TEXT NOT NULL,
+                city TEXT NOT NULL,
+                issued_at REAL NOT NULL,
+                indicators TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_snapshots_location_issued ON snapshots(location, issued_at);
+            CREATE TABLE IF NOT EXISTS hourly (
+                snapshot_id INTEGER, time TEXT,
+                temperature REAL, humidity REAL, windSpeed REAL,
+                precipitationProbability REAL, weatherCode INTEGER,
+                PRIMARY KEY (snapshot_id, time)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS daily (
+                snapshot_id INTEGER, date TEXT,
+                temp_max REAL, temp_min REAL, rain_chance REAL, wind_avg REAL, weather_code INTEGER,
+                PRIMARY KEY (snapshot_id, date)
+            ) WITHOUT ROWID;
+        """)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(snapshots)")}
+        if "indicators" not in columns:
+            self.db.execute("ALTER TABLE snapshots ADD COLUMN indicators TEXT")
+        self.db.commit()
+
+    def save(self, location: str, weather: Dict[str, Any], issued_at: Optional[float] = None) -> int:
+        """Stores a parsed forecast (see parse_timelines) and returns the snapshot id."""
+        issued_at = issued_at or time.time()
+        key = _normalize_location(location)
+        with self._lock, self.db:
+            cur = self.db.execute(
+                "INSERT INTO snapshots (location, city, issued_at, indicators) VALUES (?, ?, ?, ?)",
+                (key, weather.get("city", location), issued_at, json.dumps(weather.get("indicators", {})))
+            )
+            snapshot_id = cur.lastrowid
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO hourly VALUES (?, ?, {', '.join('?' * len(HOURLY_FIELDS))})",
+                [(snapshot_id, h["time"], *[h.get(f) for f in HOURLY_FIELDS]) for h in weather.get("hourly", [])]
+            )
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO daily VALUES (?, ?, {', '.join('?' * len(DAILY_FIELDS))})",
+                [(snapshot_id, d["date"], *[d.get(f) for f in DAILY_FIELDS]) for d in weather.get("daily", [])]
+            )
+            self._prune(key)
+        return snapshot_id
+
+    def _prune(self, key: str):
+        old_ids = [row[0] for row in self.db.execute(
+            "SELECT id FROM snapshots WHERE location = ? ORDER BY issued_at DESC LIMIT -1 OFFSET ?",
+            (key, self.keep_per_location)
+        )]
+        if old_ids:
+            marks = ",".join("?" * len(old_ids))
+            for table in ("hourly", "daily"):
+                self.db.execute(f"DELETE FROM {table} WHERE snapshot_id IN ({marks})", old_ids)
+            self.db.execute(f"DELETE FROM snapshots WHERE id IN ({marks})", old_ids)
+
+    def latest(self, location: str, days: int = 5) -> Optional[Dict[str, Any]]:
+        """Most recent snapshot rebuilt as a parse_timelines-style dict, plus `issued_at`."""
+        with self._lock:
+            row = self.db.execute(
+                "SELECT id, city, issued_at, indicators FROM snapshots "
+                "WHERE location = ? ORDER BY issued_at DESC LIMIT 1",
+                (_normalize_location(location),)
+            ).fetchone()
+            if row is None:
+                return None
+            snapshot_id, city, issued_at, indicators = row
+            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+            hourly = self.db.execute(
+                f"SELECT time, {', '.join(HOURLY_FIELDS)} FROM hourly WHERE snapshot_id = ? ORDER BY time",
+                (snapshot_id,)
+            ).fetchall()
+            daily = self.db.execute(
+                f"SELECT date, {', '.join(DAILY_FIELDS)} FROM daily WHERE snapshot_id = ? AND date >= ? "
+                "ORDER BY date LIMIT ?",
+                (snapshot_id, today, days)
+            ).fetchall()
+
+        hourly_list = [dict(zip(["time"] + HOURLY_FIELDS, r)) for r in hourly]
+        # Serve the hour that is current now, not the first hour of an old snapshot
+        now_iso = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:00:00Z")
+        upcoming = [h for h in hourly_list if h["time"] >= now_iso]
+        indicators = json.loads(indicators) if indicators else {}
+        # Hourly indicator series are aligned with the stored hours; drop the elapsed ones too
+        elapsed = len(hourly_list) - len(upcoming) if upcoming else 0
+        for key, value in indicators.items():
+            if key.startswith("rain_next_") and isinstance(value, list):
+                indicators[key] = value[elapsed:]
+        return {
+            "city": city,
+            "current": dict(upcoming[0] if upcoming else (hourly_list[-1] if hourly_list else {})),
+            "hourly": upcoming or hourly_list,
+            "daily": [dict(zip(["date"] + DAILY_FIELDS, r)) for r in daily],
+            "indicators": indicators,
+            "issued_at": issued_at,
+        }
+
+    def locations(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.db.execute("SELECT DISTINCT city FROM snapshots")]
+
+@st.cache_resource
+def load_weather_store() -> WeatherSnapshotStore:
+    return WeatherSnapshotStore()
+
+def refresh_snapshot(store: WeatherSnapshotStore, location: str, days: int = 5) -> Dict[str, Any]:
+    """Fetches a fresh forecast and stores it. Returns the parsed result or {"error": ...}."""
+    data = fetch_timelines(location)
+    if "error" in data:
+        return data
+    weather = parse_timelines(location, data, days=16)  # keep the full horizon in the store
+    if "error" in weather:
+        return weather
+    issued_at = time.time()
+    store.save(location, weather, issued_at)
+    archive_forecast(location, weather, issued_at)
+    return {**weather, "daily": weather["daily"][:days], "issued_at": issued_at}
+
+# Locations with a background refresh in flight, so each is fetched once at a time
+_refreshing: Set[str] = set()
+_refreshing_lock = threading.Lock()
+
+def _refresh_in_background(store: WeatherSnapshotStore, location: str):
+    key = _normalize_location(location)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            if "error" in refresh_snapshot(store, location):
+                count("weather_refresh_failed")
+        except Exception as e:
+            count("weather_prefetch_error", error=type(e).__name__)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name="weather-refresh", daemon=True).start()
+
+def get_weather_snapshot(location: str, days: int = 5,
+                         max_age_minutes: float = SNAPSHOT_MAX_AGE_MINUTES) -> Dict[str, Any]:
+    """
+    Offline-first forecast: any stored snapshot is returned instantly. A stale
+    one is refreshed in a background thread (the next request sees the new
+    data) and marked "stale": True; the network is only called inline when no
+    snapshot exists yet. Adds "snapshot_age_minutes" to the result.
+    """
+    store = load_weather_store()
+    snapshot = store.latest(location, days)
+
+    if snapshot is None:
+        snapshot = refresh_snapshot(store, location, days)
+        if "error" in snapshot:
+            return snapshot
+    elif (time.time() - snapshot["issued_at"]) / 60 > max_age_minutes:
+        snapshot["stale"] = True
+        _refresh_in_background(store, location)
+
+    snapshot["snapshot_age_minutes"] = (time.time() - snapshot["issued_at"]) / 60
+    return snapshot
+
+# --- Background Prefetcher ---
+
+def configured_locations() -> List[str]:
+    """
+    Locations to prefetch: WEATHER_LOCATIONS env var or secrets entry,
+    separated by ';' (city names may contain commas, e.g. "Ludhiana,IN").
+    """
+    raw = os.environ.get("WEATHER_LOCATIONS")
+    if raw is None:
+        try:
+            raw = st.secrets.get("WEATHER_LOCATIONS", "")
+        except Exception:
+            raw = ""
+    if isinstance(raw, (list, tuple)):
+        return [loc for loc in raw if loc]
+    return [loc.strip() for loc in raw.split(";") if loc.strip()]
+
+def _prefetch_loop(store: WeatherSnapshotStore, locations: List[str], interval_minutes: float):
+    # Every step is guarded: the thread is started once per process, so an
+    # exception escaping here would stop all prefetching until a restart
+    compacted_on = None
+    while True:
+        for location in locations:
+            try:
+                if "error" in refresh_snapshot(store, location):
+                    count("weather_refresh_failed")
+            except Exception as e:
+                count("weather_prefetch_error", error=type(e).__name__)
+        # Once a day, merge yesterday's per-fetch archive files
+        today = datetime.now(timezone.utc).date()
+        if compacted_on != today:
+            try:
+                compact_archive()
+                compacted_on = today
+            except Exception as e:
+                count("weather_prefetch_error", error=type(e).__name__)
+        time.sleep(interval_minutes * 60)
+
+@st.cache_resource
+def start_prefetcher(interval_minutes: float = float(os.environ.get("WEATHER_PREFETCH_MINUTES", "60"))):
+    """Starts one background prefetch thread per process for the configured locations."""
+    locations = configured_locations()
+    if locations:
+        threading.Thread(
+            target=_prefetch_loop,
+            args=(load_weather_store(), locations, interval_minutes),
+            name="weather-prefetch",
+            daemon=True
+        ).start()
+    return locations